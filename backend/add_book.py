@@ -3,6 +3,7 @@
 """
 from database import SessionLocal
 from models import Book
+from response_cache import response_cache
 from datetime import datetime
 
 def add_book(title, cover_image, author, publish_date, description=None):
@@ -28,6 +29,7 @@ def add_book(title, cover_image, author, publish_date, description=None):
         db.add(book)
         db.commit()
         db.refresh(book)
+        response_cache.invalidate("books")
         print(f"Success! Book '{title}' added successfully!")
         print(f"  ID: {book.id}")
         print(f"  Title: {book.title}")
@@ -1,71 +1,71 @@
 """
 认证相关功能：JWT token 生成和验证、密码加密
 """
+import base64
+import hashlib
+import hmac
 import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, SessionLocal
 from models import User
+from concurrency import run_password_hash
+import passwords
 
 # JWT 配置
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30天
 
-# 密码加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# 已验证用户（principal）缓存配置
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_MAXSIZE = int(os.getenv("AUTH_CACHE_MAXSIZE", "1024"))
+# 跨 worker 失效标记文件：任一 worker 修改用户状态时更新它的 mtime，其他 worker 检测到后清空缓存
+# （运行时文件，默认放在系统临时目录，不写入仓库的 data 目录）
+AUTH_CACHE_EPOCH_FILE = os.getenv(
+    "AUTH_CACHE_EPOCH_FILE", os.path.join(tempfile.gettempdir(), "my-fullstack-app", "auth_cache_epoch")
+)
+
+# Attu 会话 cookie：verify-attu 成功后签发的短期签名 cookie，
+# 有效期内 nginx auth_request 只需校验 HMAC（设为 0 关闭）
+ATTU_SESSION_COOKIE = "attu_session"
+ATTU_SESSION_TTL = int(os.getenv("ATTU_SESSION_TTL", "60"))
 
 # OAuth2 密码流
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """验证密码"""
-    # 确保密码不超过72字节（bcrypt限制）
-    password_bytes = plain_password.encode('utf-8')
-    if len(password_bytes) > 72:
-        password_bytes = password_bytes[:72]
-        plain_password = password_bytes.decode('utf-8', errors='ignore')
-    
-    try:
-        return pwd_context.verify(plain_password, hashed_password)
-    except Exception as e:
-        # 如果验证失败，尝试直接使用bcrypt
-        try:
-            import bcrypt
-            if hashed_password.startswith('$2b$') or hashed_password.startswith('$2a$'):
-                return bcrypt.checkpw(password_bytes, hashed_password.encode('utf-8'))
-        except Exception:
-            pass
-        return False
+    """验证密码（哈希细节见 passwords.py）"""
+    return passwords.verify_password(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    """加密密码"""
-    # 确保密码不超过72字节（bcrypt限制）
-    password_bytes = password.encode('utf-8')
-    if len(password_bytes) > 72:
-        password_bytes = password_bytes[:72]
-        password = password_bytes.decode('utf-8', errors='ignore')
-    
-    try:
-        return pwd_context.hash(password)
-    except Exception as e:
-        # 如果 passlib 有问题，直接使用 bcrypt
-        try:
-            import bcrypt
-            salt = bcrypt.gensalt()
-            hashed = bcrypt.hashpw(password_bytes, salt)
-            return hashed.decode('utf-8')
-        except Exception:
-            # 最后的备用方案：使用简单的哈希（不推荐，仅用于紧急情况）
-            import hashlib
-            return hashlib.sha256(password_bytes).hexdigest()
+    """加密密码（bcrypt，rounds 按部署机器校准）"""
+    return passwords.hash_password(password)
+
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str):
+    """验证密码，哈希已过时则同时生成新哈希，返回 (是否通过, 新哈希或 None)"""
+    return await run_password_hash(passwords.verify_and_update, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """加密密码（在密码哈希进程池中执行，不阻塞事件循环）"""
+    return await run_password_hash(passwords.hash_password, password)
+
+
+def get_user_by_username(db: Session, username: str) -> Optional[User]:
+    """根据用户名查询用户"""
+    return db.query(User).filter(User.username == username).first()
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -80,6 +80,155 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
+class PrincipalCache:
+    """
+    已验证用户缓存：token 哈希 -> 用户快照
+    命中时不需要解码 JWT，也不需要查询数据库；条目在 TTL 和 token 过期时间中较早的时刻失效
+    """
+
+    def __init__(self, maxsize: int = AUTH_CACHE_MAXSIZE, ttl: float = AUTH_CACHE_TTL,
+                 epoch_file: str = AUTH_CACHE_EPOCH_FILE):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.epoch_file = epoch_file
+        self._entries = OrderedDict()  # token 哈希 -> (过期时间, 用户快照)
+        self._lock = threading.Lock()
+        self._epoch = self._read_epoch()
+
+    @staticmethod
+    def token_key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def _read_epoch(self):
+        try:
+            return os.stat(self.epoch_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def _check_epoch(self):
+        """其他 worker 修改过用户状态时清空本进程缓存"""
+        epoch = self._read_epoch()
+        if epoch != self._epoch:
+            self._entries.clear()
+            self._epoch = epoch
+
+    def epoch_tag(self) -> str:
+        """当前失效纪元（用于绑定 Attu 会话 cookie）"""
+        with self._lock:
+            self._check_epoch()
+            return str(self._epoch or 0)
+
+    def get(self, token: str) -> Optional[User]:
+        key = self.token_key(token)
+        with self._lock:
+            self._check_epoch()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, token: str, user: User, token_expires_at: Optional[float] = None):
+        expires_at = time.time() + self.ttl
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        with self._lock:
+            self._entries[self.token_key(token)] = (expires_at, user)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        """删除某个用户的所有缓存条目，并通知其他 worker"""
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if entry[1].id == user_id]:
+                del self._entries[key]
+            try:
+                os.makedirs(os.path.dirname(self.epoch_file), exist_ok=True)
+                with open(self.epoch_file, "a"):
+                    os.utime(self.epoch_file, None)
+            except OSError:
+                pass
+            self._epoch = self._read_epoch()
+
+
+principal_cache = PrincipalCache()
+
+
+def snapshot_user(user: User) -> User:
+    """复制一个与数据库会话无关的用户对象（不包含密码哈希），可以跨请求安全复用"""
+    return User(
+        id=user.id,
+        username=user.username,
+        email=user.email,
+        is_active=user.is_active,
+        created_at=user.created_at,
+        updated_at=user.updated_at,
+    )
+
+
+def authenticate_token(token: str, db: Session) -> Optional[User]:
+    """校验 token 并返回用户（优先使用缓存），token 无效或用户不存在时返回 None"""
+    user = principal_cache.get(token)
+    if user is not None:
+        return user
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    username: str = payload.get("sub")
+    if username is None:
+        return None
+    db_user = get_user_by_username(db, username)
+    if db_user is None:
+        return None
+    user = snapshot_user(db_user)
+    principal_cache.set(token, user, payload.get("exp"))
+    return user
+
+
+def authenticate_token_blocking(token: str) -> Optional[User]:
+    """缓存未命中时使用：自行创建数据库会话校验 token（在线程池中调用）"""
+    db = SessionLocal()
+    try:
+        return authenticate_token(token, db)
+    finally:
+        db.close()
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(SECRET_KEY.encode("utf-8"), payload.encode("utf-8"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+
+def create_attu_session(username: str) -> str:
+    """
+    签发 Attu 会话 cookie：用户名|过期时间|缓存纪元 + HMAC 签名
+    纪元与已验证用户缓存一致，禁用或删除用户后已签发的 cookie 立即失效
+    """
+    expires_at = int(time.time()) + ATTU_SESSION_TTL
+    payload = f"{username}|{expires_at}|{principal_cache.epoch_tag()}"
+    encoded = base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+    return f"{encoded}.{_sign(payload)}"
+
+
+def verify_attu_session(value: str) -> Optional[str]:
+    """校验 Attu 会话 cookie，有效时返回用户名"""
+    try:
+        encoded, signature = value.split(".", 1)
+        payload = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode("utf-8")
+        username, expires_at, epoch = payload.rsplit("|", 2)
+    except ValueError:
+        return None
+    if not hmac.compare_digest(signature, _sign(payload)):
+        return None
+    if int(expires_at) <= time.time() or epoch != principal_cache.epoch_tag():
+        return None
+    return username
+
+
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     """获取当前登录用户"""
     credentials_exception = HTTPException(
@@ -87,14 +236,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         detail="身份验证失败，请重新登录",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    user = db.query(User).filter(User.username == username).first()
+    user = authenticate_token(token, db)
     if user is None:
         raise credentials_exception
     return user
@@ -0,0 +1,146 @@
+"""
+日期解析基准测试：dates.py 与原来的 import_articles.parse_iso_date 对比
+- 合成的导出日期（以 ISO 格式为主，夹杂其他常见格式和少量非法值）
+- 原实现分两种路径测量：fromisoformat 路径，以及 Python 3.6 时代的 strptime 逐个尝试路径
+
+用法：
+  python benchmark_date_parsing.py
+  python benchmark_date_parsing.py --count 1000000
+"""
+import argparse
+import contextlib
+import io
+import random
+import re
+import time
+from datetime import datetime, timedelta
+
+from dates import parse_datetime, parse_datetimes
+
+
+def legacy_parse_iso_date(date_str, has_fromisoformat=True):
+    """原 import_articles.parse_iso_date（has_fromisoformat=False 对应 strptime 分支）"""
+    if not date_str:
+        return None
+
+    try:
+        if has_fromisoformat and hasattr(datetime, 'fromisoformat'):
+            if 'Z' in date_str:
+                date_str = date_str.replace('Z', '+00:00')
+            elif date_str.endswith('+00:00'):
+                pass
+            elif '+' in date_str or date_str.count('-') > 2:
+                pass
+            return datetime.fromisoformat(date_str)
+        else:
+            date_str_clean = re.sub(r'[Z\+].*$', '', date_str)
+            formats = [
+                '%Y-%m-%dT%H:%M:%S',
+                '%Y-%m-%dT%H:%M:%S.%f',
+                '%Y-%m-%d',
+            ]
+            for fmt in formats:
+                try:
+                    return datetime.strptime(date_str_clean, fmt)
+                except ValueError:
+                    continue
+            print(f"警告: 无法解析日期 '{date_str}'，使用当前时间")
+            return datetime.now()
+    except Exception as e:
+        print(f"警告: 解析日期 '{date_str}' 时出错: {e}，使用当前时间")
+        return datetime.now()
+
+
+def make_dates(count: int, seed: int):
+    """约 80% 带 Z 的 ISO 时间，其余为带毫秒和时区、只有日期、斜杠格式和非法值"""
+    rng = random.Random(seed)
+    base = datetime(2015, 1, 1)
+    values = []
+    for _ in range(count):
+        dt = base + timedelta(seconds=rng.randrange(10 * 365 * 86400))
+        roll = rng.random()
+        if roll < 0.8:
+            values.append(dt.strftime("%Y-%m-%dT%H:%M:%SZ"))
+        elif roll < 0.9:
+            values.append(dt.strftime("%Y-%m-%dT%H:%M:%S.%f+08:00"))
+        elif roll < 0.96:
+            values.append(dt.strftime("%Y-%m-%d"))
+        elif roll < 0.995:
+            values.append(dt.strftime("%Y/%m/%d %H:%M"))
+        else:
+            values.append("unknown")
+    return values
+
+
+def measure(name, func, values, repeat, baseline=None):
+    # 原实现解析失败时逐条打印警告，测量时丢弃输出；取多次中最快的一次
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(values)
+            timings.append(time.perf_counter() - start)
+    elapsed = min(timings)
+    per_value = elapsed / len(values) * 1e9
+    speedup = f"{baseline / elapsed:>6.1f}x" if baseline else "     -"
+    print(f"{name:<36} {elapsed * 1000:>9.1f}ms {per_value:>8.0f}ns/条 {speedup}")
+    return elapsed
+
+
+def in_batches(values, batch_size):
+    results = []
+    for i in range(0, len(values), batch_size):
+        results.extend(parse_datetimes(values[i:i + batch_size]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日期解析基准测试")
+    parser.add_argument("--count", type=int, default=200000, help="日期数量")
+    parser.add_argument("--batch-size", type=int, default=500, help="批量解析每批的数量（与导入脚本一致）")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    values = make_dates(args.count, args.seed)
+    print(f"{args.count} 个日期，{len(set(v.translate(str.maketrans('0123456789', '9' * 10)) for v in values))} 种形状\n")
+    print(f"{'实现':<36} {'总耗时':>11} {'单条':>12} {'加速':>7}")
+
+    r = args.repeat
+    legacy = measure("原实现（fromisoformat 分支）", lambda vs: [legacy_parse_iso_date(v) for v in vs], values, r)
+    measure("原实现（strptime 分支）", lambda vs: [legacy_parse_iso_date(v, False) for v in vs], values, r, legacy)
+    measure("main.py 原写法 fromisoformat(replace)", lambda vs: [_handler_parse(v) for v in vs], values, r, legacy)
+    measure("dates.parse_datetime", lambda vs: [parse_datetime(v) for v in vs], values, r, legacy)
+    measure(f"dates.parse_datetimes（每批 {args.batch_size}）", lambda vs: in_batches(vs, args.batch_size), values, r, legacy)
+
+    # 结果一致性：原实现能解析的值结果相同；原实现解析不了时返回当前时间，新实现返回 None 或正确解析
+    with contextlib.redirect_stdout(io.StringIO()):
+        legacy_results = [legacy_parse_iso_date(v) for v in values]
+    new_results = parse_datetimes(values)
+    legacy_failed = sum(1 for v in values if _legacy_failed(v))
+    mismatches = sum(
+        1 for v, old, new in zip(values, legacy_results, new_results)
+        if not _legacy_failed(v) and old != new
+    )
+    print(f"\n原实现解析失败（退回当前时间）: {legacy_failed}，其中新实现能解析: "
+          f"{sum(1 for v, new in zip(values, new_results) if _legacy_failed(v) and new is not None)}")
+    print(f"原实现能解析的值中结果不一致: {mismatches}")
+
+
+def _legacy_failed(value):
+    try:
+        datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return True
+    return False
+
+
+def _handler_parse(value):
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except Exception:
+        return datetime.now()
+
+
+if __name__ == "__main__":
+    main()
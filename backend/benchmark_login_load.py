@@ -0,0 +1,111 @@
+"""
+负载基准测试：登录请求与文章列表并发时 /api/articles 的延迟
+分两个阶段运行：
+  1. 只有文章列表读取（基线）
+  2. 文章列表读取 + 并发登录（bcrypt 压力）
+如果阻塞操作已移出事件循环，两个阶段的 p99 应基本持平
+
+用法：
+  python benchmark_login_load.py --base-url http://127.0.0.1:8000 \\
+      --username Admin --password <密码> --duration 15 --readers 8 --logins 4
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def percentile(values, pct):
+    """计算百分位数（values 已排序）"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def reader_loop(base_url, stop_event, latencies, errors):
+    """循环请求文章列表，记录每次请求耗时（毫秒）"""
+    session = requests.Session()
+    while not stop_event.is_set():
+        start = time.perf_counter()
+        try:
+            response = session.get(f"{base_url}/api/articles", timeout=30)
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+        except Exception:
+            errors.append(1)
+
+
+def login_loop(base_url, username, password, stop_event, counter):
+    """循环登录，制造 bcrypt 负载"""
+    session = requests.Session()
+    while not stop_event.is_set():
+        try:
+            session.post(
+                f"{base_url}/api/auth/login-json",
+                json={"username": username, "password": password},
+                timeout=30
+            )
+            counter.append(1)
+        except Exception:
+            pass
+
+
+def run_phase(args, with_logins):
+    """运行一个阶段，返回文章列表的延迟统计"""
+    stop_event = threading.Event()
+    latencies = []
+    errors = []
+    logins = []
+    workers = args.readers + (args.logins if with_logins else 0)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for _ in range(args.readers):
+            pool.submit(reader_loop, args.base_url, stop_event, latencies, errors)
+        if with_logins:
+            for _ in range(args.logins):
+                pool.submit(login_loop, args.base_url, args.username, args.password, stop_event, logins)
+        time.sleep(args.duration)
+        stop_event.set()
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "logins": len(logins),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+
+def print_result(name, result):
+    print(f"{name}:")
+    print(f"  文章列表请求: {result['requests']}  错误: {result['errors']}  登录: {result['logins']}")
+    print(f"  p50={result['p50']:.1f}ms  p95={result['p95']:.1f}ms  p99={result['p99']:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="登录 + 文章列表并发负载测试")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--username", default="Admin")
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--duration", type=float, default=15, help="每个阶段的持续时间（秒）")
+    parser.add_argument("--readers", type=int, default=8, help="并发读取文章列表的线程数")
+    parser.add_argument("--logins", type=int, default=4, help="并发登录的线程数")
+    args = parser.parse_args()
+
+    print(f"目标: {args.base_url}  每阶段 {args.duration}s")
+    baseline = run_phase(args, with_logins=False)
+    print_result("阶段 1：仅文章列表", baseline)
+    loaded = run_phase(args, with_logins=True)
+    print_result("阶段 2：文章列表 + 并发登录", loaded)
+
+    if baseline["p99"] > 0:
+        print(f"p99 变化: {loaded['p99'] / baseline['p99']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+密码哈希微基准测试
+- 每个 rounds 的哈希/验证耗时
+- 当前机器按目标耗时校准出的 rounds
+- 旧 sha256 哈希的验证耗时（对比用）
+用于确定部署机器上 BCRYPT_TARGET_MS / BCRYPT_ROUNDS 的取值，以及每个登录请求的 CPU 预算
+
+用法：
+  python benchmark_password_hash.py --min-rounds 8 --max-rounds 13 --iterations 5
+"""
+import argparse
+import hashlib
+import os
+import statistics
+import time
+
+import bcrypt
+
+import passwords
+
+
+def measure(func, iterations):
+    """返回 (中位数, 最小值) 毫秒"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), min(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="bcrypt 工作因子基准测试")
+    parser.add_argument("--min-rounds", type=int, default=8)
+    parser.add_argument("--max-rounds", type=int, default=13)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--target-ms", type=float, default=passwords.BCRYPT_TARGET_MS)
+    args = parser.parse_args()
+
+    password = "benchmark-password-密码"
+    password_bytes = password.encode("utf-8")
+    cpus = os.cpu_count() or 1
+
+    print(f"CPU 核数: {cpus}")
+    print(f"{'rounds':>6} {'hash 中位数':>12} {'verify 中位数':>14} {'单核每秒验证':>12}")
+    for rounds in range(args.min_rounds, args.max_rounds + 1):
+        salt = bcrypt.gensalt(rounds)
+        hashed = bcrypt.hashpw(password_bytes, salt)
+        hash_ms, _ = measure(lambda: bcrypt.hashpw(password_bytes, salt), args.iterations)
+        verify_ms, _ = measure(lambda: bcrypt.checkpw(password_bytes, hashed), args.iterations)
+        print(f"{rounds:>6} {hash_ms:>10.1f}ms {verify_ms:>12.1f}ms {1000 / verify_ms:>12.1f}")
+
+    start = time.perf_counter()
+    rounds = passwords.calibrate_rounds(target_ms=args.target_ms)
+    calibration_ms = (time.perf_counter() - start) * 1000
+    print()
+    print(f"目标 {args.target_ms:.0f}ms -> 校准结果 rounds={rounds}（校准耗时 {calibration_ms:.0f}ms）")
+
+    legacy = hashlib.sha256(password_bytes).hexdigest()
+    legacy_ms, _ = measure(lambda: passwords.verify_password(password, legacy), max(args.iterations, 100))
+    print(f"旧 sha256 哈希验证: {legacy_ms * 1000:.1f}us（登录成功后会被升级为 bcrypt）")
+
+    hashed = bcrypt.hashpw(password_bytes, bcrypt.gensalt(rounds))
+    verify_ms, _ = measure(lambda: bcrypt.checkpw(password_bytes, hashed), 3)
+    print(f"rounds={rounds} 时全部 {cpus} 核每秒最多可处理约 {cpus * 1000 / verify_ms:.0f} 次登录")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+基准测试：列表接口的序列化路径，100 行和 1000 行
+对比两种做法（同一个临时 SQLite 数据库，结果字节相同）：
+  ORM + to_dict：select(Model) 创建 ORM 对象 -> to_dict()（逐个 isoformat）-> response_model 校验 -> json.dumps
+  Core + 编码器：select(*列) 返回元组 -> RowSerializer -> dumps()（orjson，未安装时为标准库 json）
+分别统计查询、生成字典、校验、编码各阶段的耗时（毫秒，取多次运行的中位数）
+
+用法：
+  python benchmark_serialization.py --repeat 20
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from database import Base
+from models import Article, Book, Product
+from schemas import ArticleResponse, ArticleSummaryResponse, BookResponse, ProductResponse
+from serialization import ARTICLE_FIELDS, ARTICLE_SUMMARY_FIELDS, BOOK_FIELDS, PRODUCT_FIELDS, dumps, orjson
+
+ROW_COUNTS = (100, 1000)
+
+COVER_VARIANTS = json.dumps({
+    "width": 1280, "height": 720, "color": "#5a6b7c", "placeholder": "LEHV6nWB2yk8pyo0adR*.7kCMdnj",
+    "srcset": "/data/covers/ab/cd/x.w320.webp 320w, /data/covers/ab/cd/x.w640.webp 640w, /data/covers/ab/cd/x.jpg 1280w",
+})
+
+
+def populate(session: Session, rows: int):
+    start = datetime(2024, 1, 1)
+    for i in range(rows):
+        session.add(Article(
+            title=f"文章标题 {i}", publish_date=start + timedelta(hours=i), author="作者",
+            original_url=f"https://example.com/{i}", category="技术",
+            content="正文内容，包含 Markdown **格式**。\n" * 40, content_en="Body text. " * 80,
+            cover_image="/data/covers/ab/cd/x.jpg", cover_variants=COVER_VARIANTS, excerpt="文章摘要" * 10,
+            created_at=start, updated_at=start + timedelta(days=1),
+        ))
+        session.add(Book(
+            title=f"书名 {i}", cover_image="/data/covers/ab/cd/x.jpg", cover_variants=COVER_VARIANTS, author="作者",
+            publish_date=start, description="简介" * 50, created_at=start,
+        ))
+        session.add(Product(
+            name=f"product-{i}", title=f"产品 {i}", description="产品描述" * 10, features="特性一\n特性二\n特性三",
+            image_url="/data/p.png", official_url="https://example.com", order_index=i, created_at=start,
+        ))
+    session.commit()
+
+
+def legacy_json(content) -> bytes:
+    """与 FastAPI 默认的 JSONResponse 相同"""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def run_legacy(session: Session, model, to_dict, adapter: TypeAdapter, limit: int, exclude_unset: bool):
+    timings = {}
+    start = time.perf_counter()
+    objects = session.execute(select(model).order_by(model.id).limit(limit)).scalars().all()
+    timings["query"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    data = [to_dict(obj) for obj in objects]
+    timings["dict"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    validated = adapter.validate_python(data)
+    data = adapter.dump_python(validated, mode="json", exclude_unset=exclude_unset)
+    timings["validate"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    body = legacy_json(data)
+    timings["encode"] = time.perf_counter() - start
+    # 会话里的 ORM 对象会留到下一次查询，每次运行后清空
+    session.expunge_all()
+    return timings, body
+
+
+def run_fast(session: Session, model, fields, limit: int):
+    timings = {}
+    start = time.perf_counter()
+    rows = session.execute(fields.select().order_by(model.id).limit(limit)).all()
+    timings["query"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    data = fields.from_rows(rows)
+    timings["dict"] = time.perf_counter() - start
+    timings["validate"] = 0.0
+
+    start = time.perf_counter()
+    body = dumps(data)
+    timings["encode"] = time.perf_counter() - start
+    return timings, body
+
+
+def median_timings(runs) -> dict:
+    return {stage: statistics.median(run[stage] for run in runs) * 1000 for stage in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="列表接口序列化基准测试")
+    parser.add_argument("--repeat", type=int, default=20, help="每种情况运行的次数（取中位数）")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="serialization-bench-")
+    engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        populate(session, max(ROW_COUNTS))
+
+    cases = [
+        ("articles", Article, lambda obj: obj.to_dict(), ArticleResponse, ARTICLE_FIELDS, False),
+        ("articles?view=summary", Article, lambda obj: obj.to_summary_dict(), ArticleResponse, ARTICLE_SUMMARY_FIELDS, True),
+        ("books", Book, lambda obj: obj.to_dict(), BookResponse, BOOK_FIELDS, False),
+        ("admin/products", Product, lambda obj: ProductResponse(**obj.to_dict()), ProductResponse, PRODUCT_FIELDS, False),
+    ]
+    print(f"编码器: {'orjson ' + orjson.__version__ if orjson else '标准库 json'}，每种情况 {args.repeat} 次取中位数（毫秒）")
+    with Session(engine) as session:
+        for name, model, to_dict, schema, fields, exclude_unset in cases:
+            adapter = TypeAdapter(List[schema])
+            for limit in ROW_COUNTS:
+                legacy_runs, fast_runs = [], []
+                for _ in range(args.repeat):
+                    timings, legacy_body = run_legacy(session, model, to_dict, adapter, limit, exclude_unset)
+                    legacy_runs.append(timings)
+                    timings, fast_body = run_fast(session, model, fields, limit)
+                    fast_runs.append(timings)
+                if legacy_body != fast_body:
+                    print(f"  警告：{name} 两种做法的输出不同")
+                legacy = median_timings(legacy_runs)
+                fast = median_timings(fast_runs)
+                print(f"/api/{name}，{limit} 行（{len(fast_body) / 1024:.0f}KB）:")
+                for label, result in (("ORM + to_dict", legacy), ("Core + 编码器", fast)):
+                    stages = "  ".join(f"{stage}={value:.2f}" for stage, value in result.items())
+                    print(f"  {label:<14} 合计 {sum(result.values()):7.2f}ms  {stages}")
+                print(f"  加速: {sum(legacy.values()) / sum(fast.values()):.1f}x")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
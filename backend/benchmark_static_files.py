@@ -0,0 +1,177 @@
+"""
+基准测试：/data 静态文件服务，StaticFiles（原来的挂载方式）与 DataFiles（static_files.py）对比
+分别启动一个只挂载 /data 的 uvicorn 进程，对同一个测试目录运行以下场景：
+  cover：整张封面图片（200KB）
+  range：封面的前 64KB（Range 请求）
+  revalidate：带 If-None-Match 的条件请求（应返回 304）
+  json：1MB 的导出 JSON，Accept-Encoding: br, gzip（DataFiles 发送预压缩文件）
+输出每个场景的请求数 / 秒、p50 / p99 延迟和传输的字节数（压缩后）
+
+用法：
+  python benchmark_static_files.py --duration 10 --clients 8
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from static_files import precompress
+
+IMPLEMENTATIONS = ("StaticFiles", "DataFiles")
+COVER_PATH = "covers/ab/cd/" + "ab" * 32 + ".jpg"
+
+
+def create_app():
+    """uvicorn --factory 入口：按环境变量选择实现"""
+    from fastapi import FastAPI
+    from fastapi.staticfiles import StaticFiles
+
+    from static_files import DataFiles
+
+    directory = os.environ["BENCHMARK_STATIC_DIR"]
+    app = FastAPI()
+    if os.environ["BENCHMARK_STATIC_IMPL"] == "DataFiles":
+        app.mount("/data", DataFiles(directory=directory), name="data")
+    else:
+        app.mount("/data", StaticFiles(directory=directory), name="data")
+    return app
+
+
+def percentile(values, pct):
+    """计算百分位数（values 已排序）"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def prepare_directory(directory):
+    """生成测试文件：随机内容的封面和可压缩的导出 JSON（带预压缩文件）"""
+    cover = os.path.join(directory, COVER_PATH)
+    os.makedirs(os.path.dirname(cover), exist_ok=True)
+    with open(cover, "wb") as f:
+        f.write(b"\xff\xd8\xff" + os.urandom(200 * 1024))
+    articles = [
+        {"id": i, "title": f"文章 {i}", "content": "这是一段用于测试的文章内容。" * 20, "category": "测试"}
+        for i in range(1500)
+    ]
+    export = os.path.join(directory, "articles.json")
+    with open(export, "w", encoding="utf-8") as f:
+        json.dump(articles, f, ensure_ascii=False, indent=2)
+    precompress(export)
+
+
+def start_server(implementation, directory, port):
+    env = {**os.environ, "BENCHMARK_STATIC_IMPL": implementation, "BENCHMARK_STATIC_DIR": directory}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmark_static_files:create_app", "--factory",
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(f"{base_url}/data/articles.json", timeout=1)
+            return process, base_url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"{implementation} 服务启动失败")
+
+
+def scenarios(base_url):
+    """场景名 -> (URL, 请求头, 期望的状态码)"""
+    cover_url = f"{base_url}/data/{COVER_PATH}"
+    etag = requests.get(cover_url).headers["etag"]
+    return {
+        "cover": (cover_url, {}, 200),
+        "range": (cover_url, {"Range": "bytes=0-65535"}, 206),
+        "revalidate": (cover_url, {"If-None-Match": etag}, 304),
+        "json": (f"{base_url}/data/articles.json", {"Accept-Encoding": "br, gzip"}, 200),
+    }
+
+
+def client_loop(url, headers, expected, stop_event, latencies, transferred, errors):
+    session = requests.Session()
+    while not stop_event.is_set():
+        start = time.perf_counter()
+        try:
+            response = session.get(url, headers=headers, stream=True, timeout=30)
+            # 不解压：统计实际传输的字节数
+            body = response.raw.read(decode_content=False)
+            if response.status_code != expected:
+                errors.append(response.status_code)
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+            transferred.append(len(body))
+        except Exception:
+            errors.append(1)
+
+
+def run_scenario(url, headers, expected, duration, clients):
+    stop_event = threading.Event()
+    latencies = []
+    transferred = []
+    errors = []
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        for _ in range(clients):
+            pool.submit(client_loop, url, headers, expected, stop_event, latencies, transferred, errors)
+        time.sleep(duration)
+        stop_event.set()
+
+    latencies.sort()
+    return {
+        "rps": len(latencies) / duration,
+        "errors": len(errors),
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "bytes": sum(transferred) / len(transferred) if transferred else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/data 静态文件服务基准测试")
+    parser.add_argument("--duration", type=float, default=10, help="每个场景的持续时间（秒）")
+    parser.add_argument("--clients", type=int, default=8, help="并发客户端线程数")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="static-bench-")
+    results = {}
+    try:
+        prepare_directory(directory)
+        for offset, implementation in enumerate(IMPLEMENTATIONS):
+            process, base_url = start_server(implementation, directory, args.port + offset)
+            try:
+                for name, (url, headers, expected) in scenarios(base_url).items():
+                    results[(implementation, name)] = run_scenario(url, headers, expected, args.duration, args.clients)
+            finally:
+                process.terminate()
+                process.wait()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"每个场景 {args.duration}s，{args.clients} 个并发客户端")
+    for name in ("cover", "range", "revalidate", "json"):
+        print(f"{name}:")
+        for implementation in IMPLEMENTATIONS:
+            result = results[(implementation, name)]
+            print(
+                f"  {implementation:<12} {result['rps']:8.1f} req/s  p50={result['p50']:.1f}ms  "
+                f"p99={result['p99']:.1f}ms  {result['bytes'] / 1024:.1f}KB/请求  错误: {result['errors']}"
+            )
+        baseline = results[("StaticFiles", name)]["rps"]
+        if baseline > 0:
+            print(f"  吞吐变化: {results[('DataFiles', name)]['rps'] / baseline:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+并发执行模型：把阻塞操作移出事件循环
+- 数据库访问：使用 anyio 的有界线程池（同步 def 路由也由它调度）
+- 密码哈希（bcrypt）：使用独立的进程池，并限制排队数量；
+  队列满时直接返回 503 + Retry-After，登录高峰不会拖垮内容接口
+- 其他 CPU 密集任务（图片缩放等）同样使用 BoundedProcessPool
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import anyio.to_thread
+from fastapi import HTTPException, status
+
+# 数据库线程池大小（每个 worker 进程），FastAPI 同步路由和依赖共用这个上限
+DB_THREAD_POOL_SIZE = int(os.getenv("DB_THREAD_POOL_SIZE", "40"))
+
+# 密码哈希进程数（每个 worker 进程）
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# 正在执行之外允许排队的哈希任务数，超过后拒绝新请求
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "16"))
+# 拒绝时建议客户端等待的秒数
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "2"))
+
+
+# 已创建的进程池，应用退出时统一关闭
+_pools = []
+
+
+class BoundedProcessPool:
+    """有界的进程池（首次使用时创建进程），在途任务超过上限时返回 503"""
+
+    def __init__(self, workers: int, queue_limit: int, busy_detail: str, retry_after: int):
+        self.workers = workers
+        self.capacity = workers + queue_limit
+        self.busy_detail = busy_detail
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.rejected = 0
+        self._executor = None
+        _pools.append(self)
+
+    def _get_executor(self):
+        if self._executor is None:
+            # 使用 spawn：worker 进程里有线程池，fork 可能复制到被持有的锁
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def run(self, func, *args, **kwargs):
+        """提交任务（func 必须是模块级函数）；在途任务已达上限时抛出 503"""
+        if self.in_flight >= self.capacity:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=self.busy_detail,
+                headers={"Retry-After": str(self.retry_after)}
+            )
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), partial(func, *args, **kwargs))
+        finally:
+            self.in_flight -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hash_pool = BoundedProcessPool(
+    PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT, "登录请求过多，请稍后重试", PASSWORD_HASH_RETRY_AFTER
+)
+
+
+def configure_threadpool():
+    """设置默认线程池上限（需要在事件循环内调用，例如 startup 事件）"""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = DB_THREAD_POOL_SIZE
+
+
+async def run_blocking(func, *args, **kwargs):
+    """在有界线程池中执行阻塞函数（数据库查询等）"""
+    return await anyio.to_thread.run_sync(partial(func, *args, **kwargs))
+
+
+async def run_password_hash(func, *args, **kwargs):
+    """在密码哈希进程池中执行 bcrypt 相关函数（func 必须是模块级函数）"""
+    return await password_hash_pool.run(func, *args, **kwargs)
+
+
+def shutdown_executors():
+    """关闭进程池（应用退出时调用）"""
+    for pool in _pools:
+        pool.shutdown()
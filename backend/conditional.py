@@ -0,0 +1,144 @@
+"""
+条件请求（ETag / Last-Modified）
+- 列表：根据 count(*)、max(id)、max(updated_at/created_at) 和查询参数计算强 ETag
+- 单条：根据 id + updated_at/created_at 计算强 ETag
+校验值只需要一次很轻的聚合/主键查询，命中 If-None-Match / If-Modified-Since 时
+直接返回 304，不再加载完整数据行
+- 校验值随响应体一起写入响应缓存（response_cache.cached_response），缓存命中时按缓存的校验值
+  返回 304 或缓存的响应体，不查询数据库；ETag 总是对应实际发送的响应体
+"""
+import functools
+import hashlib
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from typing import Optional
+
+from fastapi import Response
+from sqlalchemy import func, select
+
+# 随响应体一起缓存的校验相关响应头
+VALIDATOR_HEADERS = ("etag", "last-modified", "cache-control")
+
+
+def _resource_key(request) -> str:
+    """ETag 只需要区分同一 URL（含查询参数）的不同版本"""
+    return f"{request.url.path}?{request.url.query}"
+
+
+def _last_modified_column(model):
+    """最后修改时间：从未更新过的行 updated_at 为空，使用 created_at"""
+    return func.coalesce(model.updated_at, model.created_at)
+
+
+async def list_validator(db, model, request):
+    """计算列表的 (ETag, 最后修改时间)"""
+    result = await db.execute(
+        select(func.count(), func.max(model.id), func.max(_last_modified_column(model)))
+    )
+    count, max_id, last_modified = result.one()
+    seed = f"{_resource_key(request)}|{count}|{max_id}|{last_modified}"
+    return _make_etag(seed), last_modified
+
+
+async def item_validator(db, model, column, value, request):
+    """计算单条记录的 (ETag, 最后修改时间)，记录不存在时返回 None"""
+    result = await db.execute(
+        select(model.id, _last_modified_column(model)).where(column == value)
+    )
+    row = result.first()
+    if row is None:
+        return None
+    seed = f"{_resource_key(request)}|{row[0]}|{row[1]}"
+    return _make_etag(seed), row[1]
+
+
+def _make_etag(seed: str) -> str:
+    return '"' + hashlib.sha1(seed.encode("utf-8")).hexdigest() + '"'
+
+
+def _to_utc(value):
+    """数据库中的无时区时间按 UTC 处理（SQLite CURRENT_TIMESTAMP 为 UTC）"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def is_not_modified(request, etag: str, last_modified) -> bool:
+    """判断客户端缓存是否仍然有效（If-None-Match 优先于 If-Modified-Since）"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # If-None-Match 使用弱比较，忽略 W/ 前缀
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return _to_utc(last_modified) <= since
+    return False
+
+
+def validator_headers(etag: str, last_modified) -> dict:
+    """校验相关的响应头；no-cache 要求浏览器每次都带校验值回源确认"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_to_utc(last_modified), usegmt=True)
+    return headers
+
+
+def cached_not_modified(request, headers: dict) -> Optional[Response]:
+    """缓存的响应头中的校验值仍然有效时返回 304 响应，否则返回 None（没有校验值的缓存也返回 None）"""
+    etag = headers.get("etag")
+    if etag is None:
+        return None
+    last_modified = headers.get("last-modified")
+    if last_modified is not None:
+        last_modified = parsedate_to_datetime(last_modified)
+    if not is_not_modified(request, etag, last_modified):
+        return None
+    return Response(
+        status_code=304, headers={k: v for k, v in headers.items() if k in VALIDATOR_HEADERS}
+    )
+
+
+def conditional_get(model, key_param: str = None, key_column=None):
+    """
+    条件请求装饰器（放在 @cached_response 之后：缓存命中时由 cached_response 按缓存的校验值处理，
+    只有未命中时才计算校验值，304 不会读取数据行）
+    被装饰的路由需要声明 request、response 和 db（AsyncSession）参数
+    key_param：单条接口的路径参数名；key_column：对应的查询列，默认为 model.id
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            request = kwargs["request"]
+            response = kwargs["response"]
+            db = kwargs["db"]
+            if key_param is None:
+                validator = await list_validator(db, model, request)
+            else:
+                column = key_column if key_column is not None else model.id
+                validator = await item_validator(db, model, column, kwargs[key_param], request)
+
+            # 记录不存在时交给路由本身处理（返回 404）
+            if validator is None:
+                return await func(*args, **kwargs)
+
+            etag, last_modified = validator
+            headers = validator_headers(etag, last_modified)
+            if is_not_modified(request, etag, last_modified):
+                return Response(status_code=304, headers=headers)
+            response.headers.update(headers)
+            return await func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,254 @@
+"""
+封面图片并发下载
+- 有界线程池 + 共享的 requests.Session（连接池复用 keep-alive 连接）
+- 按域名限制并发数，避免同一个图床被打满或触发限流
+- 连接错误、超时、429 和 5xx 按指数退避重试（带随机抖动，遵守 Retry-After）
+- 图片存入内容寻址存储（cover_store.py）：相同内容只存一份，
+  同一个 URL 只下载一次（多行引用同一 URL，或之前已经下载过）
+- 下载完成的图片立即提交到进程池生成缩略图和占位符（cover_variants.py），与后续下载并行
+- 数据库按批更新 cover_image 和 cover_variants，而不是每张图片提交一次
+- 存储的文件锁每张封面单独获取（下载和生成缩略图期间不持有），不阻塞管理接口和其他脚本
+download_book_covers.py 和 download_article_covers.py 共用这里的实现；
+CoverDownloader 可以注入自定义的 session 和参数，便于对本地 HTTP 服务测试
+"""
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import NamedTuple, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from sqlalchemy import select, update
+
+from cover_store import CoverStore, ref_key
+from cover_variants import VariantBuilder, ensure_cover_variants_column
+from database import SessionLocal
+from response_cache import response_cache
+
+# 并发下载数
+COVER_DOWNLOAD_WORKERS = int(os.getenv("COVER_DOWNLOAD_WORKERS", "8"))
+# 同一域名的最大并发数
+COVER_DOWNLOAD_PER_HOST = int(os.getenv("COVER_DOWNLOAD_PER_HOST", "2"))
+# 失败后的重试次数和首次退避秒数（之后每次翻倍）
+COVER_DOWNLOAD_RETRIES = int(os.getenv("COVER_DOWNLOAD_RETRIES", "3"))
+COVER_DOWNLOAD_BACKOFF = float(os.getenv("COVER_DOWNLOAD_BACKOFF", "0.5"))
+COVER_DOWNLOAD_TIMEOUT = float(os.getenv("COVER_DOWNLOAD_TIMEOUT", "15"))
+# 每批更新数据库的行数
+COVER_UPDATE_BATCH_SIZE = 50
+
+# 单次退避的上限（秒）
+MAX_BACKOFF = 30.0
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'Accept-Encoding': 'gzip, deflate',
+    'Sec-Fetch-Dest': 'image',
+    'Sec-Fetch-Mode': 'no-cors',
+    'Sec-Fetch-Site': 'cross-site'
+}
+
+
+class FetchResult(NamedTuple):
+    key: object
+    url: str
+    content: Optional[bytes] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.content is not None
+
+
+class RetryableError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CoverDownloader:
+    """并发图片下载器（同一个实例可以复用在多次 fetch_many 之间）"""
+
+    def __init__(self, session: Optional[requests.Session] = None, workers: int = COVER_DOWNLOAD_WORKERS,
+                 per_host: int = COVER_DOWNLOAD_PER_HOST, retries: int = COVER_DOWNLOAD_RETRIES,
+                 backoff: float = COVER_DOWNLOAD_BACKOFF, timeout: float = COVER_DOWNLOAD_TIMEOUT,
+                 headers: Optional[dict] = None):
+        self.workers = max(1, workers)
+        self.per_host = max(1, per_host)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.headers = {**DEFAULT_HEADERS, **(headers or {})}
+        self.session = session or self._create_session()
+        self._host_slots = {}
+        self._host_lock = threading.Lock()
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        # 连接池大小与线程数一致；重试由下载器自己处理
+        adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with self._host_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return slot
+
+    def _fetch(self, url: str, headers: dict) -> bytes:
+        with self._slot(url):
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout, allow_redirects=True)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                raise RetryableError(str(e))
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get("Retry-After")
+            raise RetryableError(
+                f"HTTP {response.status_code}",
+                float(retry_after) if retry_after and retry_after.isdigit() else None
+            )
+        response.raise_for_status()
+        return response.content
+
+    def _fetch_with_retry(self, url: str, headers: dict) -> bytes:
+        for attempt in range(self.retries + 1):
+            try:
+                return self._fetch(url, headers)
+            except RetryableError as e:
+                if attempt == self.retries:
+                    raise
+                delay = e.retry_after if e.retry_after is not None else self.backoff * (2 ** attempt)
+                # 抖动：避免多个线程同时重试
+                time.sleep(min(delay, MAX_BACKOFF) * random.uniform(0.8, 1.2))
+
+    def fetch(self, key, url: str, referer: Optional[str] = None) -> FetchResult:
+        """下载单个 URL（带重试），失败时 error 为原因"""
+        headers = dict(self.headers)
+        if referer:
+            headers["Referer"] = referer
+        try:
+            return FetchResult(key, url, self._fetch_with_retry(url, headers))
+        except Exception as e:
+            return FetchResult(key, url, error=str(e))
+
+    def fetch_many(self, jobs, referer: Optional[str] = None):
+        """jobs：[(key, url)]，按完成顺序逐个产出 FetchResult"""
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="cover-download") as executor:
+            futures = [executor.submit(self.fetch, key, url, referer) for key, url in jobs]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def close(self):
+        self.session.close()
+
+
+def download_covers(model, referer: Optional[str] = None, downloader: Optional[CoverDownloader] = None,
+                    store: Optional[CoverStore] = None, session_factory=SessionLocal,
+                    batch_size: int = COVER_UPDATE_BATCH_SIZE) -> dict:
+    """
+    下载 model（Article / Book）中所有外部封面存入 store，并把 cover_image 改为存储内的地址，
+    同时生成缩略图写入 cover_variants
+    返回各状态的数量：downloaded（新下载）、reused（URL 已下载过）、failed（失败的 URL）
+    """
+    own_downloader = downloader is None
+    downloader = downloader or CoverDownloader()
+    store = store or CoverStore()
+    counts = {"downloaded": 0, "reused": 0, "failed": 0, "rows": 0}
+    start = time.perf_counter()
+
+    db = session_factory()
+    try:
+        ensure_cover_variants_column(db.get_bind(), (model,))
+        rows = db.execute(
+            select(model.id, model.title, model.cover_image).where(model.cover_image.like("http%"))
+        ).all()
+        # 同一个 URL 只下载一次
+        rows_by_url = {}
+        for row in rows:
+            rows_by_url.setdefault(row.cover_image, []).append(row)
+        print(f"Found {len(rows)} external covers ({len(rows_by_url)} unique URLs)")
+
+        with VariantBuilder(store) as builder:
+            pending = []
+            # 已下载、等待缩略图生成的 (url, sha256)
+            rendering = []
+
+            def apply(url, sha256):
+                # 在锁外等待生成完成，之后只在记录这张封面的结果和引用时加锁
+                error = builder.submit(sha256).exception()
+                if error is not None:
+                    print(f"  Failed to render variants for {url}: {error}")
+                with store.transaction():
+                    variants = None if error is not None else json.dumps(builder.result(sha256), ensure_ascii=False)
+                    for row in rows_by_url[url]:
+                        store.assign(ref_key(model, row.id), sha256)
+                        pending.append({"id": row.id, "cover_image": store.url_for(sha256), "cover_variants": variants})
+                        counts["rows"] += 1
+                if len(pending) >= batch_size:
+                    flush()
+
+            def apply_rendered(wait=False):
+                for url, sha256 in list(rendering):
+                    if wait or builder.submit(sha256).done():
+                        rendering.remove((url, sha256))
+                        apply(url, sha256)
+
+            def flush():
+                # 清单在每张封面的事务结束时已经保存，之后才提交数据库：
+                # 中断时清单里最多多出未被引用的文件，由 gc 清理
+                db.execute(update(model), pending)
+                db.commit()
+                response_cache.invalidate(model.__tablename__)
+                pending.clear()
+
+            jobs = []
+            with store.transaction():
+                for url in rows_by_url:
+                    sha256 = store.lookup_url(url)
+                    if sha256:
+                        counts["reused"] += 1
+                        builder.submit(sha256)
+                        rendering.append((url, sha256))
+                    else:
+                        jobs.append((url, url))
+
+            for result in downloader.fetch_many(jobs, referer):
+                if not result.ok:
+                    counts["failed"] += 1
+                    titles = ", ".join(f"'{row.title}'" for row in rows_by_url[result.url])
+                    print(f"  Failed to download cover for {titles}: {result.error}")
+                    continue
+                with store.transaction():
+                    sha256 = store.put_bytes(result.content, result.url)
+                    store.remember_url(result.url, sha256)
+                counts["downloaded"] += 1
+                print(f"  Downloaded: {result.url} -> {store.url_for(sha256)}")
+                builder.submit(sha256)
+                rendering.append((result.url, sha256))
+                apply_rendered()
+            apply_rendered(wait=True)
+            if pending:
+                flush()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+        if own_downloader:
+            downloader.close()
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"\nDone in {elapsed:.1f}s: {counts['rows']} rows updated, {counts['downloaded']} URLs downloaded, "
+        f"{counts['reused']} reused, {counts['failed']} failed"
+    )
+    return counts
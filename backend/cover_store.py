@@ -0,0 +1,335 @@
+"""
+封面图片内容寻址存储
+- 文件按内容的 SHA-256 存放在分片目录：data/covers/ab/cd/<sha256>.<扩展名>，
+  对外地址为 /data/covers/ab/cd/<sha256>.<扩展名>；相同的图片只存一份
+- 清单 data/covers/manifest.json：
+  blobs：sha256 -> {ext, size, refs, variants}（refs 为引用计数，variants 见 cover_variants.py）
+  refs：行（表名:id）-> sha256
+  urls：来源 URL -> sha256（同一个 URL 不再重复下载）
+- 缩略图等派生文件与原图放在同一目录：<sha256>.w320.webp，随原图一起被 gc() 删除
+- 引用计数归零的文件由 gc() 删除；直接改库修改了 cover_image 时，
+  reconcile() 按数据库中的实际引用重新计算。新写入的文件在 COVER_GC_GRACE 秒内不会被删除：
+  管理接口先保存文件、数据库提交后才 assign()，两步之间运行的 gc() 不能删掉它
+多个进程通过清单旁的文件锁串行修改（with store.transaction()）
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+from urllib.parse import urlparse
+
+from sqlalchemy import select
+
+try:
+    import fcntl
+except ImportError:  # Windows 本地开发为单进程，不需要文件锁
+    fcntl = None
+
+
+def _default_data_dir() -> str:
+    # 与 main.py 挂载 /data 的目录一致：Docker 中为 /app/data，本地开发为项目根目录/data
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = os.path.join(base_dir, "data")
+    return data_dir if os.path.exists(data_dir) else os.path.join(os.path.dirname(base_dir), "data")
+
+
+# 对外以 /data 提供的目录
+DATA_DIR = _default_data_dir()
+COVER_STORE_DIR = os.getenv("COVER_STORE_DIR", os.path.join(DATA_DIR, "covers"))
+COVER_STORE_URL = "/data/covers"
+# gc() 不删除最近这么多秒内写入的文件（尚未被 assign() 引用）
+COVER_GC_GRACE = int(os.getenv("COVER_GC_GRACE", "3600"))
+
+# 文件头 -> 扩展名
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+_IMAGE_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "webp", "avif", "svg"}
+
+
+def detect_extension(content: bytes, name: Optional[str] = None) -> str:
+    """按文件头判断图片类型，判断不了时用原文件名的扩展名，默认 jpg"""
+    for signature, ext in _SIGNATURES:
+        if content.startswith(signature):
+            return ext
+    if content[:4] == b"RIFF" and content[8:12] == b"WEBP":
+        return "webp"
+    if content[4:12] in (b"ftypavif", b"ftypavis"):
+        return "avif"
+    if name:
+        ext = os.path.splitext(urlparse(name).path)[1].lstrip(".").lower()
+        if ext in _IMAGE_EXTENSIONS:
+            return "jpg" if ext == "jpeg" else ext
+    return "jpg"
+
+
+def ref_key(model, row_id: int) -> str:
+    return f"{model.__tablename__}:{row_id}"
+
+
+class CoverStore:
+    """内容寻址的封面存储（线程安全；修改清单需要在 transaction() 中进行）"""
+
+    def __init__(self, root: str = COVER_STORE_DIR, url_prefix: str = COVER_STORE_URL):
+        self.root = root
+        self.url_prefix = url_prefix.rstrip("/")
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self._lock = threading.RLock()
+        self._blobs = {}
+        self._refs = {}
+        self._urls = {}
+        self._dirty = False
+        self._depth = 0
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    # ---- 清单 ----
+
+    def _load(self):
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            data = {}
+        self._blobs = data.get("blobs", {})
+        self._refs = data.get("refs", {})
+        self._urls = data.get("urls", {})
+        self._dirty = False
+
+    def _save(self):
+        data = {"blobs": self._blobs, "refs": self._refs, "urls": self._urls}
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+        self._dirty = False
+
+    @contextmanager
+    def transaction(self):
+        """加锁并重新读取清单，结束时保存（期间的修改对其他进程原子可见；可以嵌套）"""
+        with self._lock:
+            if self._depth:
+                # 已在事务中：同一进程对同一文件再次 flock 会死锁
+                yield self
+                return
+            self._depth += 1
+            try:
+                with self._locked():
+                    yield self
+            finally:
+                self._depth -= 1
+
+    @contextmanager
+    def _locked(self):
+        if fcntl is None:
+            self._load()
+            yield
+            if self._dirty:
+                self._save()
+            return
+        with open(self.manifest_path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._load()
+                yield
+                if self._dirty:
+                    self._save()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def checkpoint(self):
+        """在 transaction() 中途保存（长时间的批处理每批调用一次）"""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    # ---- 文件 ----
+
+    def relative_path(self, sha256: str, ext: str) -> str:
+        return f"{sha256[:2]}/{sha256[2:4]}/{sha256}.{ext}"
+
+    def path_for(self, sha256: str) -> str:
+        return os.path.join(self.root, self.relative_path(sha256, self._blobs[sha256]["ext"]))
+
+    def url_for(self, sha256: str) -> str:
+        return f"{self.url_prefix}/{self.relative_path(sha256, self._blobs[sha256]['ext'])}"
+
+    def variant_path(self, sha256: str, width: int, ext: str) -> str:
+        return os.path.join(self.root, self.relative_path(sha256, f"w{width}.{ext}"))
+
+    def variant_url(self, sha256: str, width: int, ext: str) -> str:
+        return f"{self.url_prefix}/{self.relative_path(sha256, f'w{width}.{ext}')}"
+
+    def get_variants(self, sha256: str) -> Optional[dict]:
+        with self._lock:
+            return self._blobs.get(sha256, {}).get("variants")
+
+    def set_variants(self, sha256: str, variants: dict):
+        with self._lock:
+            if sha256 in self._blobs and self._blobs[sha256].get("variants") != variants:
+                self._blobs[sha256]["variants"] = variants
+                self._dirty = True
+
+    def sha_from_url(self, url: Optional[str]) -> Optional[str]:
+        """/data/covers/ab/cd/<sha>.jpg -> sha（不是存储内的地址时返回 None）"""
+        if not url or not url.startswith(self.url_prefix + "/"):
+            return None
+        sha256 = os.path.splitext(os.path.basename(url))[0]
+        return sha256 if sha256 in self._blobs else None
+
+    def _write_blob(self, sha256: str, ext: str, write):
+        with self._lock:
+            # 相同内容已存在时沿用原来的扩展名
+            ext = self._blobs.get(sha256, {}).get("ext", ext)
+            path = os.path.join(self.root, self.relative_path(sha256, ext))
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                write(tmp_path)
+                os.replace(tmp_path, path)
+            if sha256 not in self._blobs:
+                self._blobs[sha256] = {"ext": ext, "size": os.path.getsize(path), "refs": 0, "created": int(time.time())}
+                self._dirty = True
+            else:
+                self.touch(sha256)
+            return sha256
+
+    def touch(self, sha256: str):
+        """未被引用的文件重新开始计算 gc 宽限期（即将被 assign() 时调用）"""
+        with self._lock:
+            blob = self._blobs.get(sha256)
+            if blob is not None and blob["refs"] <= 0:
+                blob["created"] = int(time.time())
+                self._dirty = True
+
+    def put_bytes(self, content: bytes, name: Optional[str] = None) -> str:
+        """保存图片内容，返回 sha256（已有相同内容时不再写入）"""
+        sha256 = hashlib.sha256(content).hexdigest()
+
+        def write(tmp_path):
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+
+        return self._write_blob(sha256, detect_extension(content, name), write)
+
+    def put_file(self, path: str) -> str:
+        """导入本地文件（复制一份：原文件之后被修改或删除不会影响存储中的内容）"""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            head = f.read(16)
+            digest.update(head)
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+
+        def write(tmp_path):
+            shutil.copyfile(path, tmp_path)
+
+        return self._write_blob(digest.hexdigest(), detect_extension(head, path), write)
+
+    # ---- 引用 ----
+
+    def lookup_url(self, url: str) -> Optional[str]:
+        """之前从该 URL 下载过、且文件仍然存在时返回 sha256"""
+        with self._lock:
+            sha256 = self._urls.get(url)
+            if sha256 and sha256 in self._blobs and os.path.exists(self.path_for(sha256)):
+                return sha256
+            return None
+
+    def remember_url(self, url: str, sha256: str):
+        with self._lock:
+            if self._urls.get(url) != sha256:
+                self._urls[url] = sha256
+                self._dirty = True
+
+    def assign(self, ref: str, sha256: str):
+        """让 ref（表名:id）引用 sha256，原来引用的文件计数减一"""
+        with self._lock:
+            old = self._refs.get(ref)
+            if old == sha256:
+                return
+            if old in self._blobs:
+                self._blobs[old]["refs"] -= 1
+            self._refs[ref] = sha256
+            self._blobs[sha256]["refs"] += 1
+            self._dirty = True
+
+    def release(self, ref: str):
+        with self._lock:
+            old = self._refs.pop(ref, None)
+            if old in self._blobs:
+                self._blobs[old]["refs"] -= 1
+            self._dirty = self._dirty or old is not None
+
+    def reconcile(self, db, models):
+        """按数据库中各行实际的 cover_image 重新计算引用（管理接口修改过封面时使用）"""
+        with self._lock:
+            refs = {}
+            for model in models:
+                rows = db.execute(
+                    select(model.id, model.cover_image).where(model.cover_image.like(self.url_prefix + "/%"))
+                )
+                for row_id, cover_image in rows:
+                    sha256 = self.sha_from_url(cover_image)
+                    if sha256:
+                        refs[ref_key(model, row_id)] = sha256
+            for blob in self._blobs.values():
+                blob["refs"] = 0
+            for sha256 in refs.values():
+                self._blobs[sha256]["refs"] += 1
+            self._refs = refs
+            self._dirty = True
+
+    def gc(self, dry_run: bool = False, grace: int = COVER_GC_GRACE) -> dict:
+        """
+        删除引用计数为 0 的文件（连同派生文件），以及目录中不属于清单里任何原图的文件；
+        grace 秒内写入的文件保留（可能还没有被 assign()）。返回删除的数量和字节数
+        """
+        with self._lock:
+            cutoff = time.time() - grace
+            orphans = {
+                sha for sha, blob in self._blobs.items()
+                if blob["refs"] <= 0 and blob.get("created", 0) <= cutoff
+            }
+            if not dry_run and orphans:
+                for sha256 in orphans:
+                    del self._blobs[sha256]
+                self._urls = {url: sha for url, sha in self._urls.items() if sha in self._blobs}
+                self._dirty = True
+
+            # 文件名以 sha256 开头：<sha256>.jpg、<sha256>.w320.webp
+            removed = 0
+            freed = 0
+            for directory, _, files in os.walk(self.root):
+                for name in files:
+                    path = os.path.join(directory, name)
+                    relative = os.path.relpath(path, self.root).replace(os.sep, "/")
+                    sha256 = name.split(".", 1)[0]
+                    if relative.count("/") != 2 or name.endswith(".tmp"):
+                        continue
+                    if sha256 in self._blobs and sha256 not in orphans:
+                        continue
+                    if sha256 not in self._blobs and os.path.getmtime(path) > cutoff:
+                        # 其他进程刚写入、清单还没保存的文件
+                        continue
+                    freed += os.path.getsize(path)
+                    removed += 1
+                    if not dry_run:
+                        os.remove(path)
+            return {"files": removed, "bytes": freed}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "blobs": len(self._blobs),
+                "refs": len(self._refs),
+                "bytes": sum(blob["size"] for blob in self._blobs.values()),
+                "orphans": sum(1 for blob in self._blobs.values() if blob["refs"] <= 0),
+            }
@@ -0,0 +1,342 @@
+"""
+封面响应式图片（入库时预先生成）
+- 对内容寻址存储中的封面生成固定宽度的 WebP 缩略图（COVER_VARIANT_WIDTHS），
+  与原图放在同一目录：/data/covers/ab/cd/<sha256>.w320.webp
+- 同时计算 BlurHash 占位符和平均色
+- 结果写入 articles / books 表的 cover_variants 列（JSON），接口直接返回：
+  {"width", "height", "color", "placeholder", "srcset": "url 320w, url 640w, ..."}
+  请求时不做任何图片处理
+- 解码和编码在进程池中执行；同一张图片（同一 sha256）只生成一次，结果记录在存储清单中
+下载脚本（cover_downloader.py）和管理接口（文章 / 书籍的新增、修改）调用这里的函数；
+已有数据运行 python update_cover_images.py 补齐
+管理接口在写数据库之前生成缩略图（prepare_cover），数据库提交成功之后才修改引用计数（assign_cover）；
+脚本每张封面单独持有存储的文件锁，生成缩略图期间不加锁
+"""
+import json
+import math
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+from PIL import Image, ImageOps
+from sqlalchemy import inspect, select, text, update
+
+from concurrency import BoundedProcessPool, run_blocking
+from cover_store import DATA_DIR, CoverStore, ref_key
+from response_cache import response_cache
+
+# 生成的宽度（不超过原图宽度）
+COVER_VARIANT_WIDTHS = tuple(
+    int(width) for width in os.getenv("COVER_VARIANT_WIDTHS", "320,640,960").split(",") if width.strip()
+)
+# 生成缩略图的进程数（下载脚本 / 每个 uvicorn worker）
+COVER_VARIANT_WORKERS = int(os.getenv("COVER_VARIANT_WORKERS", "2"))
+
+VARIANT_FORMAT = "webp"
+VARIANT_QUALITY = 80
+# BlurHash 的分量数（横向 x 纵向）和计算用的缩略图尺寸
+BLURHASH_COMPONENTS = (4, 3)
+BLURHASH_SAMPLE_SIZE = 64
+
+COLUMN = "cover_variants"
+
+_BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+# ==================== BlurHash ====================
+
+def _base83(value: int, length: int) -> str:
+    return "".join(_BASE83[(value // 83 ** (length - i)) % 83] for i in range(1, length + 1))
+
+
+def _srgb_to_linear(values: np.ndarray) -> np.ndarray:
+    values = values / 255.0
+    return np.where(values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4)
+
+
+def _linear_to_srgb(value: float) -> int:
+    value = min(max(value, 0.0), 1.0)
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def blurhash_encode(image: Image.Image, components=BLURHASH_COMPONENTS):
+    """计算 BlurHash（https://blurha.sh），返回 (hash, 平均色 #rrggbb)"""
+    nx, ny = components
+    sample = image.convert("RGB")
+    sample.thumbnail((BLURHASH_SAMPLE_SIZE, BLURHASH_SAMPLE_SIZE))
+    pixels = _srgb_to_linear(np.asarray(sample, dtype=np.float64))
+    height, width = pixels.shape[:2]
+
+    basis_x = np.cos(np.pi * np.outer(np.arange(nx), np.arange(width)) / width)
+    basis_y = np.cos(np.pi * np.outer(np.arange(ny), np.arange(height)) / height)
+    factors = np.einsum("jy,ix,yxc->jic", basis_y, basis_x, pixels) / (width * height)
+    factors[1:] *= 2
+    factors[0, 1:] *= 2
+    factors = factors.reshape(-1, 3)
+    dc, ac = factors[0], factors[1:]
+
+    result = _base83((nx - 1) + (ny - 1) * 9, 1)
+    if len(ac):
+        quantised_max = int(max(0, min(82, math.floor(np.abs(ac).max() * 166 - 0.5))))
+        maximum = (quantised_max + 1) / 166
+        result += _base83(quantised_max, 1)
+    else:
+        maximum = 1
+        result += _base83(0, 1)
+
+    r, g, b = (_linear_to_srgb(value) for value in dc)
+    result += _base83((r << 16) + (g << 8) + b, 4)
+    quantised = np.floor(np.sign(ac) * np.abs(ac / maximum) ** 0.5 * 9 + 9.5).clip(0, 18).astype(int)
+    for qr, qg, qb in quantised:
+        result += _base83(int(qr * 19 * 19 + qg * 19 + qb), 2)
+    return result, f"#{r:02x}{g:02x}{b:02x}"
+
+
+# ==================== 生成（进程池中执行） ====================
+
+def render_cover_variants(source_path: str, targets: dict) -> dict:
+    """
+    生成缩略图并计算占位符（模块级函数，在进程池中执行）
+    targets：宽度 -> 输出路径；比原图宽的尺寸不生成。返回原图尺寸、占位符和实际生成的宽度
+    """
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info or "A" in image.getbands() else "RGB")
+
+    widths = []
+    for width in sorted(targets):
+        if width >= image.width:
+            continue
+        path = targets[width]
+        if not os.path.exists(path):
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.Resampling.LANCZOS)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            resized.save(tmp_path, VARIANT_FORMAT.upper(), quality=VARIANT_QUALITY, method=4)
+            os.replace(tmp_path, path)
+        widths.append(width)
+
+    placeholder, color = blurhash_encode(image)
+    return {"width": image.width, "height": image.height, "placeholder": placeholder, "color": color, "widths": widths}
+
+
+def variant_targets(store: CoverStore, sha256: str) -> dict:
+    return {width: store.variant_path(sha256, width, VARIANT_FORMAT) for width in COVER_VARIANT_WIDTHS}
+
+
+def describe(store: CoverStore, sha256: str, meta: dict) -> dict:
+    """存储清单中的生成结果 -> cover_variants 列的内容（原图作为最大的一档）"""
+    sources = [f"{store.variant_url(sha256, width, VARIANT_FORMAT)} {width}w" for width in meta["widths"]]
+    sources.append(f"{store.url_for(sha256)} {meta['width']}w")
+    return {
+        "width": meta["width"],
+        "height": meta["height"],
+        "color": meta["color"],
+        "placeholder": meta["placeholder"],
+        "srcset": ", ".join(sources),
+    }
+
+
+def _up_to_date(meta: Optional[dict]) -> bool:
+    """清单中的结果是否对应当前配置的宽度"""
+    if not meta:
+        return False
+    expected = [width for width in sorted(COVER_VARIANT_WIDTHS) if width < meta["width"]]
+    return meta["widths"] == expected
+
+
+class VariantBuilder:
+    """脚本使用的同步生成器：submit() 返回 Future，结果为 cover_variants 列的内容"""
+
+    def __init__(self, store: CoverStore, workers: int = COVER_VARIANT_WORKERS):
+        self.store = store
+        self._executor = ProcessPoolExecutor(max_workers=max(1, workers), mp_context=multiprocessing.get_context("spawn"))
+        self._futures = {}
+
+    def submit(self, sha256: str):
+        """提交生成任务（同一 sha256 只提交一次）；已生成过时直接返回完成的 Future"""
+        future = self._futures.get(sha256)
+        if future is None:
+            meta = self.store.get_variants(sha256)
+            if _up_to_date(meta):
+                future = Future()
+                future.set_result(meta)
+            else:
+                future = self._executor.submit(
+                    render_cover_variants, self.store.path_for(sha256), variant_targets(self.store, sha256)
+                )
+            self._futures[sha256] = future
+        return future
+
+    def result(self, sha256: str) -> dict:
+        """等待生成完成，把结果记入存储清单（需要在 store.transaction() 中调用）"""
+        meta = self._futures[sha256].result()
+        self.store.set_variants(sha256, meta)
+        return describe(self.store, sha256, meta)
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# ==================== 管理接口 ====================
+
+variant_pool = BoundedProcessPool(COVER_VARIANT_WORKERS, 16, "封面处理繁忙，请稍后重试", 2)
+_default_store = None
+
+
+def get_store() -> CoverStore:
+    global _default_store
+    if _default_store is None:
+        _default_store = CoverStore()
+    return _default_store
+
+
+def _local_source(cover_image: str) -> Optional[str]:
+    """/data/... -> data 目录中的文件（不存在时返回 None）"""
+    path = os.path.normpath(os.path.join(DATA_DIR, cover_image[len("/data/"):]))
+    if path.startswith(os.path.join(DATA_DIR, "")) and os.path.isfile(path):
+        return path
+    return None
+
+
+def _ingest(store: CoverStore, cover_image: Optional[str]):
+    """本地封面 -> (sha256, 是否需要生成)；外部 URL 或文件不存在时返回 (None, False)"""
+    if not cover_image or not cover_image.startswith("/data/"):
+        return None, False
+    with store.transaction():
+        sha256 = store.sha_from_url(cover_image)
+        if sha256 is None:
+            source = _local_source(cover_image)
+            if source is None:
+                return None, False
+            sha256 = store.put_file(source)
+        else:
+            store.touch(sha256)
+        return sha256, not _up_to_date(store.get_variants(sha256))
+
+
+def _record_variants(store: CoverStore, sha256: str, meta: Optional[dict]) -> Optional[dict]:
+    with store.transaction():
+        if meta is not None:
+            store.set_variants(sha256, meta)
+        meta = store.get_variants(sha256)
+        return describe(store, sha256, meta) if meta else None
+
+
+async def prepare_cover(row, store: Optional[CoverStore] = None):
+    """
+    管理接口保存文章 / 书籍时调用（在写数据库之前调用，不需要 id）
+    本地封面导入存储、cover_image 改为存储地址，生成缩略图并写入 row.cover_variants；
+    外部 URL 或没有封面时清空 cover_variants（外部封面由下载脚本处理）
+    进程池已满时抛出 503，此时数据库还没有被修改
+    """
+    store = store or get_store()
+    sha256, render = await run_blocking(_ingest, store, row.cover_image)
+    if sha256 is None:
+        row.cover_variants = None
+        return
+    meta = None
+    if render:
+        try:
+            meta = await variant_pool.run(render_cover_variants, store.path_for(sha256), variant_targets(store, sha256))
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            # 图片损坏时照常保存，只是没有缩略图
+            print(f"Warning: failed to render cover variants for {row.cover_image}: {e}")
+    variants = await run_blocking(_record_variants, store, sha256, meta)
+    row.cover_image = store.url_for(sha256)
+    row.cover_variants = json.dumps(variants, ensure_ascii=False) if variants else None
+
+
+async def assign_cover(row, store: Optional[CoverStore] = None):
+    """
+    数据库提交成功之后调用：让该行引用 cover_image 对应的存储文件，原来引用的文件计数减一
+    （提交失败时引用计数不变；新文件在 gc 宽限期内不会被删除）
+    """
+    store = store or get_store()
+    ref = ref_key(type(row), row.id)
+
+    def assign(cover_image):
+        with store.transaction():
+            sha256 = store.sha_from_url(cover_image)
+            if sha256 is None:
+                store.release(ref)
+            else:
+                store.assign(ref, sha256)
+
+    await run_blocking(assign, row.cover_image)
+
+
+async def release_cover(model, row_id: int, store: Optional[CoverStore] = None):
+    """删除文章 / 书籍后释放对封面的引用（文件由 gc 删除）"""
+    store = store or get_store()
+
+    def release():
+        with store.transaction():
+            store.release(ref_key(model, row_id))
+
+    await run_blocking(release)
+
+
+# ==================== 数据库 ====================
+
+def ensure_cover_variants_column(bind, models):
+    """已有数据库中补充 cover_variants 列（启动时调用；create_all 不会修改已存在的表）"""
+    with bind.begin() as conn:
+        inspector = inspect(conn)
+        for model in models:
+            columns = {column["name"] for column in inspector.get_columns(model.__tablename__)}
+            if COLUMN not in columns:
+                print(f"Adding {COLUMN} column to {model.__tablename__}")
+                conn.execute(text(f"ALTER TABLE {model.__tablename__} ADD COLUMN {COLUMN} TEXT"))
+
+
+def backfill(db, models, store: Optional[CoverStore] = None, batch_size: int = 50) -> int:
+    """为存储中的封面生成（或补齐）缩略图并更新 cover_variants，返回更新的行数"""
+    store = store or CoverStore()
+    updated = 0
+    with VariantBuilder(store) as builder:
+        for model in models:
+            rows = db.execute(
+                select(model.id, model.cover_image).where(model.cover_image.like(store.url_prefix + "/%"))
+            ).all()
+            jobs = []
+            with store.transaction():
+                for row_id, cover_image in rows:
+                    sha256 = store.sha_from_url(cover_image)
+                    if sha256:
+                        builder.submit(sha256)
+                        jobs.append((row_id, sha256))
+            pending = []
+            for row_id, sha256 in jobs:
+                # 在锁外等待生成完成，之后每张封面单独加锁记录结果
+                error = builder.submit(sha256).exception()
+                if error is not None:
+                    print(f"  Failed to render variants for {ref_key(model, row_id)}: {error}")
+                    continue
+                with store.transaction():
+                    variants = builder.result(sha256)
+                pending.append({"id": row_id, COLUMN: json.dumps(variants, ensure_ascii=False)})
+                if len(pending) >= batch_size:
+                    db.execute(update(model), pending)
+                    db.commit()
+                    response_cache.invalidate(model.__tablename__)
+                    updated += len(pending)
+                    pending.clear()
+            if pending:
+                db.execute(update(model), pending)
+                db.commit()
+                response_cache.invalidate(model.__tablename__)
+                updated += len(pending)
+    return updated
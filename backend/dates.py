@@ -0,0 +1,150 @@
+"""
+日期解析
+- 按输入的“形状”（数字替换为 9 后的字符串，例如 9999-99-99T99:99:99Z）缓存解析方式：
+  每种形状只在第一次出现时逐个尝试候选格式，之后直接调用缓存的解析函数，不再用异常做流程控制
+- 非 ISO 的纯数字格式预先编译成正则，不走 strptime（纯 Python 实现，慢一个数量级）
+- parse_datetime：单个值；parse_datetimes：批量（导入脚本使用，整批计算形状后在 C 层调用解析函数）
+解析失败（包括不是字符串的输入）返回 None，由调用方决定使用当前时间、跳过还是保留原值
+"""
+import operator
+import re
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional
+
+# 缓存的形状数量上限（异常输入不会让缓存无限增长）
+MAX_CACHED_SHAPES = 1024
+
+# fromisoformat 之外尝试的格式（按顺序）
+EXTRA_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y/%m/%d %H:%M:%S",
+    "%Y/%m/%d %H:%M",
+    "%Y/%m/%d",
+    "%Y.%m.%d",
+    "%Y年%m月%d日",
+    "%Y%m%d",
+)
+
+_SHAPE_TABLE = bytes.maketrans(b"0123456789", b"9999999999")
+_DIRECTIVES = {
+    "Y": r"(\d{4})",
+    "m": r"(\d{1,2})",
+    "d": r"(\d{1,2})",
+    "H": r"(\d{1,2})",
+    "M": r"(\d{1,2})",
+    "S": r"(\d{1,2})",
+}
+
+
+def _shape(value: str) -> bytes:
+    # bytes.translate 比 str.translate 快数倍
+    return value.encode("utf-8").translate(_SHAPE_TABLE)
+
+
+def _compile_format(fmt: str) -> Callable[[str], datetime]:
+    """把只含 %Y %m %d %H %M %S 的格式编译成 正则 + datetime 构造"""
+    pattern = re.sub(
+        r"%(.)|([^%]+)",
+        lambda m: _DIRECTIVES[m.group(1)] if m.group(1) else re.escape(m.group(2)),
+        fmt
+    )
+    match = re.compile(pattern).fullmatch
+
+    def parse(value: str) -> datetime:
+        m = match(value)
+        if m is None:
+            raise ValueError(f"{value!r} does not match {fmt!r}")
+        return datetime(*map(int, m.groups()))
+
+    parse.__qualname__ = f"parse({fmt!r})"
+    return parse
+
+
+def _fromisoformat_z(value: str) -> datetime:
+    # Python 3.11 之前的 fromisoformat 不支持结尾的 Z
+    return datetime.fromisoformat(value[:-1] + "+00:00")
+
+
+_CANDIDATES = [datetime.fromisoformat, _fromisoformat_z] + [_compile_format(fmt) for fmt in EXTRA_FORMATS]
+
+# 形状 -> 解析函数（None 表示这种形状无法解析）
+_parsers = {}
+_MISSING = object()
+# operator.call 在 Python 3.11 加入
+_call = getattr(operator, "call", lambda func, value: func(value))
+
+
+def _detect(shape: bytes, value: str):
+    for parser in _CANDIDATES:
+        try:
+            parser(value)
+        except ValueError:
+            continue
+        if len(_parsers) < MAX_CACHED_SHAPES:
+            _parsers[shape] = parser
+        return parser
+    # 含数字的形状不缓存失败：同一形状的下一个值可能合法（例如先遇到 2025-02-30）
+    if b"9" not in shape and len(_parsers) < MAX_CACHED_SHAPES:
+        _parsers[shape] = None
+    return None
+
+
+def parse_datetime(value) -> Optional[datetime]:
+    """解析日期字符串（已经是 datetime 时原样返回），无法解析或不是字符串（None、数字等）时返回 None"""
+    if isinstance(value, datetime):
+        return value
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    if not value:
+        return None
+    shape = _shape(value)
+    parser = _parsers.get(shape, _MISSING)
+    if parser is _MISSING:
+        parser = _detect(shape, value)
+    if parser is None:
+        return None
+    try:
+        return parser(value)
+    except ValueError:
+        # 形状相同但数值不合法，例如 2025-02-30
+        return None
+
+
+def _parse_each(values) -> List[Optional[datetime]]:
+    return [parse_datetime(value) for value in values]
+
+
+def parse_datetimes(values: Iterable) -> List[Optional[datetime]]:
+    """
+    批量解析，结果与逐个调用 parse_datetime 相同
+    整批拼接后一次 translate 得到所有形状，形状都已缓存时用 map 在 C 层逐个调用解析函数；
+    有未缓存的形状或非法值时逐个处理
+    """
+    values = list(values)
+    if not values or set(map(type, values)) != {str}:
+        return _parse_each(values)
+    texts = list(map(str.strip, values))
+    shapes = "\n".join(texts).encode("utf-8").translate(_SHAPE_TABLE).split(b"\n")
+    if len(shapes) != len(texts):
+        # 值里有换行符，无法按行切分形状
+        return _parse_each(values)
+    parsers = list(map(_parsers.get, shapes))
+    if None not in parsers:
+        try:
+            return list(map(_call, parsers, texts))
+        except ValueError:
+            pass
+
+    results = []
+    for parser, text in zip(parsers, texts):
+        if parser is None:
+            # 新形状（或无法解析的形状）
+            results.append(parse_datetime(text))
+            continue
+        try:
+            results.append(parser(text))
+        except ValueError:
+            results.append(None)
+    return results
@@ -0,0 +1,34 @@
+"""
+文章向量化：切块、嵌入并写入向量库（Milvus 或 NumPy 索引，见 vector_store.py）
+默认增量刷新：只重新向量化修改时间和内容哈希都变化的文章，并删除已删除文章的向量
+向量有变化时会失效正在运行的服务中缓存的语义检索结果
+
+用法：
+  python embed_articles.py              # 增量刷新全部文章
+  python embed_articles.py --ids 3 5 8  # 只检查指定文章
+  python embed_articles.py --rebuild    # 清空向量库后全部重新向量化（更换嵌入模型后使用）
+"""
+import argparse
+
+from embedding_refresh import format_stats, refresh_embeddings
+from embeddings import EMBEDDING_BATCH_SIZE, get_embedder
+from semantic_search import get_vector_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文章向量化")
+    parser.add_argument("--ids", type=int, nargs="+", help="只检查这些文章")
+    parser.add_argument("--rebuild", action="store_true", help="先清空向量库")
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE, help="每次调用模型的块数")
+    args = parser.parse_args()
+
+    embedder = get_embedder()
+    store = get_vector_store()
+    print(f"嵌入模型: {embedder.name}（{embedder.dim} 维），向量库: {store.name}")
+
+    stats = refresh_embeddings(args.ids, rebuild=args.rebuild, batch_size=args.batch_size)
+    print(f"完成: {format_stats(stats)}，向量库共 {store.count()} 个块")
+
+
+if __name__ == "__main__":
+    main()
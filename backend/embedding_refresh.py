@@ -0,0 +1,226 @@
+"""
+文章向量增量刷新
+- 清单（manifest）记录每篇已向量化文章的修改时间（updated_at，未修改过时为 created_at）和内容哈希
+- 刷新时先只读取 (id, 修改时间) 与清单比较，时间变化的文章再读取正文计算哈希，
+  哈希也变化的才重新切块和向量化；数据库中已删除的文章从向量库删除
+- 后台线程：管理接口写入文章后提交文章 id，短暂合并后批量刷新
+- 向量有写入或删除时失效语义检索的响应缓存（semantic 命名空间），后台线程和 embed_articles.py 都经过这里
+多个 worker 进程通过清单旁的文件锁串行执行刷新
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import func, select
+
+try:
+    import fcntl
+except ImportError:  # Windows 本地开发为单进程，不需要文件锁
+    fcntl = None
+
+from database import SessionLocal
+from embeddings import EMBEDDING_BATCH_SIZE, get_embedder
+from models import Article
+from response_cache import response_cache
+from semantic_search import embed_articles, get_vector_store, iter_articles
+from vector_store import VECTOR_STORE_PATH
+
+EMBEDDING_MANIFEST_PATH = os.getenv(
+    "EMBEDDING_MANIFEST_PATH", os.path.join(os.path.dirname(VECTOR_STORE_PATH), "manifest.json")
+)
+# 管理接口修改文章后是否自动刷新向量
+EMBEDDING_AUTO_REFRESH = os.getenv("EMBEDDING_AUTO_REFRESH", "true").lower() == "true"
+# 提交后等待多少秒再刷新（合并连续的修改）
+EMBEDDING_REFRESH_DELAY = float(os.getenv("EMBEDDING_REFRESH_DELAY", "2"))
+
+# 每次读取正文的文章数
+_LOAD_BATCH = 200
+
+
+def content_hash(article) -> str:
+    """参与向量化的字段的哈希"""
+    digest = hashlib.sha256()
+    for value in (article.title, article.excerpt, article.content, article.content_en):
+        digest.update((value or "").encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@contextmanager
+def _manifest_lock():
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(EMBEDDING_MANIFEST_PATH), exist_ok=True)
+    with open(EMBEDDING_MANIFEST_PATH + ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _load_manifest(embedder_name: str) -> dict:
+    """{文章 id: [修改时间, 内容哈希]}；嵌入模型变化时视为空清单（全部重新向量化）"""
+    try:
+        with open(EMBEDDING_MANIFEST_PATH, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    if data.get("embedder") != embedder_name:
+        return {}
+    return {int(article_id): entry for article_id, entry in data["articles"].items()}
+
+
+def _save_manifest(embedder_name: str, manifest: dict):
+    os.makedirs(os.path.dirname(EMBEDDING_MANIFEST_PATH), exist_ok=True)
+    tmp_path = f"{EMBEDDING_MANIFEST_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"embedder": embedder_name, "articles": manifest}, f)
+    os.replace(tmp_path, EMBEDDING_MANIFEST_PATH)
+
+
+def _stamps(ids=None) -> dict:
+    """{文章 id: 修改时间字符串}"""
+    changed_at = func.coalesce(Article.updated_at, Article.created_at)
+    statement = select(Article.id, changed_at)
+    if ids is not None:
+        statement = statement.where(Article.id.in_(ids))
+    with SessionLocal() as session:
+        return {
+            article_id: stamp.isoformat() if hasattr(stamp, "isoformat") else stamp
+            for article_id, stamp in session.execute(statement).all()
+        }
+
+
+def refresh_embeddings(ids=None, rebuild: bool = False, batch_size: int = EMBEDDING_BATCH_SIZE) -> dict:
+    """
+    增量刷新向量，返回统计信息
+    ids 为 None 时检查全部文章；指定 ids 时（管理接口提交）不比较修改时间，直接比较内容哈希，
+    因为同一秒内的两次修改在 SQLite 中修改时间相同
+    rebuild=True 时清空向量库和清单后全部重新向量化
+    """
+    embedder = get_embedder()
+    store = get_vector_store()
+    start = time.perf_counter()
+    cleared = False
+    with _manifest_lock():
+        if rebuild:
+            store.clear()
+            manifest = {}
+            cleared = True
+        else:
+            manifest = _load_manifest(embedder.name)
+            if ids is None and not manifest and store.count():
+                # 清单丢失或嵌入模型变化：旧向量无法对应，清空后重建
+                store.clear()
+                cleared = True
+
+        stamps = _stamps(ids)
+        removed = sorted((set(manifest) if ids is None else set(ids)) - set(stamps))
+        if ids is None:
+            candidates = [
+                article_id for article_id, stamp in stamps.items()
+                if article_id not in manifest or manifest[article_id][0] != stamp
+            ]
+        else:
+            candidates = list(stamps)
+
+        changed = []
+        unchanged = 0
+        hashes = {}
+        candidates.sort()
+        for i in range(0, len(candidates), _LOAD_BATCH):
+            for article in iter_articles(candidates[i:i + _LOAD_BATCH]):
+                digest = content_hash(article)
+                entry = manifest.get(article.id)
+                if entry and entry[1] == digest:
+                    # 只改了封面、分类等不参与向量化的字段
+                    entry[0] = stamps[article.id]
+                    unchanged += 1
+                else:
+                    changed.append(article)
+                    hashes[article.id] = digest
+
+        stats = embed_articles(changed, embedder, store, batch_size)
+        for article in changed:
+            manifest[article.id] = [stamps[article.id], hashes[article.id]]
+        if removed:
+            store.delete(removed)
+            for article_id in removed:
+                manifest.pop(article_id, None)
+        _save_manifest(embedder.name, manifest)
+
+    if cleared or changed or removed:
+        # 向量库已变化，丢弃所有 worker 中缓存的语义检索结果
+        response_cache.invalidate("semantic")
+
+    stats["checked"] = len(stamps)
+    stats["unchanged"] = unchanged
+    stats["removed"] = len(removed)
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def format_stats(stats: dict) -> str:
+    return (
+        f"检查 {stats['checked']} 篇，重新向量化 {stats['articles']} 篇（{stats['chunks']} 个块，"
+        f"{stats['chunks_per_second']:.0f} 块/秒），未变化 {stats['unchanged']} 篇，删除 {stats['removed']} 篇，"
+        f"总耗时 {stats['seconds']:.2f}s"
+    )
+
+
+class EmbeddingRefreshWorker:
+    """后台刷新线程：收集提交的文章 id，等待 delay 秒后批量刷新（首次提交时启动）"""
+
+    def __init__(self, delay: float = EMBEDDING_REFRESH_DELAY, enabled: bool = EMBEDDING_AUTO_REFRESH):
+        self.delay = delay
+        self.enabled = enabled
+        self.last_stats = None
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    def submit(self, article_id: int):
+        """文章新增、修改或删除后调用"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._pending.add(article_id)
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="embedding-refresh", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait()
+            if self._stopping:
+                return
+            time.sleep(self.delay)
+            with self._lock:
+                self._wakeup.clear()
+                ids, self._pending = self._pending, set()
+            if not ids:
+                continue
+            try:
+                self.last_stats = refresh_embeddings(ids)
+                print(f"Embedding refresh: {format_stats(self.last_stats)}")
+            except Exception as e:
+                print(f"Warning: embedding refresh failed: {e}")
+
+    def stop(self):
+        """应用退出时调用（未处理的 id 留给下次 embed_articles.py 全量检查）"""
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+worker = EmbeddingRefreshWorker()
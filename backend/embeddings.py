@@ -0,0 +1,149 @@
+"""
+文章向量化：切块 + 可替换的本地嵌入模型
+- 切块：按句子边界累积到固定长度，相邻块之间保留少量重叠
+- 嵌入模型（EMBEDDING_BACKEND）：
+  hashing：特征哈希向量化，不需要模型文件，适合开发和测试（只能匹配字面相近的内容）
+  sentence-transformers：本地 CPU 模型（需要额外安装 sentence-transformers），例如 BAAI/bge-small-zh-v1.5
+所有模型输出 L2 归一化的 float32 向量，内积即余弦相似度
+"""
+import math
+import os
+import re
+import threading
+import zlib
+from collections import Counter
+from functools import lru_cache
+from typing import List, NamedTuple
+
+import numpy as np
+
+from search import plain_text, tokenize
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "hashing")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-small-zh-v1.5")
+# hashing 模型的向量维度
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "512"))
+# 每次调用模型的块数
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# 每块的字符数和相邻块的重叠字符数
+CHUNK_CHARS = int(os.getenv("EMBEDDING_CHUNK_CHARS", "500"))
+CHUNK_OVERLAP = int(os.getenv("EMBEDDING_CHUNK_OVERLAP", "50"))
+# 每篇文章最多的块数（向量库主键为 文章 id * MAX_CHUNKS + 块序号）
+MAX_CHUNKS = 10000
+
+# 句子边界：中文句末标点之后，或英文句号后的空白处
+_SENTENCE_RE = re.compile(r"(?<=[。！？；!?;])|(?<=\.)\s+")
+
+
+class Chunk(NamedTuple):
+    index: int
+    lang: str
+    text: str
+
+
+def chunk_text(value, max_chars: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """把正文切成不超过 max_chars 的块（超长句子直接按长度切开）"""
+    text = plain_text(value)
+    if not text:
+        return []
+    pieces = []
+    for sentence in _SENTENCE_RE.split(text):
+        sentence = sentence.strip()
+        while len(sentence) > max_chars:
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if sentence:
+            pieces.append(sentence)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        separator = " " if current and current[-1].isascii() else ""
+        if current and len(current) + len(separator) + len(piece) > max_chars:
+            chunks.append(current)
+            # 新块以上一块的结尾开头，避免切断上下文
+            current = current[-overlap:] if overlap else ""
+            separator = " " if current and current[-1].isascii() else ""
+        current = f"{current}{separator}{piece}"
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_article(content, content_en, excerpt=None) -> List[Chunk]:
+    """文章切块：中文正文（没有正文时用摘要）在前，英文正文在后"""
+    texts = [("zh", text) for text in chunk_text(content) or chunk_text(excerpt)]
+    texts += [("en", text) for text in chunk_text(content_en)]
+    return [Chunk(index, lang, text) for index, (lang, text) in enumerate(texts[:MAX_CHUNKS])]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32, copy=False)
+
+
+class HashingEmbedder:
+    """
+    特征哈希向量化：词元（中文二元组 / 英文单词）经 crc32 映射到固定维度并带符号，
+    词频取对数后累加，最后 L2 归一化。结果在不同进程、不同机器上保持一致
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    @lru_cache(maxsize=200000)
+    def _bucket(self, token: str):
+        value = zlib.crc32(token.encode("utf-8"))
+        return value % self.dim, 1.0 if value & 0x80000000 else -1.0
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token, count in Counter(tokenize(text)).items():
+                column, sign = self._bucket(token)
+                vectors[row, column] += sign * (1.0 + math.log(count))
+        return _normalize(vectors)
+
+
+class SentenceTransformerEmbedder:
+    """sentence-transformers 本地模型（CPU），首次使用时加载"""
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"st-{model_name}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(
+            texts, batch_size=EMBEDDING_BATCH_SIZE, normalize_embeddings=True, convert_to_numpy=True
+        )
+        return vectors.astype(np.float32, copy=False)
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """当前配置的嵌入模型（进程内单例）"""
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            if EMBEDDING_BACKEND == "sentence-transformers":
+                _embedder = SentenceTransformerEmbedder()
+            elif EMBEDDING_BACKEND == "hashing":
+                _embedder = HashingEmbedder()
+            else:
+                raise ValueError(f"未知的嵌入模型: {EMBEDDING_BACKEND}")
+        return _embedder
+
+
+def embed_in_batches(embedder, texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> np.ndarray:
+    """分批调用模型，返回 (len(texts), dim) 的矩阵"""
+    if not texts:
+        return np.zeros((0, embedder.dim), dtype=np.float32)
+    return np.vstack([embedder.embed(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)])
@@ -1,41 +1,136 @@
 """
 导出文章数据到 JSON 文件
 用于将文章内容同步到 Git 仓库
+- 流式导出：分批从数据库读取（yield_per，MySQL 使用服务端游标），逐篇写入，内存占用与文章数量无关
+- 格式：json（与 import_articles.py 兼容的数组）或 ndjson（每行一篇）
+- 压缩：gzip，或 zstd（需要安装 zstandard）；默认按文件扩展名判断
+- --since：只导出该时间之后新增或修改的文章
+- 未压缩的导出文件同时生成 .gz / .br 文件，/data 按 Accept-Encoding 直接发送
+
+用法：
+  python export_articles.py
+  python export_articles.py ../data/articles.ndjson.gz
+  python export_articles.py ../data/changes.ndjson --since 2026-01-01
 """
+import argparse
+import gzip
+import io
 import json
 import os
-from datetime import datetime
+import textwrap
+from datetime import timezone
+from sqlalchemy import func, select
 from database import SessionLocal
+from dates import parse_datetime
 from models import Article
+from static_files import precompress
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 每批从数据库读取的文章数
+EXPORT_BATCH_SIZE = 200
+
+
+def _detect_format(output_file):
+    name = output_file[:-3] if output_file.endswith(".gz") else output_file
+    name = name[:-4] if name.endswith(".zst") else name
+    return "ndjson" if name.endswith((".ndjson", ".jsonl")) else "json"
+
+
+def _detect_compression(output_file):
+    if output_file.endswith(".gz"):
+        return "gzip"
+    if output_file.endswith(".zst"):
+        return "zstd"
+    return None
+
+
+def _open_output(path, compression):
+    """以文本方式打开输出文件（按需压缩）"""
+    if compression == "gzip":
+        return gzip.open(path, "wt", encoding="utf-8")
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd 压缩需要安装 zstandard：pip install zstandard")
+        raw = open(path, "wb")
+        writer = zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(writer, encoding="utf-8")
+    if compression:
+        raise ValueError(f"不支持的压缩方式: {compression}")
+    return open(path, "w", encoding="utf-8")
+
 
+def _parse_since(value):
+    """解析 --since；带时区的时间转换为 UTC 并去掉时区，与数据库中的 created_at / updated_at 比较"""
+    since = parse_datetime(value)
+    if value is not None and since is None:
+        raise ValueError(f"无法解析时间: {value}")
+    if since is not None and since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return since
+
+
+def iter_articles(db, since=None, batch_size=EXPORT_BATCH_SIZE):
+    """按发布时间倒序逐篇读取文章"""
+    statement = select(Article).order_by(Article.publish_date.desc(), Article.id.desc())
+    if since is not None:
+        statement = statement.where(func.coalesce(Article.updated_at, Article.created_at) >= since)
+    result = db.execute(statement.execution_options(yield_per=batch_size))
+    for article in result.scalars():
+        yield article
+
+
+def export_articles(output_file="data/articles.json", fmt=None, compression="auto", since=None,
+                    batch_size=EXPORT_BATCH_SIZE):
+    """
+    导出文章到 JSON / NDJSON 文件，返回导出的文章数
+    先写入临时文件，完成后再替换目标文件，导出失败不会破坏已有的文件
+    """
+    fmt = fmt or _detect_format(output_file)
+    if compression == "auto":
+        compression = _detect_compression(output_file)
+    since = _parse_since(since)
+
+    # 确保输出目录存在
+    output_dir = os.path.dirname(output_file)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    tmp_file = f"{output_file}.{os.getpid()}.tmp"
 
-def export_articles(output_file="data/articles.json"):
-    """导出所有文章到 JSON 文件"""
     db = SessionLocal()
+    count = 0
     try:
-        # 获取所有文章
-        articles = db.query(Article).order_by(Article.publish_date.desc()).all()
-        
-        # 转换为字典列表
-        articles_data = []
-        for article in articles:
-            article_dict = article.to_dict()
-            articles_data.append(article_dict)
-        
-        # 确保输出目录存在
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
-        
-        # 写入 JSON 文件
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(articles_data, f, ensure_ascii=False, indent=2)
-        
-        print(f"成功导出 {len(articles_data)} 篇文章到 {output_file}")
-        return len(articles_data)
-        
+        with _open_output(tmp_file, compression) as f:
+            for article in iter_articles(db, since, batch_size):
+                if fmt == "ndjson":
+                    f.write(json.dumps(article.to_dict(), ensure_ascii=False))
+                    f.write("\n")
+                else:
+                    # 与 json.dump(列表, indent=2) 的输出一致
+                    f.write("[\n" if count == 0 else ",\n")
+                    f.write(textwrap.indent(json.dumps(article.to_dict(), ensure_ascii=False, indent=2), "  "))
+                count += 1
+                # 已写出的文章不再需要留在会话里
+                db.expunge(article)
+            if fmt == "json":
+                f.write("\n]" if count else "[]")
+        os.replace(tmp_file, output_file)
+        if compression is None:
+            # 生成 .gz / .br 文件，/data 按 Accept-Encoding 直接发送
+            precompress(output_file)
+
+        print(f"成功导出 {count} 篇文章到 {output_file}")
+        return count
+
     except Exception as e:
         print(f"导出文章失败: {e}")
         import traceback
         traceback.print_exc()
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
         raise
     finally:
         db.close()
@@ -45,9 +140,22 @@ if __name__ == "__main__":
     # 默认导出到项目根目录的 data 文件夹
     script_dir = os.path.dirname(os.path.abspath(__file__))
     project_root = os.path.dirname(script_dir)
-    output_path = os.path.join(project_root, "data", "articles.json")
-    
+    default_output = os.path.join(project_root, "data", "articles.json")
+
+    parser = argparse.ArgumentParser(description="导出文章数据")
+    parser.add_argument("output", nargs="?", default=default_output, help="输出文件（.gz / .zst 结尾时自动压缩）")
+    parser.add_argument("--format", choices=["json", "ndjson"], help="默认按扩展名判断（.ndjson / .jsonl 为 ndjson）")
+    parser.add_argument("--compress", choices=["auto", "none", "gzip", "zstd"], default="auto")
+    parser.add_argument("--since", help="只导出该时间之后新增或修改的文章，例如 2026-01-01 或 2026-01-01T08:00:00+08:00")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE, help="每批读取的文章数")
+    args = parser.parse_args()
+
     print("开始导出文章数据...")
-    count = export_articles(output_path)
+    count = export_articles(
+        args.output,
+        fmt=args.format,
+        compression=None if args.compress == "none" else args.compress,
+        since=args.since,
+        batch_size=args.batch_size
+    )
     print(f"导出完成！共 {count} 篇文章")
-
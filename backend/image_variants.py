@@ -0,0 +1,267 @@
+"""
+图片缩放与格式转换（/api/images/{path}?w=&h=&fmt=）
+- 首次请求时在进程池中解码、缩放、编码（Pillow），结果缓存到磁盘的变体目录
+- 变体目录按大小上限做 LRU 淘汰：命中时更新文件的修改时间，超限时删除最久未使用的文件
+- fmt=auto 时按 Accept 选择 AVIF / WebP，都不支持时输出 JPEG（PNG / GIF 源文件输出 PNG）
+- 同时给出 w 和 h 时按比例裁剪居中（与前端 object-fit: cover 一致）；只给一个时等比缩放；不放大
+- w / h 向上取整到固定的尺寸档位（IMAGE_SIZE_BUCKETS），每个源文件的变体数量有上限，
+  任意宽高的请求不会不断生成新文件、挤掉常用的变体
+- 源文件的大小和修改时间参与缓存键，替换源文件后自动生成新变体
+内容寻址存储（/data/covers）中的文件内容不会变，响应带 immutable 长期缓存头；
+其他路径的文件可能被替换，使用较短的缓存时间 + ETag
+"""
+import asyncio
+import hashlib
+import io
+import os
+import time
+from typing import Optional
+
+from fastapi import HTTPException, Response, status
+from PIL import Image, ImageOps, features
+
+from concurrency import BoundedProcessPool, run_blocking
+from conditional import is_not_modified
+from cover_store import COVER_STORE_DIR, DATA_DIR
+
+IMAGE_VARIANT_DIR = os.getenv("IMAGE_VARIANT_DIR", os.path.join(DATA_DIR, "variants"))
+# 变体目录的大小上限（MB），超过后按 LRU 淘汰到上限的 90%
+IMAGE_VARIANT_CACHE_MB = int(os.getenv("IMAGE_VARIANT_CACHE_MB", "1024"))
+# 缩放进程数和排队上限（每个 worker 进程）
+IMAGE_RESIZE_WORKERS = int(os.getenv("IMAGE_RESIZE_WORKERS", "2"))
+IMAGE_RESIZE_QUEUE_LIMIT = int(os.getenv("IMAGE_RESIZE_QUEUE_LIMIT", "32"))
+# 允许请求的最大宽高
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "2048"))
+# 宽高档位（包含封面缩略图的宽度 320 / 640 / 960），请求的 w / h 向上取整到其中之一
+IMAGE_SIZE_BUCKETS = tuple(sorted(
+    {int(size) for size in os.getenv("IMAGE_SIZE_BUCKETS", "160,320,480,640,960,1280,1600,2048").split(",")
+     if size.strip() and int(size) <= IMAGE_MAX_DIMENSION} | {IMAGE_MAX_DIMENSION}
+))
+
+# 各格式的编码参数
+FORMATS = {
+    "avif": {"format": "AVIF", "media_type": "image/avif", "options": {"quality": 55}},
+    "webp": {"format": "WEBP", "media_type": "image/webp", "options": {"quality": 80, "method": 4}},
+    "jpeg": {"format": "JPEG", "media_type": "image/jpeg", "options": {"quality": 82, "optimize": True, "progressive": True}},
+    "png": {"format": "PNG", "media_type": "image/png", "options": {"optimize": True}},
+}
+SOURCE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".avif"}
+
+# 修改缓存格式或编码参数时递增，使旧变体失效
+VARIANT_VERSION = 1
+# 命中时最多每隔多久更新一次修改时间（秒），避免每次请求都写 inode
+TOUCH_INTERVAL = 3600
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "public, max-age=86400"
+
+
+def _available_formats():
+    available = {"jpeg", "png"}
+    if features.check("webp"):
+        available.add("webp")
+    if "avif" in features.get_supported_modules() and features.check("avif"):
+        available.add("avif")
+    return available
+
+
+AVAILABLE_FORMATS = _available_formats()
+
+
+def render_variant(source_path: str, width: Optional[int], height: Optional[int], fmt: str) -> bytes:
+    """解码、缩放并编码（在进程池中执行）"""
+    with Image.open(source_path) as image:
+        if image.format == "JPEG" and (width or height):
+            # JPEG 解码时直接按 1/2、1/4、1/8 缩小，大图解码快数倍
+            image.draft("RGB", (width or image.width, height or image.height))
+        image = ImageOps.exif_transpose(image)
+        if width and height:
+            if width < image.width or height < image.height:
+                image = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+        elif width or height:
+            image.thumbnail((width or image.width, height or image.height), Image.Resampling.LANCZOS)
+
+        if fmt == "jpeg":
+            if image.mode in ("RGBA", "LA", "P"):
+                image = image.convert("RGBA")
+                background = Image.new("RGB", image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel("A"))
+                image = background
+            elif image.mode != "RGB":
+                image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+
+        output = io.BytesIO()
+        spec = FORMATS[fmt]
+        image.save(output, spec["format"], **spec["options"])
+        return output.getvalue()
+
+
+class VariantCache:
+    """磁盘上的变体缓存（多个 worker 进程共用同一个目录）"""
+
+    def __init__(self, root: str = IMAGE_VARIANT_DIR, max_bytes: int = IMAGE_VARIANT_CACHE_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        # 本进程估计的目录大小（None 表示尚未扫描）；超过上限时重新扫描并淘汰
+        self._size = None
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def path_for(self, key: str, fmt: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.{fmt}")
+
+    def get(self, path: str) -> Optional[bytes]:
+        try:
+            mtime = os.stat(path).st_mtime
+            with open(path, "rb") as f:
+                content = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        now = time.time()
+        if now - mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(path, (now, now))
+            except FileNotFoundError:
+                pass
+        self.hits += 1
+        return content
+
+    def put(self, path: str, content: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        if self._size is None:
+            self._size = self._scan()[1]
+        else:
+            self._size += len(content)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _scan(self):
+        entries = []
+        total = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                try:
+                    stat = os.stat(os.path.join(directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(directory, name)))
+                total += stat.st_size
+        return entries, total
+
+    def evict(self):
+        """按修改时间（最近使用时间）从旧到新删除，直到目录大小降到上限的 90%"""
+        entries, total = self._scan()
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evicted += 1
+        self._size = total
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "evicted": self.evicted, "bytes": self._size}
+
+
+variant_cache = VariantCache()
+resize_pool = BoundedProcessPool(
+    IMAGE_RESIZE_WORKERS, IMAGE_RESIZE_QUEUE_LIMIT, "图片处理繁忙，请稍后重试", 1
+)
+# 正在生成的变体（同一个进程内的并发请求只生成一次）
+_pending = {}
+
+
+def resolve_source(path: str) -> str:
+    """/api/images/ 后面的路径 -> data 目录中的源文件（不存在或不允许时抛出 404）"""
+    source = os.path.normpath(os.path.join(DATA_DIR, path))
+    variant_root = os.path.join(os.path.normpath(IMAGE_VARIANT_DIR), "")
+    if (
+        not source.startswith(os.path.join(DATA_DIR, ""))
+        or source.startswith(variant_root)
+        or os.path.splitext(source)[1].lower() not in SOURCE_EXTENSIONS
+        or not os.path.isfile(source)
+    ):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="图片不存在")
+    return source
+
+
+def choose_format(fmt: str, accept: str, source: str) -> str:
+    if fmt != "auto":
+        if fmt not in AVAILABLE_FORMATS:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"不支持的图片格式: {fmt}")
+        return fmt
+    accept = accept or ""
+    for candidate in ("avif", "webp"):
+        if f"image/{candidate}" in accept and candidate in AVAILABLE_FORMATS:
+            return candidate
+    # 可能带透明通道的图片保留 PNG
+    return "png" if source.lower().endswith((".png", ".gif")) else "jpeg"
+
+
+def _variant_key(source: str, width, height, fmt: str) -> str:
+    stat = os.stat(source)
+    seed = f"{os.path.relpath(source, DATA_DIR)}|{stat.st_size}|{stat.st_mtime_ns}|{width}|{height}|{fmt}|{VARIANT_VERSION}"
+    return hashlib.sha256(seed.encode("utf-8")).hexdigest()
+
+
+async def _render_cached(source: str, width, height, fmt: str, path: str) -> bytes:
+    content = await run_blocking(variant_cache.get, path)
+    if content is not None:
+        return content
+    future = _pending.get(path)
+    if future is None:
+        future = _pending[path] = asyncio.ensure_future(_render_and_store(source, width, height, fmt, path))
+        future.add_done_callback(lambda _: _pending.pop(path, None))
+    return await asyncio.shield(future)
+
+
+async def _render_and_store(source: str, width, height, fmt: str, path: str) -> bytes:
+    try:
+        content = await resize_pool.run(render_variant, source, width, height, fmt)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        # 文件损坏或不是图片
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=f"无法处理图片: {e}")
+    await run_blocking(variant_cache.put, path, content)
+    return content
+
+
+def bucket_size(size: Optional[int]) -> Optional[int]:
+    """向上取整到最近的尺寸档位（size 不超过 IMAGE_MAX_DIMENSION）"""
+    if size is None:
+        return None
+    return next(bucket for bucket in IMAGE_SIZE_BUCKETS if bucket >= size)
+
+
+async def serve_image(path: str, request, width: Optional[int], height: Optional[int], fmt: str) -> Response:
+    """生成（或读取缓存的）图片变体并返回"""
+    width, height = bucket_size(width), bucket_size(height)
+    source = await run_blocking(resolve_source, path)
+    negotiated = choose_format(fmt, request.headers.get("accept"), source)
+    key = await run_blocking(_variant_key, source, width, height, negotiated)
+    etag = f'"{key[:32]}"'
+
+    store_root = os.path.join(os.path.normpath(COVER_STORE_DIR), "")
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if source.startswith(store_root) else DEFAULT_CACHE_CONTROL,
+    }
+    if fmt == "auto":
+        headers["Vary"] = "Accept"
+    fmt = negotiated
+    if is_not_modified(request, etag, None):
+        return Response(status_code=304, headers=headers)
+
+    content = await _render_cached(source, width, height, fmt, variant_cache.path_for(key, fmt))
+    return Response(content=content, media_type=FORMATS[fmt]["media_type"], headers=headers)
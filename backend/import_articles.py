@@ -1,152 +1,320 @@
 """
 从 JSON 文件导入文章数据
 用于从 Git 仓库同步文章内容到数据库
+- 流式解析：JSON 数组逐个元素解码，或 NDJSON 逐行读取（.gz / .zst 自动解压）
+- 一次预取已有文章的 (标题, 发布时间) -> id，不再逐篇查询
+- 分批写入：新文章批量 INSERT，已有文章按主键 upsert（SQLite ON CONFLICT / MySQL ON DUPLICATE KEY）
+- 每批提交一次并记录进度，中断后重新运行会从上次提交的位置继续
+
+用法：
+  python import_articles.py
+  python import_articles.py ../data/articles.ndjson.gz --batch-size 1000
+  python import_articles.py --restart   # 忽略上次的进度，从头导入
 """
+import argparse
+import gzip
+import io
+import itertools
 import json
 import os
-import re
-from datetime import datetime
+import time
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from database import SessionLocal
-from models import Article
+from dates import parse_datetime, parse_datetimes
+from models import Article, utcnow
+from response_cache import response_cache
+from search import rebuild_search_index
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 每批写入（并提交）的文章数
+IMPORT_BATCH_SIZE = 500
+# 流式解析时每次读取的字符数
+READ_CHUNK_SIZE = 1024 * 1024
+# 更新已有文章时写入的列
+UPDATE_COLUMNS = ("author", "original_url", "category", "content", "excerpt")
 
 
 def parse_iso_date(date_str):
     """
-    解析 ISO 格式日期字符串，兼容 Python 3.6 及以下版本
+    解析 ISO 格式日期字符串（兼容旧调用，批量导入使用 dates.parse_datetimes）
     """
     if not date_str:
         return None
-    
+    parsed = parse_datetime(date_str)
+    if parsed is None:
+        print(f"警告: 无法解析日期 '{date_str}'")
+    return parsed
+
+
+def _open_input(path):
+    """以文本方式打开输入文件（.gz / .zst 自动解压）"""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("读取 .zst 文件需要安装 zstandard：pip install zstandard")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        return io.TextIOWrapper(reader, encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def iter_records(f, chunk_size=READ_CHUNK_SIZE):
+    """流式解析文章记录：JSON 数组（逐个元素解码，不把整个文件读进内存）或 NDJSON（每行一篇）"""
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size)
+    pos = 0
+    while pos < len(buffer) and buffer[pos].isspace():
+        pos += 1
+    if buffer[pos:pos + 1] != "[":
+        # NDJSON：补齐第一块中被截断的最后一行，之后逐行读取
+        first = buffer[pos:] + f.readline()
+        for line in itertools.chain(first.splitlines(), f):
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+        return
+
+    pos += 1
+    eof = False
+    while True:
+        # 跳过空白和元素之间的逗号
+        while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ","):
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            if pos >= len(buffer):
+                raise json.JSONDecodeError("需要更多数据", buffer, pos)
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # 元素跨越了读取块的边界：继续读取后重试
+            if eof:
+                raise
+            more = f.read(chunk_size)
+            eof = not more
+            buffer = buffer[pos:] + more
+            pos = 0
+            continue
+        yield record
+        pos = end
+
+
+def _fingerprint(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _load_progress(progress_file, input_file):
+    """上次中断前已提交的记录数（输入文件变化后从头开始）"""
     try:
-        # Python 3.7+ 使用 fromisoformat
-        if hasattr(datetime, 'fromisoformat'):
-            # 处理时区信息
-            if 'Z' in date_str:
-                date_str = date_str.replace('Z', '+00:00')
-            elif date_str.endswith('+00:00'):
-                pass
-            elif '+' in date_str or date_str.count('-') > 2:
-                # 有时区信息
-                pass
-            return datetime.fromisoformat(date_str)
+        with open(progress_file, "r", encoding="utf-8") as f:
+            progress = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return 0
+    if progress.get("fingerprint") != _fingerprint(input_file):
+        return 0
+    return progress.get("records", 0)
+
+
+def _save_progress(progress_file, input_file, records):
+    tmp_file = f"{progress_file}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": _fingerprint(input_file), "records": records}, f)
+    os.replace(tmp_file, progress_file)
+
+
+def _key(title, publish_date):
+    # 与原先在 SQL 中比较一致：忽略时区，只比较日期时间本身
+    if publish_date is not None and publish_date.tzinfo is not None:
+        publish_date = publish_date.replace(tzinfo=None)
+    return title, publish_date
+
+
+def _prefetch_keys(db):
+    """一次读取已有文章的 (标题, 发布时间) -> id"""
+    rows = db.execute(select(Article.id, Article.title, Article.publish_date))
+    return {_key(title, publish_date): article_id for article_id, title, publish_date in rows}
+
+
+def _upsert_statement(dialect_name):
+    """按主键 upsert：主键冲突时只更新 UPDATE_COLUMNS（文章在预取之后被删除时重新插入）"""
+    if dialect_name == "sqlite":
+        statement = sqlite_insert(Article)
+        return statement.on_conflict_do_update(
+            index_elements=[Article.id],
+            set_={**{column: statement.excluded[column] for column in UPDATE_COLUMNS}, "updated_at": utcnow()}
+        )
+    statement = mysql_insert(Article)
+    return statement.on_duplicate_key_update(
+        {**{column: statement.inserted[column] for column in UPDATE_COLUMNS}, "updated_at": utcnow()}
+    )
+
+
+def _article_values(article_data, publish_date):
+    values = {
+        "title": article_data.get('title'),
+        "publish_date": publish_date,
+        "original_url": article_data.get('original_url'),
+        "category": article_data.get('category'),
+        "content": article_data.get('content'),
+        "excerpt": article_data.get('excerpt'),
+    }
+    # 记录中没有作者时：新文章使用空字符串，已有文章保留原值
+    if 'author' in article_data:
+        values["author"] = article_data['author']
+    return values
+
+
+def _write_batch(db, batch, keys, update_existing):
+    """
+    写入一批 (键, 列值)，返回 (新导入, 更新, 未变化, 跳过) 的数量
+    已有文章只在字段确实变化时才写入，不会无意义地刷新 updated_at（增量导出和向量刷新依赖它）
+    """
+    inserts = {}
+    updates = {}
+    skipped = 0
+    for key, values in batch:
+        article_id = keys.get(key)
+        if article_id is None:
+            # 同一批中重复的文章：以后出现的为准
+            inserts.setdefault(key, {"author": ""}).update(values)
+        elif update_existing:
+            updates.setdefault(article_id, {"id": article_id}).update(values)
         else:
-            # Python 3.6 及以下版本使用 strptime
-            # 移除时区信息（Z 或 +00:00）
-            date_str_clean = re.sub(r'[Z\+].*$', '', date_str)
-            
-            # 尝试不同的日期格式
-            formats = [
-                '%Y-%m-%dT%H:%M:%S',      # 2025-12-23T00:00:00
-                '%Y-%m-%dT%H:%M:%S.%f',   # 2025-12-23T00:00:00.000000
-                '%Y-%m-%d',               # 2025-12-23
+            skipped += 1
+
+    changed = []
+    if updates:
+        current = {
+            row[0]: row[1:] for row in db.execute(
+                select(Article.id, *[getattr(Article, column) for column in UPDATE_COLUMNS])
+                .where(Article.id.in_(updates))
+            )
+        }
+        for article_id, values in updates.items():
+            old = current.get(article_id)
+            if old is not None:
+                values.setdefault("author", old[0])
+            values.setdefault("author", "")
+            if old != tuple(values[column] for column in UPDATE_COLUMNS):
+                changed.append(values)
+        if changed:
+            db.execute(_upsert_statement(db.get_bind().dialect.name), changed)
+
+    if inserts:
+        # 新文章的 id 直接取自插入结果（标题可能重复，不能插入后再按标题查询）
+        if db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+            inserted_ids = db.execute(
+                insert(Article).returning(Article.id, sort_by_parameter_order=True), list(inserts.values())
+            ).scalars().all()
+        else:
+            # MySQL 不支持 RETURNING：逐行插入，读取自增主键
+            inserted_ids = [
+                db.execute(insert(Article), values).inserted_primary_key[0] for values in inserts.values()
             ]
-            
-            for fmt in formats:
-                try:
-                    return datetime.strptime(date_str_clean, fmt)
-                except ValueError:
-                    continue
-            
-            # 如果所有格式都失败，返回当前时间
-            print(f"警告: 无法解析日期 '{date_str}'，使用当前时间")
-            return datetime.now()
-    except Exception as e:
-        print(f"警告: 解析日期 '{date_str}' 时出错: {e}，使用当前时间")
-        return datetime.now()
+        keys.update(zip(inserts, inserted_ids))
+
+    return len(inserts), len(changed), len(updates) - len(changed), skipped
 
 
-def import_articles(input_file="data/articles.json", update_existing=True):
+def import_articles(input_file="data/articles.json", update_existing=True, batch_size=IMPORT_BATCH_SIZE,
+                    progress_file=None, resume=True):
     """
-    从 JSON 文件导入文章
+    从 JSON / NDJSON 文件导入文章
     
     Args:
         input_file: JSON 文件路径
         update_existing: 如果文章已存在（根据标题和发布时间判断），是否更新
+        batch_size: 每批写入并提交的文章数
+        progress_file: 进度文件，默认为 输入文件.progress；导入完成后删除
+        resume: 是否从上次中断的位置继续
     """
+    # 检查文件是否存在
+    if not os.path.exists(input_file):
+        print(f"文件不存在: {input_file}")
+        return 0
+
+    progress_file = progress_file or f"{input_file}.progress"
+    resume_from = _load_progress(progress_file, input_file) if resume else 0
+    if resume_from:
+        print(f"从上次中断的位置继续：跳过已提交的 {resume_from} 条记录")
+
     db = SessionLocal()
     try:
-        # 检查文件是否存在
-        if not os.path.exists(input_file):
-            print(f"文件不存在: {input_file}")
-            return 0
-        
-        # 读取 JSON 文件
-        with open(input_file, 'r', encoding='utf-8') as f:
-            articles_data = json.load(f)
-        
-        if not articles_data:
-            print("JSON 文件中没有文章数据")
-            return 0
-        
+        keys = _prefetch_keys(db)
         imported_count = 0
         updated_count = 0
+        unchanged_count = 0
         skipped_count = 0
-        
-        for article_data in articles_data:
-            try:
-                # 解析发布时间
-                publish_date_str = article_data.get('publish_date')
-                if publish_date_str:
-                    publish_date = parse_iso_date(publish_date_str)
-                    if not publish_date:
-                        print(f"警告: 文章 '{article_data.get('title')}' 发布时间解析失败，跳过")
-                        skipped_count += 1
-                        continue
-                else:
-                    print(f"警告: 文章 '{article_data.get('title')}' 没有发布时间，跳过")
+        records = 0
+        start = time.perf_counter()
+        pending = []
+
+        def flush():
+            nonlocal imported_count, updated_count, unchanged_count, skipped_count
+            rows = []
+            publish_dates = parse_datetimes(article_data.get('publish_date') for article_data in pending)
+            for article_data, publish_date in zip(pending, publish_dates):
+                if publish_date is None:
+                    reason = "发布时间解析失败" if article_data.get('publish_date') else "没有发布时间"
+                    print(f"警告: 文章 '{article_data.get('title')}' {reason}，跳过")
                     skipped_count += 1
                     continue
-                
-                # 检查文章是否已存在（根据标题和发布时间）
-                existing_article = db.query(Article).filter(
-                    Article.title == article_data.get('title'),
-                    Article.publish_date == publish_date
-                ).first()
-                
-                if existing_article:
-                    if update_existing:
-                        # 更新现有文章
-                        existing_article.author = article_data.get('author', existing_article.author)
-                        existing_article.original_url = article_data.get('original_url')
-                        existing_article.category = article_data.get('category')
-                        existing_article.content = article_data.get('content')
-                        existing_article.excerpt = article_data.get('excerpt')
-                        # updated_at 会自动更新
-                        updated_count += 1
-                        print(f"更新文章: {article_data.get('title')}")
-                    else:
-                        skipped_count += 1
-                        print(f"跳过已存在的文章: {article_data.get('title')}")
-                else:
-                    # 创建新文章
-                    new_article = Article(
-                        title=article_data.get('title'),
-                        publish_date=publish_date,
-                        author=article_data.get('author', ''),
-                        original_url=article_data.get('original_url'),
-                        category=article_data.get('category'),
-                        content=article_data.get('content'),
-                        excerpt=article_data.get('excerpt')
-                    )
-                    db.add(new_article)
-                    imported_count += 1
-                    print(f"导入文章: {article_data.get('title')}")
-                    
-            except Exception as e:
-                print(f"处理文章 '{article_data.get('title')}' 时出错: {e}")
-                continue
-        
-        # 提交更改
-        db.commit()
-        
-        print(f"\n导入完成！")
+                rows.append((_key(article_data.get('title'), publish_date), _article_values(article_data, publish_date)))
+            imported, updated, unchanged, skipped = _write_batch(db, rows, keys, update_existing)
+            db.commit()
+            # 导入绕过了文章接口，通知所有 worker 丢弃文章接口的响应缓存
+            response_cache.invalidate("articles")
+            response_cache.invalidate("semantic")
+            _save_progress(progress_file, input_file, records)
+            imported_count += imported
+            updated_count += updated
+            unchanged_count += unchanged
+            skipped_count += skipped
+            pending.clear()
+            elapsed = time.perf_counter() - start
+            print(f"已处理 {records} 条（{(records - resume_from) / elapsed:.0f} 条/秒）")
+
+        with _open_input(input_file) as f:
+            for article_data in iter_records(f):
+                records += 1
+                if records <= resume_from:
+                    continue
+                if not isinstance(article_data, dict):
+                    print(f"警告: 第 {records} 条记录不是对象，跳过")
+                    skipped_count += 1
+                    continue
+                pending.append(article_data)
+                if len(pending) >= batch_size:
+                    flush()
+            if pending:
+                flush()
+
+        if records == 0:
+            print("JSON 文件中没有文章数据")
+            return 0
+
+        elapsed = time.perf_counter() - start
+        # 导入绕过了文章接口，重建全文索引
+        rebuild_search_index()
+        if os.path.exists(progress_file):
+            os.remove(progress_file)
+
+        print(f"\n导入完成！耗时 {elapsed:.2f}s（{(records - resume_from) / elapsed:.0f} 条/秒）")
         print(f"  新导入: {imported_count} 篇")
         print(f"  更新: {updated_count} 篇")
+        print(f"  未变化: {unchanged_count} 篇")
         print(f"  跳过: {skipped_count} 篇")
-        print(f"  总计: {imported_count + updated_count + skipped_count} 篇")
-        
+        print(f"  总计: {imported_count + updated_count + unchanged_count + skipped_count} 篇")
+
         return imported_count + updated_count
-        
+
     except Exception as e:
         db.rollback()
         print(f"导入文章失败: {e}")
@@ -161,9 +329,20 @@ if __name__ == "__main__":
     # 默认从项目根目录的 data 文件夹读取
     script_dir = os.path.dirname(os.path.abspath(__file__))
     project_root = os.path.dirname(script_dir)
-    input_path = os.path.join(project_root, "data", "articles.json")
-    
+    default_input = os.path.join(project_root, "data", "articles.json")
+
+    parser = argparse.ArgumentParser(description="导入文章数据")
+    parser.add_argument("input", nargs="?", default=default_input, help="JSON 数组或 NDJSON 文件（支持 .gz / .zst）")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="每批写入并提交的文章数")
+    parser.add_argument("--no-update", action="store_true", help="跳过已存在的文章")
+    parser.add_argument("--restart", action="store_true", help="忽略上次的进度，从头导入")
+    args = parser.parse_args()
+
     print("开始导入文章数据...")
-    count = import_articles(input_path, update_existing=True)
+    count = import_articles(
+        args.input,
+        update_existing=not args.no_update,
+        batch_size=args.batch_size,
+        resume=not args.restart
+    )
     print(f"导入完成！共处理 {count} 篇文章")
-
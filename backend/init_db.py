@@ -5,6 +5,7 @@
 from database import engine, SessionLocal, Base
 from models import Product, User, Memo, Article, Book
 from auth import get_password_hash
+from pagination import ensure_sort_columns
 from datetime import datetime
 
 
@@ -12,6 +13,8 @@ def init_db():
     """初始化数据库"""
     # 创建所有表
     Base.metadata.create_all(bind=engine)
+    # 已有数据库补充排序列索引，统一 SQLite 中的时间格式（游标分页直接按列排序）
+    ensure_sort_columns(engine, (Article, Book))
     
     db = SessionLocal()
     try:
@@ -0,0 +1,710 @@
+"""
+纯 Python 倒排索引（不依赖数据库全文索引的检索后端）
+- 倒排表用 array 紧凑存储：每个词元一段按槽位升序的文档槽位（uint32）和加权词频（uint16）
+- BM25 打分，查询中的所有词元都必须命中（AND）
+- 分段结构：
+  基础段：持久化到 data/ 下的文件，通过 mmap 只读映射；词表按 UTF-8 排序后二分查找，加载时不需要解析
+  增量段：内存中新增/修改的文档；修改和删除通过墓碑标记旧槽位
+- 增量修改同时追加到日志文件（.journal），其他 worker 进程查询前回放日志；
+  日志累计到阈值后由后台线程合并成新的基础段（也可以运行 python search.py --compact）：
+  只在拍快照和替换文件时短暂持有锁，写新基础段期间查询和写入都不受影响；
+  合并期间新追加的日志保留下来，由新的基础段继续回放（.compact.lock 保证同一时间只有一个进程合并）
+分词由调用方完成（见 search.py），本模块只处理词元
+"""
+import bisect
+import heapq
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from contextlib import contextmanager
+from itertools import chain, groupby
+from operator import itemgetter
+from typing import NamedTuple
+
+try:
+    import fcntl
+except ImportError:  # Windows 本地开发为单进程，不需要文件锁
+    fcntl = None
+
+# 日志累计多少条修改后合并基础段
+COMPACT_OPS = int(os.getenv("SEARCH_INDEX_COMPACT_OPS", "1000"))
+
+MAGIC = b"IIDX"
+FORMAT_VERSION = 1
+# 词频用 uint16 存储
+MAX_TF = 65535
+
+
+def _file_stamp(path):
+    """文件标识（inode、修改时间、大小），用于发现其他进程替换了文件"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+class _Segment:
+    """
+    mmap 映射的只读基础段
+    文件格式：MAGIC | 头部长度 | 头部 JSON | 对齐 | doc_ids | doc_lens | term_offsets |
+              posting_offsets | posting_docs（以上 uint32）| posting_tfs（uint16）| 词表（UTF-8）
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mm)
+        self._views = [view]
+        if view[:4] != MAGIC:
+            self.close()
+            raise ValueError("not an index file")
+        (header_len,) = struct.unpack_from("<I", self._mm, 4)
+        self.header = json.loads(view[8:8 + header_len].tobytes())
+        if self.header.get("version") != FORMAT_VERSION or self.header.get("byteorder") != sys.byteorder:
+            self.close()
+            raise ValueError("incompatible index format")
+
+        docs, terms, postings = self.header["docs"], self.header["terms"], self.header["postings"]
+        pos = _aligned(8 + header_len)
+
+        def take(count, typecode, itemsize):
+            nonlocal pos
+            section = view[pos:pos + count * itemsize].cast(typecode)
+            self._views.append(section)
+            pos += count * itemsize
+            return section
+
+        self.doc_ids = take(docs, "I", 4)
+        self.doc_lens = take(docs, "I", 4)
+        self.term_offsets = take(terms + 1, "I", 4)
+        self.posting_offsets = take(terms + 1, "I", 4)
+        self.posting_docs = take(postings, "I", 4)
+        self.posting_tfs = take(postings, "H", 2)
+        self.term_blob = view[pos:pos + self.term_offsets[terms]]
+        self._views.append(self.term_blob)
+        self.term_count = terms
+
+    def _term_bytes(self, index: int) -> bytes:
+        return self.term_blob[self.term_offsets[index]:self.term_offsets[index + 1]].tobytes()
+
+    def term(self, index: int) -> str:
+        return self._term_bytes(index).decode("utf-8")
+
+    def _lower_bound(self, key: bytes) -> int:
+        lo, hi = 0, self.term_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term_bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find(self, term: str) -> int:
+        """词元在词表中的位置，不存在时返回 -1"""
+        key = term.encode("utf-8")
+        index = self._lower_bound(key)
+        if index < self.term_count and self._term_bytes(index) == key:
+            return index
+        return -1
+
+    def prefix_range(self, prefix: str) -> range:
+        """以 prefix 开头的词元位置范围"""
+        key = prefix.encode("utf-8")
+        start = end = self._lower_bound(key)
+        while end < self.term_count and self._term_bytes(end).startswith(key):
+            end += 1
+        return range(start, end)
+
+    def postings(self, index: int):
+        start, end = self.posting_offsets[index], self.posting_offsets[index + 1]
+        return self.posting_docs[start:end], self.posting_tfs[start:end]
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        try:
+            self._mm.close()
+        except BufferError:
+            # 还有切片未释放，交给垃圾回收关闭
+            pass
+
+
+def _aligned(pos: int, size: int = 4) -> int:
+    return pos + (-pos % size)
+
+
+def _write_segment(path: str, doc_ids, doc_lens, total_len: int, field_weights: dict, terms):
+    """写入基础段；terms 是按词元排序的 (词元, 槽位数组, 词频数组) 序列"""
+    term_offsets = array("I", [0])
+    posting_offsets = array("I", [0])
+    posting_docs = array("I")
+    posting_tfs = array("H")
+    blob = bytearray()
+    for term, docs, tfs in terms:
+        blob += term.encode("utf-8")
+        term_offsets.append(len(blob))
+        posting_docs.extend(docs)
+        posting_tfs.extend(tfs)
+        posting_offsets.append(len(posting_docs))
+
+    header = json.dumps({
+        "version": FORMAT_VERSION,
+        "byteorder": sys.byteorder,
+        "fields": field_weights,
+        "docs": len(doc_ids),
+        "terms": len(term_offsets) - 1,
+        "postings": len(posting_docs),
+        "total_len": total_len,
+    }).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        f.write(b"\0" * (_aligned(8 + len(header)) - 8 - len(header)))
+        for section in (doc_ids, doc_lens, term_offsets, posting_offsets, posting_docs, posting_tfs):
+            section.tofile(f)
+        f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class _State(NamedTuple):
+    """合并用的索引状态快照：基础段是只读映射（合并期间不会被替换），增量段是复制出来的"""
+    segment: object
+    base_size: int
+    deleted: set
+    delta_ids: array
+    delta_lens: array
+    delta_slots: dict
+    delta_postings: dict
+    total_len: int
+
+    def doc_len(self, slot: int) -> int:
+        if slot < self.base_size:
+            return self.segment.doc_lens[slot]
+        return self.delta_lens[slot - self.base_size]
+
+
+def _write_merged(path: str, state: _State, field_weights: dict):
+    """把快照中的基础段和增量段合并写成新的基础段文件"""
+    segment = state.segment
+    # 有效文档按 id 排序后分配新槽位，基础段的 doc_ids 保持有序以便二分查找
+    live = []
+    for slot in range(state.base_size):
+        if slot not in state.deleted:
+            live.append((segment.doc_ids[slot], slot))
+    live.extend(state.delta_slots.items())
+    live.sort()
+
+    remap = array("i", [-1]) * (state.base_size + len(state.delta_ids))
+    doc_ids = array("I")
+    doc_lens = array("I")
+    for new_slot, (doc_id, slot) in enumerate(live):
+        remap[slot] = new_slot
+        doc_ids.append(doc_id)
+        doc_lens.append(state.doc_len(slot))
+    # 只有追加、没有删除和乱序时槽位不变，倒排表可以直接拼接
+    identity = all(new_slot == slot for new_slot, (_, slot) in enumerate(live)) and len(live) == len(remap)
+
+    def merged_terms():
+        base_terms = ((segment.term(i), 0, i) for i in range(segment.term_count)) if segment else ()
+        delta_terms = ((term, 1, None) for term in sorted(state.delta_postings))
+        for term, sources in groupby(heapq.merge(base_terms, delta_terms), key=itemgetter(0)):
+            parts = []
+            for _, source, index in sources:
+                parts.append(segment.postings(index) if source == 0 else state.delta_postings[term])
+            if identity:
+                docs, tfs = array("I"), array("H")
+                for part_docs, part_tfs in parts:
+                    docs.extend(part_docs)
+                    tfs.extend(part_tfs)
+                yield term, docs, tfs
+                continue
+            pairs = []
+            for part_docs, part_tfs in parts:
+                for slot, tf in zip(part_docs, part_tfs):
+                    new_slot = remap[slot]
+                    if new_slot >= 0:
+                        pairs.append((new_slot, tf))
+            if pairs:
+                pairs.sort()
+                yield term, array("I", map(itemgetter(0), pairs)), array("H", map(itemgetter(1), pairs))
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    _write_segment(path, doc_ids, doc_lens, state.total_len, field_weights, merged_terms())
+
+
+class _Postings:
+    """一个词元的倒排表：基础段和增量段两部分，都按槽位升序，增量段的槽位都大于基础段"""
+
+    __slots__ = ("parts",)
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    def __len__(self):
+        return sum(len(docs) for docs, _ in self.parts)
+
+    def slots(self):
+        return chain.from_iterable(docs for docs, _ in self.parts)
+
+    def items(self):
+        for docs, tfs in self.parts:
+            yield from zip(docs, tfs)
+
+    def lookup(self, slot: int) -> int:
+        for docs, tfs in self.parts:
+            if docs and docs[0] <= slot <= docs[-1]:
+                index = bisect.bisect_left(docs, slot)
+                if docs[index] == slot:
+                    return tfs[index]
+        return 0
+
+
+class _MergedPostings:
+    """前缀匹配的多个词元合并后的倒排表（槽位 -> 词频之和）"""
+
+    __slots__ = ("tfs",)
+
+    def __init__(self, tfs: dict):
+        self.tfs = tfs
+
+    def __len__(self):
+        return len(self.tfs)
+
+    def slots(self):
+        return self.tfs.keys()
+
+    def items(self):
+        return self.tfs.items()
+
+    def lookup(self, slot: int) -> int:
+        return self.tfs.get(slot, 0)
+
+
+class InvertedIndex:
+    """
+    倒排索引（线程安全；多进程通过文件锁 + 日志同步）
+    field_weights：字段名 -> 整数权重，词频和文档长度都按权重累加（标题命中一次相当于正文命中多次）
+    """
+
+    def __init__(self, path: str, field_weights: dict, k1: float = 1.2, b: float = 0.75,
+                 compact_ops: int = COMPACT_OPS):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.lock_path = path + ".lock"
+        self.compact_lock_path = path + ".compact.lock"
+        self.field_weights = dict(field_weights)
+        self.k1 = k1
+        self.b = b
+        self.compact_ops = compact_ops
+        self.loaded = False
+        self._lock = threading.RLock()
+        self._segment = None
+        self._stamp = None
+        self._journal_pos = 0
+        self._journal_ops = 0
+        self._compactor = None
+        self._reset_delta()
+
+    # ==================== 状态 ====================
+
+    def _reset_delta(self):
+        segment = self._segment
+        self._base_size = len(segment.doc_ids) if segment else 0
+        self._live_docs = self._base_size
+        self._total_len = segment.header["total_len"] if segment else 0
+        self._delta_ids = array("I")
+        self._delta_lens = array("I")
+        self._delta_slots = {}  # 文档 id -> 增量段中的有效槽位
+        self._delta_postings = {}  # 词元 -> (槽位数组, 词频数组)
+        self._deleted = set()  # 已删除/已被新版本替换的槽位
+
+    def _close_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+    def _doc_id(self, slot: int) -> int:
+        if slot < self._base_size:
+            return self._segment.doc_ids[slot]
+        return self._delta_ids[slot - self._base_size]
+
+    def _doc_len(self, slot: int) -> int:
+        if slot < self._base_size:
+            return self._segment.doc_lens[slot]
+        return self._delta_lens[slot - self._base_size]
+
+    def _find_slot(self, doc_id: int):
+        slot = self._delta_slots.get(doc_id)
+        if slot is not None:
+            return slot
+        if self._segment is not None:
+            doc_ids = self._segment.doc_ids
+            index = bisect.bisect_left(doc_ids, doc_id)
+            if index < self._base_size and doc_ids[index] == doc_id and index not in self._deleted:
+                return index
+        return None
+
+    @property
+    def doc_count(self) -> int:
+        return self._live_docs
+
+    @property
+    def max_doc_id(self) -> int:
+        """有效文档的最大 id（用于和数据库比对，发现索引过期）"""
+        with self._lock:
+            best = max(self._delta_slots, default=0)
+            for slot in range(self._base_size - 1, -1, -1):
+                if slot not in self._deleted:
+                    best = max(best, self._segment.doc_ids[slot])
+                    break
+            return best
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "docs": self._live_docs,
+                "base_docs": self._base_size,
+                "base_terms": self._segment.term_count if self._segment else 0,
+                "delta_docs": len(self._delta_slots),
+                "deleted_slots": len(self._deleted),
+                "journal_ops": self._journal_ops,
+                "file_size": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            }
+
+    # ==================== 文件同步 ====================
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _compaction_lock(self, blocking: bool):
+        """合并锁：同一时间只有一个进程写新的基础段；非阻塞时拿不到锁返回 False"""
+        if fcntl is None:
+            yield True
+            return
+        os.makedirs(os.path.dirname(self.compact_lock_path) or ".", exist_ok=True)
+        with open(self.compact_lock_path, "a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def load(self) -> bool:
+        """加载基础段并回放日志；索引文件不存在或不兼容时返回 False"""
+        with self._lock, self._file_lock(exclusive=False):
+            return self._load_locked()
+
+    def _load_locked(self) -> bool:
+        self._close_segment()
+        self.loaded = False
+        self._stamp = _file_stamp(self.path)
+        self._journal_pos = 0
+        self._journal_ops = 0
+        if self._stamp is None:
+            self._reset_delta()
+            return False
+        try:
+            self._segment = _Segment(self.path)
+            if self._segment.header.get("fields") != self.field_weights:
+                raise ValueError("field weights changed")
+            self._reset_delta()
+            self._replay_journal()
+        except (ValueError, KeyError, OSError) as e:
+            print(f"Warning: search index {self.path} is unusable: {e}")
+            self._close_segment()
+            self._reset_delta()
+            return False
+        self.loaded = True
+        return True
+
+    def _replay_journal(self):
+        try:
+            f = open(self.journal_path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(self._journal_pos)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # 写入中断留下的半行
+                    break
+                entry = json.loads(line)
+                if entry["op"] == "put":
+                    self._apply_put(entry["id"], entry["len"], entry["tf"])
+                else:
+                    self._apply_delete(entry["id"])
+                self._journal_pos += len(line)
+                self._journal_ops += 1
+
+    def sync(self):
+        """其他进程修改过索引时重新加载或回放日志（查询前调用，通常只需要两次 stat）"""
+        with self._lock:
+            if _file_stamp(self.path) != self._stamp:
+                with self._file_lock(exclusive=False):
+                    self._load_locked()
+                return
+            try:
+                journal_size = os.path.getsize(self.journal_path)
+            except FileNotFoundError:
+                journal_size = 0
+            if journal_size != self._journal_pos:
+                with self._file_lock(exclusive=False):
+                    if journal_size < self._journal_pos:
+                        self._load_locked()
+                    else:
+                        self._replay_journal()
+
+    def _append_journal(self, entry: dict):
+        line = (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with open(self.journal_path, "ab") as f:
+            f.write(line)
+        self._journal_pos += len(line)
+        self._journal_ops += 1
+        if self._journal_ops >= self.compact_ops:
+            self._schedule_compaction()
+
+    def _prepare_write(self) -> bool:
+        """写入前先追上文件中的最新状态（需持有排他文件锁）；索引文件不存在时返回 False"""
+        if not self.loaded or _file_stamp(self.path) != self._stamp:
+            return self._load_locked()
+        self._replay_journal()
+        return True
+
+    # ==================== 增量修改 ====================
+
+    def _term_frequencies(self, fields: dict):
+        """按字段权重累加词频和文档长度"""
+        tf = {}
+        length = 0
+        for field, tokens in fields.items():
+            weight = self.field_weights.get(field, 1)
+            length += weight * len(tokens)
+            for token in tokens:
+                tf[token] = tf.get(token, 0) + weight
+        return tf, length
+
+    def _apply_put(self, doc_id: int, length: int, tf: dict):
+        self._apply_delete(doc_id)
+        slot = self._base_size + len(self._delta_ids)
+        self._delta_ids.append(doc_id)
+        self._delta_lens.append(length)
+        self._delta_slots[doc_id] = slot
+        for term, count in tf.items():
+            entry = self._delta_postings.get(term)
+            if entry is None:
+                entry = self._delta_postings[term] = (array("I"), array("H"))
+            entry[0].append(slot)
+            entry[1].append(min(count, MAX_TF))
+        self._live_docs += 1
+        self._total_len += length
+
+    def _apply_delete(self, doc_id: int):
+        slot = self._find_slot(doc_id)
+        if slot is None:
+            return
+        self._deleted.add(slot)
+        self._delta_slots.pop(doc_id, None)
+        self._live_docs -= 1
+        self._total_len -= self._doc_len(slot)
+
+    def put(self, doc_id: int, fields: dict):
+        """
+        新增或修改文档；fields：字段名 -> 词元列表
+        索引文件还不存在时跳过（首次查询时会从数据库完整构建）
+        """
+        if not self.loaded and not os.path.exists(self.path):
+            return
+        tf, length = self._term_frequencies(fields)
+        with self._lock, self._file_lock(exclusive=True):
+            if not self._prepare_write():
+                return
+            self._apply_put(doc_id, length, tf)
+            self._append_journal({"op": "put", "id": doc_id, "len": length, "tf": tf})
+
+    def delete(self, doc_id: int):
+        """删除文档"""
+        if not self.loaded and not os.path.exists(self.path):
+            return
+        with self._lock, self._file_lock(exclusive=True):
+            if not self._prepare_write() or self._find_slot(doc_id) is None:
+                return
+            self._apply_delete(doc_id)
+            self._append_journal({"op": "del", "id": doc_id})
+
+    def build(self, documents):
+        """从头构建索引并写入基础段；documents：可迭代的 (文档 id, fields)"""
+        with self._compaction_lock(blocking=True), self._lock, self._file_lock(exclusive=True):
+            self._close_segment()
+            self._reset_delta()
+            for doc_id, fields in documents:
+                tf, length = self._term_frequencies(fields)
+                self._apply_put(doc_id, length, tf)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            _write_merged(tmp_path, self._snapshot(), self.field_weights)
+            self._install(tmp_path, b"")
+
+    # ==================== 合并 ====================
+
+    def _snapshot(self) -> _State:
+        """当前状态的快照（需持有锁）：增量段复制一份，之后的修改不影响快照"""
+        return _State(
+            segment=self._segment,
+            base_size=self._base_size,
+            deleted=set(self._deleted),
+            delta_ids=array("I", self._delta_ids),
+            delta_lens=array("I", self._delta_lens),
+            delta_slots=dict(self._delta_slots),
+            delta_postings={term: (array("I", docs), array("H", tfs)) for term, (docs, tfs) in self._delta_postings.items()},
+            total_len=self._total_len,
+        )
+
+    def _install(self, tmp_path: str, journal_tail: bytes):
+        """用新的基础段替换旧文件，日志只保留合并之后追加的部分（需持有排他文件锁）"""
+        self._close_segment()
+        os.replace(tmp_path, self.path)
+        journal_tmp = f"{self.journal_path}.{os.getpid()}.tmp"
+        with open(journal_tmp, "wb") as f:
+            f.write(journal_tail)
+        os.replace(journal_tmp, self.journal_path)
+        self._load_locked()
+
+    def _schedule_compaction(self):
+        """在后台线程中合并（不在写入请求中执行）；本进程已有合并线程在运行时不重复启动"""
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self._compact_in_background, daemon=True)
+        self._compactor.start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact(blocking=False)
+        except Exception as e:
+            print(f"Warning: search index {self.path} compaction failed: {e}")
+
+    def compact(self, blocking: bool = True) -> bool:
+        """
+        把日志和增量段合并进基础段
+        只在拍快照和替换文件时持有锁；写新基础段期间（大索引需要数十秒）查询和写入照常进行，
+        期间追加的日志在替换后保留并回放。blocking=False 时其他进程正在合并则直接返回 False
+        """
+        with self._compaction_lock(blocking) as acquired:
+            if not acquired:
+                return False
+            with self._lock, self._file_lock(exclusive=True):
+                if not self._prepare_write():
+                    return False
+                state = self._snapshot()
+                stamp = self._stamp
+                journal_pos = self._journal_pos
+
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            _write_merged(tmp_path, state, self.field_weights)
+
+            with self._lock, self._file_lock(exclusive=True):
+                if _file_stamp(self.path) != stamp:
+                    # 期间索引被重建过，快照已过期
+                    os.remove(tmp_path)
+                    return False
+                with open(self.journal_path, "rb") as f:
+                    f.seek(journal_pos)
+                    journal_tail = f.read()
+                self._install(tmp_path, journal_tail)
+            return True
+
+    # ==================== 查询 ====================
+
+    def _term_postings(self, term: str) -> _Postings:
+        parts = []
+        if self._segment is not None:
+            index = self._segment.find(term)
+            if index >= 0:
+                parts.append(self._segment.postings(index))
+        if term in self._delta_postings:
+            parts.append(self._delta_postings[term])
+        return _Postings(parts)
+
+    def _prefix_postings(self, prefix: str) -> _MergedPostings:
+        tfs = {}
+        sources = []
+        if self._segment is not None:
+            sources.extend(self._segment.postings(i) for i in self._segment.prefix_range(prefix))
+        sources.extend(entry for term, entry in self._delta_postings.items() if term.startswith(prefix))
+        for docs, part_tfs in sources:
+            for slot, tf in zip(docs, part_tfs):
+                tfs[slot] = tfs.get(slot, 0) + tf
+        return _MergedPostings(tfs)
+
+    def search(self, groups, limit: int, offset: int = 0):
+        """
+        BM25 检索；groups：[(词元列表, 最后一个词元是否按前缀匹配)]，所有词元都必须命中
+        返回按分数降序的 [(文档 id, 分数)]
+        """
+        with self._lock:
+            postings = []
+            for tokens, prefix in groups:
+                for i, token in enumerate(tokens):
+                    if prefix and i == len(tokens) - 1:
+                        postings.append(self._prefix_postings(token))
+                    else:
+                        postings.append(self._term_postings(token))
+            if not postings or self._live_docs <= 0:
+                return []
+
+            docs = self._live_docs
+            avgdl = self._total_len / docs or 1.0
+            k1, b = self.k1, self.b
+            base_size = self._base_size
+            base_lens = self._segment.doc_lens if self._segment is not None else ()
+            delta_lens = self._delta_lens
+
+            # 先用集合运算（C 实现）求交集并去掉已删除的槽位，只给剩下的文档打分
+            postings.sort(key=len)
+            survivors = set(postings[0].slots())
+            for plist in postings[1:]:
+                survivors.intersection_update(plist.slots())
+                if not survivors:
+                    return []
+            survivors -= self._deleted
+            if not survivors:
+                return []
+
+            scores = dict.fromkeys(survivors, 0.0)
+            for plist in postings:
+                df = min(len(plist), docs)
+                idf = math.log(1 + (docs - df + 0.5) / (df + 0.5))
+                if len(plist) <= len(scores) * 4:
+                    matches = ((slot, tf) for slot, tf in plist.items() if slot in scores)
+                else:
+                    matches = ((slot, plist.lookup(slot)) for slot in survivors)
+                for slot, tf in matches:
+                    dl = base_lens[slot] if slot < base_size else delta_lens[slot - base_size]
+                    scores[slot] += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+
+            # 分数相同时 id 大的在前（与 SQLite FTS5 / MySQL 后端的排序一致）
+            doc_id = self._doc_id
+            top = heapq.nlargest(offset + limit, scores.items(), key=lambda item: (item[1], doc_id(item[0])))[offset:]
+            return [(doc_id(slot), score) for slot, score in top]
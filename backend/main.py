@@ -1,33 +1,68 @@
 import os
 from datetime import timedelta
 from typing import List
-from fastapi import FastAPI, Depends, HTTPException, status, Cookie, Header
+from fastapi import FastAPI, Depends, HTTPException, status, Cookie, Header, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.staticfiles import StaticFiles
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Optional
 
 # 导入数据库相关（必须在 models 之前）
-from database import get_db, engine, Base
+from database import get_db, get_async_db, engine, Base
 from models import Product, User, Memo, Article, Book
 from schemas import (
     UserRegister, UserLogin, Token, UserResponse,
     MemoCreate, MemoUpdate, MemoResponse,
-    ArticleCreate, ArticleUpdate, ArticleResponse,
-    BookCreate, BookUpdate, BookResponse,
+    ArticleCreate, ArticleUpdate, ArticleResponse, ArticleSummaryResponse, ArticleSearchResult,
+    BookCreate, BookUpdate, BookResponse, BookSearchResult,
     ProductCreate, ProductUpdate, ProductResponse
 )
 from auth import (
-    get_password_hash,
-    verify_password,
+    get_password_hash_async,
+    verify_and_update_password_async,
+    get_user_by_username,
+    authenticate_token_blocking,
+    principal_cache,
+    create_attu_session,
+    verify_attu_session,
+    ATTU_SESSION_COOKIE,
+    ATTU_SESSION_TTL,
     create_access_token,
     get_current_active_user,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from concurrency import configure_threadpool, run_blocking, shutdown_executors
+from pagination import count_cache, decode_cursor, keyset_condition, next_cursor
+from response_cache import cached_response, response_cache
+from conditional import conditional_get
+from dates import parse_datetime
+import search
+import semantic_search
+from embedding_refresh import worker as embedding_worker
+import image_variants
+import cover_variants
+from static_files import DataFiles
+from response_compression import CompressionMiddleware, compression_cache
+from serialization import (
+    ARTICLE_FIELDS, ARTICLE_SUMMARY_FIELDS, BOOK_FIELDS, MEMO_FIELDS, PRODUCT_FIELDS, json_response
+)
 
 app = FastAPI(title="My Fullstack App API")
 
+
+@app.on_event("startup")
+async def startup():
+    """配置线程池上限（数据库访问和同步路由都在线程池中执行）"""
+    configure_threadpool()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    shutdown_executors()
+    embedding_worker.stop()
+
 # 配置静态文件服务（提供 data 文件夹的访问）
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(BASE_DIR)
@@ -38,7 +73,8 @@ if not os.path.exists(DATA_DIR):
     DATA_DIR = os.path.join(PROJECT_ROOT, "data")  # 本地开发: 项目根目录/data
 
 if os.path.exists(DATA_DIR):
-    app.mount("/data", StaticFiles(directory=DATA_DIR), name="data")
+    # Range、预压缩文件和强校验值见 static_files.py
+    app.mount("/data", DataFiles(directory=DATA_DIR), name="data")
     print(f"Static files mounted from: {DATA_DIR}")
 else:
     print(f"Warning: Data directory not found at {DATA_DIR}")
@@ -50,6 +86,18 @@ try:
 except Exception as e:
     print(f"Warning: Database initialization error: {e}")
 
+# 已有数据库补充封面缩略图列
+try:
+    cover_variants.ensure_cover_variants_column(engine, (Article, Book))
+except Exception as e:
+    print(f"Warning: Cover variants column initialization error: {e}")
+
+# 文章全文索引（SQLite FTS5 / MySQL FULLTEXT）
+try:
+    search.ensure_search_index(engine)
+except Exception as e:
+    print(f"Warning: Search index initialization error: {e}")
+
 # CORS 配置：允许前端域名访问
 # 本地开发：默认允许本地前端端口
 # 生产环境：从环境变量读取允许的域名
@@ -76,7 +124,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag", "Last-Modified"],
 )
+# gzip / brotli / zstd 响应压缩（阈值、类型白名单和压缩结果缓存见 response_compression.py）
+app.add_middleware(CompressionMiddleware)
 
 @app.get("/api/data")
 async def get_data():
@@ -87,39 +138,63 @@ async def health_check():
     """健康检查接口"""
     return {"status": "ok"}
 
+@app.get("/api/images/{path:path}")
+async def get_image(
+    path: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1, le=image_variants.IMAGE_MAX_DIMENSION),
+    h: Optional[int] = Query(None, ge=1, le=image_variants.IMAGE_MAX_DIMENSION),
+    fmt: str = Query("auto", pattern="^(auto|avif|webp|jpeg|png)$")
+):
+    """data 目录中图片的缩放 / 转码版本，例如 /api/images/covers/ab/cd/xxx.jpg?w=960&h=480
+    
+    首次请求时生成并缓存到磁盘；fmt=auto 时按 Accept 选择 AVIF / WebP / JPEG
+    """
+    return await image_variants.serve_image(path, request, w, h, fmt)
+
 @app.get("/api/products")
-async def get_products(db: Session = Depends(get_db)):
+@cached_response("products")
+@conditional_get(Product)
+async def get_products(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
     """获取所有产品列表"""
-    products = db.query(Product).order_by(Product.order_index).all()
-    return {"products": [product.to_dict() for product in products]}
+    result = await db.execute(PRODUCT_FIELDS.select().order_by(Product.order_index))
+    return {"products": PRODUCT_FIELDS.from_rows(result)}
 
 @app.get("/api/products/{product_name}")
-async def get_product(product_name: str, db: Session = Depends(get_db)):
+@cached_response("products")
+@conditional_get(Product, key_param="product_name", key_column=Product.name)
+async def get_product(
+    product_name: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db)
+):
     """根据产品名称获取单个产品信息"""
-    product = db.query(Product).filter(Product.name == product_name).first()
+    result = await db.execute(PRODUCT_FIELDS.select().where(Product.name == product_name))
+    product = result.first()
     if not product:
         return {"error": "Product not found"}, 404
-    return {"product": product.to_dict()}
+    return {"product": PRODUCT_FIELDS.from_row(product)}
 
 @app.get("/api/admin/products", response_model=List[ProductResponse])
 async def get_admin_products(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """管理员获取所有产品列表"""
-    products = db.query(Product).order_by(Product.order_index).all()
-    return [ProductResponse(**product.to_dict()) for product in products]
+    result = await db.execute(PRODUCT_FIELDS.select().order_by(Product.order_index))
+    return json_response(PRODUCT_FIELDS.from_rows(result))
 
 @app.post("/api/admin/products", response_model=ProductResponse)
 async def create_product(
     product: ProductCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """创建产品"""
     # 检查产品名称是否已存在
-    existing = db.query(Product).filter(Product.name == product.name).first()
-    if existing:
+    result = await db.execute(select(Product).where(Product.name == product.name))
+    if result.scalars().first():
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="产品名称已存在"
@@ -135,19 +210,20 @@ async def create_product(
         order_index=product.order_index
     )
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
-    return ProductResponse(**db_product.to_dict())
+    await db.commit()
+    await db.refresh(db_product)
+    response_cache.invalidate("products")
+    return json_response(PRODUCT_FIELDS.from_object(db_product))
 
 @app.put("/api/admin/products/{product_id}", response_model=ProductResponse)
 async def update_product(
     product_id: int,
     product: ProductUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """更新产品"""
-    db_product = db.query(Product).filter(Product.id == product_id).first()
+    db_product = await db.get(Product, product_id)
     if not db_product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -156,8 +232,8 @@ async def update_product(
     
     # 如果更新名称，检查是否与其他产品冲突
     if product.name and product.name != db_product.name:
-        existing = db.query(Product).filter(Product.name == product.name).first()
-        if existing:
+        result = await db.execute(select(Product).where(Product.name == product.name))
+        if result.scalars().first():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="产品名称已存在"
@@ -168,62 +244,81 @@ async def update_product(
     for field, value in update_data.items():
         setattr(db_product, field, value)
     
-    db.commit()
-    db.refresh(db_product)
-    return ProductResponse(**db_product.to_dict())
+    await db.commit()
+    await db.refresh(db_product)
+    response_cache.invalidate("products")
+    return json_response(PRODUCT_FIELDS.from_object(db_product))
 
 @app.delete("/api/admin/products/{product_id}")
 async def delete_product(
     product_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """删除产品"""
-    db_product = db.query(Product).filter(Product.id == product_id).first()
+    db_product = await db.get(Product, product_id)
     if not db_product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="产品不存在"
         )
     
-    db.delete(db_product)
-    db.commit()
+    await db.delete(db_product)
+    await db.commit()
+    response_cache.invalidate("products")
     return {"message": "产品已删除"}
 
 
 # ==================== 认证相关路由 ====================
 
+async def check_password(db: Session, user: User, password: str) -> bool:
+    """验证密码；验证通过且哈希已过时（rounds 偏低或旧的 sha256）时透明升级"""
+    valid, new_hash = await verify_and_update_password_async(password, user.hashed_password)
+    if valid and new_hash:
+        def save_hash():
+            user.hashed_password = new_hash
+            db.commit()
+            db.refresh(user)
+        
+        await run_blocking(save_hash)
+    return valid
+
+
 @app.post("/api/auth/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def register(user_data: UserRegister, db: Session = Depends(get_db)):
     """用户注册"""
     # 不再验证密码长度，只验证密码是否正确
     
     # 检查用户名是否已存在
-    if db.query(User).filter(User.username == user_data.username).first():
+    if await run_blocking(get_user_by_username, db, user_data.username):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="用户名已被注册"
         )
     
     # 检查邮箱是否已存在
-    if db.query(User).filter(User.email == user_data.email).first():
+    if await run_blocking(lambda: db.query(User).filter(User.email == user_data.email).first()):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="邮箱已被注册"
         )
     
-    # 创建新用户
-    hashed_password = get_password_hash(user_data.password)
+    # 创建新用户（哈希在独立线程池中执行）
+    hashed_password = await get_password_hash_async(user_data.password)
     new_user = User(
         username=user_data.username,
         email=user_data.email,
         hashed_password=hashed_password
     )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
     
-    return new_user.to_dict()
+    def save_user():
+        db.add(new_user)
+        db.commit()
+        db.refresh(new_user)
+        count_cache.invalidate(User.__tablename__)
+        return new_user.to_dict()
+    
+    return await run_blocking(save_user)
 
 
 @app.post("/api/auth/login", response_model=Token)
@@ -231,9 +326,9 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
     """用户登录（使用 OAuth2PasswordRequestForm 兼容标准格式）"""
     # 不再验证密码长度，只验证密码是否正确
     
-    user = db.query(User).filter(User.username == form_data.username).first()
+    user = await run_blocking(get_user_by_username, db, form_data.username)
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await check_password(db, user, form_data.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户名或密码错误",
@@ -264,7 +359,7 @@ async def login_json(user_data: UserLogin, db: Session = Depends(get_db)):
     """用户登录（JSON 格式）"""
     try:
         # 不再验证密码长度，只验证密码是否正确
-        user = db.query(User).filter(User.username == user_data.username).first()
+        user = await run_blocking(get_user_by_username, db, user_data.username)
         
         if not user:
             raise HTTPException(
@@ -273,7 +368,7 @@ async def login_json(user_data: UserLogin, db: Session = Depends(get_db)):
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        if not verify_password(user_data.password, user.hashed_password):
+        if not await check_password(db, user, user_data.password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="用户名或密码错误",
@@ -315,7 +410,7 @@ async def get_current_user_info(current_user: User = Depends(get_current_active_
     """获取当前登录用户信息"""
     return current_user.to_dict()
 
-def get_token_from_cookie_or_header(
+async def get_token_from_cookie_or_header(
     authorization: Optional[str] = Header(None, alias="Authorization"),
     cookie: Optional[str] = Cookie(None, alias="token")
 ):
@@ -330,11 +425,21 @@ def get_token_from_cookie_or_header(
 
 @app.get("/api/auth/verify-attu")
 async def verify_attu_access(
+    response: Response,
     token: Optional[str] = Depends(get_token_from_cookie_or_header),
-    db: Session = Depends(get_db)
+    attu_session: Optional[str] = Cookie(None, alias=ATTU_SESSION_COOKIE)
 ):
-    """验证 Attu 访问权限（用于 Nginx auth_request）"""
-    from auth import get_current_user
+    """验证 Attu 访问权限（用于 Nginx auth_request）
+    
+    Attu 的每个静态资源请求都会经过这里，按开销从低到高依次尝试：
+    1. 签名会话 cookie（只校验 HMAC）
+    2. 已验证用户缓存（不解码 JWT、不查数据库）
+    3. 解码 JWT 并查询用户（在线程池中执行）
+    """
+    if attu_session:
+        username = verify_attu_session(attu_session)
+        if username is not None:
+            return {"status": "ok", "username": username}
     
     if not token:
         raise HTTPException(
@@ -342,54 +447,66 @@ async def verify_attu_access(
             detail="未登录，请先登录"
         )
     
-    try:
-        # 使用现有的 get_current_user 逻辑验证 token
-        from jose import JWTError, jwt
-        from auth import SECRET_KEY, ALGORITHM
-        
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="无效的 token"
-            )
-        
-        user = db.query(User).filter(User.username == username).first()
-        if user is None or not user.is_active:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="用户不存在或已被禁用"
-            )
-        
-        return {"status": "ok", "username": user.username}
-    except JWTError:
+    user = principal_cache.get(token)
+    if user is None:
+        user = await run_blocking(authenticate_token_blocking, token)
+    if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token 无效或已过期"
         )
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="用户不存在或已被禁用"
+        )
+    
+    # 签发短期会话 cookie，nginx 通过 auth_request_set 转发给浏览器
+    if ATTU_SESSION_TTL > 0:
+        response.set_cookie(
+            ATTU_SESSION_COOKIE,
+            create_attu_session(user.username),
+            max_age=ATTU_SESSION_TTL,
+            path="/attu/",
+            httponly=True,
+            samesite="lax"
+        )
+    return {"status": "ok", "username": user.username}
 
 
 # ==================== 后台管理相关路由 ====================
 
 @app.get("/api/admin/users")
-async def get_all_users(
+def get_all_users(
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """获取所有用户列表（需要登录）"""
-    users = db.query(User).offset(skip).limit(limit).all()
-    total = db.query(User).count()
+    """获取所有用户列表（需要登录，支持 next_cursor 游标分页，total 为缓存的总数）"""
+    query = db.query(User).order_by(User.id.asc())
+    if cursor:
+        value, last_id = decode_cursor(cursor, "id", "asc")
+        query = query.where(keyset_condition(User.id, User.id, False, value, last_id))
+    else:
+        query = query.offset(skip)
+    users = query.limit(limit + 1).all()
+    cursor_token = next_cursor(users, limit, "id", "asc")
+    
+    total = count_cache.get(User.__tablename__)
+    if total is None:
+        total = db.query(User).count()
+        count_cache.set(User.__tablename__, total)
     return {
         "users": [user.to_dict() for user in users],
-        "total": total
+        "total": total,
+        "next_cursor": cursor_token
     }
 
 
 @app.get("/api/admin/users/{user_id}")
-async def get_user(
+def get_user(
     user_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
@@ -402,7 +519,7 @@ async def get_user(
 
 
 @app.delete("/api/admin/users/{user_id}")
-async def delete_user(
+def delete_user(
     user_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
@@ -418,11 +535,13 @@ async def delete_user(
     
     db.delete(user)
     db.commit()
+    count_cache.invalidate(User.__tablename__)
+    principal_cache.invalidate_user(user_id)
     return {"message": "User deleted successfully"}
 
 
 @app.patch("/api/admin/users/{user_id}/status")
-async def update_user_status(
+def update_user_status(
     user_id: int,
     is_active: bool,
     db: Session = Depends(get_db),
@@ -440,11 +559,12 @@ async def update_user_status(
     user.is_active = is_active
     db.commit()
     db.refresh(user)
+    principal_cache.invalidate_user(user_id)
     return user.to_dict()
 
 
 @app.get("/api/admin/check")
-async def check_admin_exists(db: Session = Depends(get_db)):
+def check_admin_exists(db: Session = Depends(get_db)):
     """检查管理员账号是否存在"""
     admin = db.query(User).filter(User.username == "Admin").first()
     return {"exists": admin is not None}
@@ -457,7 +577,7 @@ async def setup_admin_user(
 ):
     """设置管理员账号密码（仅当没有管理员时可用）"""
     # 检查是否已有管理员
-    admin = db.query(User).filter(User.username == "Admin").first()
+    admin = await run_blocking(get_user_by_username, db, "Admin")
     if admin:
         raise HTTPException(status_code=400, detail="管理员账号已存在，无法重新设置")
     
@@ -469,39 +589,54 @@ async def setup_admin_user(
         admin_user = User(
             username="Admin",
             email="admin@example.com",
-            hashed_password=get_password_hash(password),
+            hashed_password=await get_password_hash_async(password),
             is_active=True
         )
-        db.add(admin_user)
-        db.commit()
-        db.refresh(admin_user)
+        
+        def save_admin():
+            db.add(admin_user)
+            db.commit()
+            db.refresh(admin_user)
+            count_cache.invalidate(User.__tablename__)
+        
+        await run_blocking(save_admin)
         return {
             "message": "管理员账号创建成功",
             "username": "Admin"
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
+        await run_blocking(db.rollback)
         raise HTTPException(status_code=500, detail=f"创建管理员账号失败: {str(e)}")
 
 
+@app.get("/api/admin/cache/stats")
+def get_cache_stats(current_user: User = Depends(get_current_active_user)):
+    """查看响应缓存和压缩结果缓存的命中统计"""
+    return {**response_cache.stats(), "compression": compression_cache.stats()}
+
+
 # ==================== 备忘录相关路由 ====================
 
 @app.get("/api/memos", response_model=List[MemoResponse])
 async def get_memos(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """获取当前用户的所有备忘录"""
-    memos = db.query(Memo).filter(Memo.user_id == current_user.id).order_by(
-        Memo.is_pinned.desc(), Memo.updated_at.desc()
-    ).all()
-    return [memo.to_dict() for memo in memos]
+    result = await db.execute(
+        MEMO_FIELDS.select().where(Memo.user_id == current_user.id).order_by(
+            Memo.is_pinned.desc(), Memo.updated_at.desc()
+        )
+    )
+    return json_response(MEMO_FIELDS.from_rows(result))
 
 
 @app.post("/api/memos", response_model=MemoResponse, status_code=status.HTTP_201_CREATED)
 async def create_memo(
     memo_data: MemoCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """创建新备忘录"""
@@ -512,39 +647,39 @@ async def create_memo(
         is_pinned=memo_data.is_pinned
     )
     db.add(memo)
-    db.commit()
-    db.refresh(memo)
-    return memo.to_dict()
+    await db.commit()
+    await db.refresh(memo)
+    return json_response(MEMO_FIELDS.from_object(memo), status_code=status.HTTP_201_CREATED)
 
 
 @app.get("/api/memos/{memo_id}", response_model=MemoResponse)
 async def get_memo(
     memo_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """获取单个备忘录"""
-    memo = db.query(Memo).filter(
-        Memo.id == memo_id,
-        Memo.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        select(Memo).where(Memo.id == memo_id, Memo.user_id == current_user.id)
+    )
+    memo = result.scalars().first()
     if not memo:
         raise HTTPException(status_code=404, detail="Memo not found")
-    return memo.to_dict()
+    return json_response(MEMO_FIELDS.from_object(memo))
 
 
 @app.patch("/api/memos/{memo_id}", response_model=MemoResponse)
 async def update_memo(
     memo_id: int,
     memo_data: MemoUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """更新备忘录"""
-    memo = db.query(Memo).filter(
-        Memo.id == memo_id,
-        Memo.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        select(Memo).where(Memo.id == memo_id, Memo.user_id == current_user.id)
+    )
+    memo = result.scalars().first()
     if not memo:
         raise HTTPException(status_code=404, detail="Memo not found")
     
@@ -555,41 +690,67 @@ async def update_memo(
     if memo_data.is_pinned is not None:
         memo.is_pinned = memo_data.is_pinned
     
-    db.commit()
-    db.refresh(memo)
-    return memo.to_dict()
+    await db.commit()
+    await db.refresh(memo)
+    return json_response(MEMO_FIELDS.from_object(memo))
 
 
 @app.delete("/api/memos/{memo_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_memo(
     memo_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """删除备忘录"""
-    memo = db.query(Memo).filter(
-        Memo.id == memo_id,
-        Memo.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        select(Memo).where(Memo.id == memo_id, Memo.user_id == current_user.id)
+    )
+    memo = result.scalars().first()
     if not memo:
         raise HTTPException(status_code=404, detail="Memo not found")
     
-    db.delete(memo)
-    db.commit()
+    await db.delete(memo)
+    await db.commit()
     return None
 
 
+async def get_cached_total(db: AsyncSession, model) -> int:
+    """获取表的总行数（带缓存，写操作时失效）"""
+    total = count_cache.get(model.__tablename__)
+    if total is None:
+        total = await db.scalar(select(func.count()).select_from(model))
+        count_cache.set(model.__tablename__, total)
+    return total
+
+
 # ==================== 文章相关路由 ====================
 
-@app.get("/api/articles", response_model=List[ArticleResponse])
+@app.get(
+    "/api/articles",
+    response_model=List[ArticleResponse],
+    response_model_exclude_unset=True,
+    responses={200: {"model": List[ArticleSummaryResponse], "description": "view=summary 时的列表格式"}}
+)
+@cached_response("articles")
+@conditional_get(Article)
 async def get_articles(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     order_by: str = "publish_date",
     order: str = "desc",
-    db: Session = Depends(get_db)
+    view: str = "full",
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """获取文章列表（支持排序）"""
+    """获取文章列表（支持排序）
+    
+    view=summary 时只返回列表页需要的字段（不含正文），view=full 返回完整文章
+    分页：传入上一页响应头 X-Next-Cursor 中的 cursor 时使用游标分页（忽略 skip）；
+    include_total=true 时在 X-Total-Count 中返回缓存的总数
+    """
     # 验证排序字段
     valid_order_fields = ["title", "publish_date", "author", "category", "created_at"]
     if order_by not in valid_order_fields:
@@ -599,46 +760,104 @@ async def get_articles(
     if order.lower() not in ["asc", "desc"]:
         order = "desc"
     
-    # 构建查询
-    query = db.query(Article)
-    
-    # 排序
+    order = order.lower()
     order_column = getattr(Article, order_by)
-    if order.lower() == "desc":
-        query = query.order_by(order_column.desc())
+    
+    # 构建查询（直接查询输出的列，不创建 ORM 对象；列表模式不读取正文）
+    fields = ARTICLE_SUMMARY_FIELDS if view == "summary" else ARTICLE_FIELDS
+    query = fields.select(order_column)
+    
+    # 排序（id 作为第二排序键，保证游标分页顺序稳定）
+    if order == "desc":
+        query = query.order_by(order_column.desc(), Article.id.desc())
     else:
-        query = query.order_by(order_column.asc())
+        query = query.order_by(order_column.asc(), Article.id.asc())
     
-    articles = query.offset(skip).limit(limit).all()
-    return [article.to_dict() for article in articles]
+    # 分页：有游标时从上一页最后一行之后开始，否则沿用 offset
+    if cursor:
+        value, last_id = decode_cursor(cursor, order_by, order)
+        query = query.where(keyset_condition(order_column, Article.id, order == "desc", value, last_id))
+    else:
+        query = query.offset(skip)
+    
+    # 多取一行用于判断是否还有下一页
+    result = await db.execute(query.limit(limit + 1))
+    articles = list(result)
+    cursor_token = next_cursor(articles, limit, order_by, order)
+    if cursor_token:
+        response.headers["X-Next-Cursor"] = cursor_token
+    if include_total:
+        response.headers["X-Total-Count"] = str(await get_cached_total(db, Article))
+    
+    return fields.from_rows(articles)
+
+
+# 必须声明在 /api/articles/{article_id} 之前
+@app.get("/api/articles/search", response_model=List[ArticleSearchResult])
+@cached_response("articles")
+async def search_articles(
+    request: Request,
+    response: Response,
+    q: str,
+    limit: int = 20,
+    offset: int = 0,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """全文检索文章（标题、摘要、正文），按相关度排序，snippet 为正文中的命中片段
+    
+    多个关键词用空格分隔，需要同时命中；数据库不支持全文索引时使用倒排索引
+    """
+    if not search.is_available():
+        raise HTTPException(status_code=501, detail="当前数据库不支持全文检索")
+    limit = max(1, min(limit, 100))
+    return await search.search_articles(db, q, limit, max(offset, 0))
+
+
+@app.get("/api/articles/semantic-search", response_model=List[ArticleSearchResult])
+@cached_response("semantic")
+async def semantic_search_articles(
+    request: Request,
+    response: Response,
+    q: str,
+    limit: int = 10,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """语义检索文章：按问题与文章内容块的向量相似度排序，snippet 为最相近的内容块
+    
+    需要先运行 python embed_articles.py 生成向量
+    """
+    limit = max(1, min(limit, 50))
+    return await semantic_search.semantic_search(db, q, limit)
 
 
 @app.get("/api/articles/{article_id}", response_model=ArticleResponse)
+@cached_response("articles")
+@conditional_get(Article, key_param="article_id")
 async def get_article(
     article_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取单个文章"""
-    article = db.query(Article).filter(Article.id == article_id).first()
+    result = await db.execute(ARTICLE_FIELDS.select().where(Article.id == article_id))
+    article = result.first()
     if not article:
         raise HTTPException(status_code=404, detail="Article not found")
-    return article.to_dict()
+    return ARTICLE_FIELDS.from_row(article)
 
 
 @app.post("/api/admin/articles", response_model=ArticleResponse, status_code=status.HTTP_201_CREATED)
 async def create_article(
     article_data: ArticleCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """创建文章（需要管理员权限）"""
     from datetime import datetime
     
     # 解析发布时间
-    try:
-        publish_date = datetime.fromisoformat(article_data.publish_date.replace('Z', '+00:00'))
-    except:
-        publish_date = datetime.now()
+    publish_date = parse_datetime(article_data.publish_date) or datetime.now()
     
     article = Article(
         title=article_data.title,
@@ -651,32 +870,40 @@ async def create_article(
         cover_image=article_data.cover_image,
         excerpt=article_data.excerpt
     )
+    # 生成封面缩略图在写数据库之前（SQLite 不会在渲染期间持有写锁）
+    await cover_variants.prepare_cover(article)
     db.add(article)
-    db.commit()
-    db.refresh(article)
-    return article.to_dict()
+    await db.flush()
+    await db.run_sync(search.index_article, article)
+    await db.commit()
+    await db.refresh(article)
+    await cover_variants.assign_cover(article)
+    count_cache.invalidate(Article.__tablename__)
+    response_cache.invalidate("articles")
+    response_cache.invalidate("semantic")
+    await search.index_document(search.article_index, article)
+    embedding_worker.submit(article.id)
+    return json_response(ARTICLE_FIELDS.from_object(article), status_code=status.HTTP_201_CREATED)
 
 
 @app.patch("/api/admin/articles/{article_id}", response_model=ArticleResponse)
 async def update_article(
     article_id: int,
     article_data: ArticleUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """更新文章（需要管理员权限）"""
-    article = db.query(Article).filter(Article.id == article_id).first()
+    article = await db.get(Article, article_id)
     if not article:
         raise HTTPException(status_code=404, detail="Article not found")
     
     if article_data.title is not None:
         article.title = article_data.title
     if article_data.publish_date is not None:
-        from datetime import datetime
-        try:
-            article.publish_date = datetime.fromisoformat(article_data.publish_date.replace('Z', '+00:00'))
-        except:
-            pass
+        publish_date = parse_datetime(article_data.publish_date)
+        if publish_date is not None:
+            article.publish_date = publish_date
     if article_data.author is not None:
         article.author = article_data.author
     if article_data.original_url is not None:
@@ -696,38 +923,58 @@ async def update_article(
     if article_data.excerpt is not None:
         article.excerpt = article_data.excerpt
     
-    db.commit()
-    db.refresh(article)
-    return article.to_dict()
+    await cover_variants.prepare_cover(article)
+    await db.run_sync(search.index_article, article)
+    await db.commit()
+    await db.refresh(article)
+    await cover_variants.assign_cover(article)
+    response_cache.invalidate("articles")
+    response_cache.invalidate("semantic")
+    await search.index_document(search.article_index, article)
+    embedding_worker.submit(article.id)
+    return json_response(ARTICLE_FIELDS.from_object(article))
 
 
 @app.delete("/api/admin/articles/{article_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_article(
     article_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """删除文章（需要管理员权限）"""
-    article = db.query(Article).filter(Article.id == article_id).first()
+    article = await db.get(Article, article_id)
     if not article:
         raise HTTPException(status_code=404, detail="Article not found")
     
-    db.delete(article)
-    db.commit()
+    await db.delete(article)
+    await db.run_sync(search.remove_article, article_id)
+    await db.commit()
+    await cover_variants.release_cover(Article, article_id)
+    count_cache.invalidate(Article.__tablename__)
+    response_cache.invalidate("articles")
+    response_cache.invalidate("semantic")
+    await search.remove_document(search.article_index, article_id)
+    embedding_worker.submit(article_id)
     return None
 
 
 # ==================== 书籍相关路由 ====================
 
 @app.get("/api/books", response_model=List[BookResponse])
+@cached_response("books")
+@conditional_get(Book)
 async def get_books(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     order_by: str = "publish_date",
     order: str = "desc",
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """获取书籍列表（支持排序）"""
+    """获取书籍列表（支持排序，分页参数同 /api/articles）"""
     # 验证排序字段
     valid_order_fields = ["title", "publish_date", "author", "created_at"]
     if order_by not in valid_order_fields:
@@ -737,36 +984,61 @@ async def get_books(
     if order.lower() not in ["asc", "desc"]:
         order = "desc"
     
-    # 构建查询
-    query = db.query(Book)
+    # 构建查询（直接查询输出的列，不创建 ORM 对象）
+    query = BOOK_FIELDS.select()
     
-    # 排序
+    # 排序（id 作为第二排序键，保证游标分页顺序稳定）
+    order = order.lower()
     order_column = getattr(Book, order_by)
-    if order.lower() == "desc":
-        query = query.order_by(order_column.desc())
+    if order == "desc":
+        query = query.order_by(order_column.desc(), Book.id.desc())
+    else:
+        query = query.order_by(order_column.asc(), Book.id.asc())
+    
+    # 分页：有游标时从上一页最后一行之后开始，否则沿用 offset
+    if cursor:
+        value, last_id = decode_cursor(cursor, order_by, order)
+        query = query.where(keyset_condition(order_column, Book.id, order == "desc", value, last_id))
     else:
-        query = query.order_by(order_column.asc())
+        query = query.offset(skip)
     
-    # 分页
-    books = query.offset(skip).limit(limit).all()
+    result = await db.execute(query.limit(limit + 1))
+    books = list(result)
+    cursor_token = next_cursor(books, limit, order_by, order)
+    if cursor_token:
+        response.headers["X-Next-Cursor"] = cursor_token
+    if include_total:
+        response.headers["X-Total-Count"] = str(await get_cached_total(db, Book))
     
-    return [book.to_dict() for book in books]
+    return BOOK_FIELDS.from_rows(books)
+
+
+@app.get("/api/books/search", response_model=List[BookSearchResult])
+@cached_response("books")
+async def search_books(
+    request: Request,
+    response: Response,
+    q: str,
+    limit: int = 20,
+    offset: int = 0,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """全文检索书籍（书名、作者、简介），按相关度排序"""
+    limit = max(1, min(limit, 100))
+    return await search.search_books(db, q, limit, max(offset, 0))
 
 
 @app.post("/api/admin/books", response_model=BookResponse)
 async def create_book(
     book_data: BookCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """创建书籍（需要管理员权限）"""
     from datetime import datetime
     
     # 解析出版时间
-    try:
-        publish_date = datetime.fromisoformat(book_data.publish_date.replace('Z', '+00:00'))
-    except:
-        publish_date = datetime.now()
+    publish_date = parse_datetime(book_data.publish_date) or datetime.now()
     
     book = Book(
         title=book_data.title,
@@ -775,21 +1047,26 @@ async def create_book(
         publish_date=publish_date,
         description=book_data.description
     )
+    await cover_variants.prepare_cover(book)
     db.add(book)
-    db.commit()
-    db.refresh(book)
-    return book.to_dict()
+    await db.commit()
+    await db.refresh(book)
+    await cover_variants.assign_cover(book)
+    count_cache.invalidate(Book.__tablename__)
+    response_cache.invalidate("books")
+    await search.index_document(search.book_index, book)
+    return json_response(BOOK_FIELDS.from_object(book))
 
 
 @app.patch("/api/admin/books/{book_id}", response_model=BookResponse)
 async def update_book(
     book_id: int,
     book_data: BookUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """更新书籍（需要管理员权限）"""
-    book = db.query(Book).filter(Book.id == book_id).first()
+    book = await db.get(Book, book_id)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
     
@@ -800,32 +1077,38 @@ async def update_book(
     if book_data.author is not None:
         book.author = book_data.author
     if book_data.publish_date is not None:
-        from datetime import datetime
-        try:
-            book.publish_date = datetime.fromisoformat(book_data.publish_date.replace('Z', '+00:00'))
-        except:
-            pass
+        publish_date = parse_datetime(book_data.publish_date)
+        if publish_date is not None:
+            book.publish_date = publish_date
     if book_data.description is not None:
         book.description = book_data.description
     
-    db.commit()
-    db.refresh(book)
-    return book.to_dict()
+    await cover_variants.prepare_cover(book)
+    await db.commit()
+    await db.refresh(book)
+    await cover_variants.assign_cover(book)
+    response_cache.invalidate("books")
+    await search.index_document(search.book_index, book)
+    return json_response(BOOK_FIELDS.from_object(book))
 
 
 @app.delete("/api/admin/books/{book_id}")
 async def delete_book(
     book_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """删除书籍（需要管理员权限）"""
-    book = db.query(Book).filter(Book.id == book_id).first()
+    book = await db.get(Book, book_id)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
     
-    db.delete(book)
-    db.commit()
+    await db.delete(book)
+    await db.commit()
+    await cover_variants.release_cover(Book, book_id)
+    count_cache.invalidate(Book.__tablename__)
+    response_cache.invalidate("books")
+    await search.remove_document(search.book_index, book_id)
     return None
 
 if __name__ == "__main__":
@@ -1,12 +1,27 @@
 """
 数据库模型定义
 """
+import json
+from datetime import datetime, timezone
 from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy.dialects import mysql
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database import Base
 
 
+def utcnow():
+    """
+    当前 UTC 时间（不带时区，带微秒），与 SQLite CURRENT_TIMESTAMP 的时区一致
+    由应用写入时间列，SQLite 中所有行的存储格式相同（定长字符串），可以直接按列排序和比较
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# 创建 / 修改时间列：MySQL 中保留微秒（默认 DATETIME 只精确到秒，同一秒内的两次修改 ETag 相同）
+Timestamp = DateTime(timezone=True).with_variant(mysql.DATETIME(timezone=True, fsp=6), "mysql")
+
+
 class User(Base):
     """用户模型"""
     __tablename__ = "users"
@@ -16,8 +31,8 @@ class User(Base):
     email = Column(String(100), unique=True, index=True, nullable=False, comment="邮箱")
     hashed_password = Column(String(255), nullable=False, comment="加密后的密码")
     is_active = Column(Boolean, default=True, comment="是否激活")
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    created_at = Column(Timestamp, default=utcnow, server_default=func.now())
+    updated_at = Column(Timestamp, onupdate=utcnow)
 
     # 关联备忘录
     memos = relationship("Memo", back_populates="user", cascade="all, delete-orphan")
@@ -46,8 +61,8 @@ class Product(Base):
     image_url = Column(String(500), comment="产品图片 URL")
     official_url = Column(String(500), comment="官方网站 URL")
     order_index = Column(Integer, default=0, comment="显示顺序")
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    created_at = Column(Timestamp, default=utcnow, server_default=func.now())
+    updated_at = Column(Timestamp, onupdate=utcnow)
 
     def to_dict(self):
         """转换为字典"""
@@ -74,8 +89,8 @@ class Memo(Base):
     title = Column(String(200), nullable=False, comment="备忘录标题")
     content = Column(Text, comment="备忘录内容")
     is_pinned = Column(Boolean, default=False, comment="是否置顶")
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    created_at = Column(Timestamp, default=utcnow, server_default=func.now())
+    updated_at = Column(Timestamp, onupdate=utcnow)
 
     # 关联用户
     user = relationship("User", back_populates="memos")
@@ -99,16 +114,17 @@ class Article(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(500), nullable=False, comment="文章标题")
-    publish_date = Column(DateTime(timezone=True), nullable=False, comment="发布时间")
+    publish_date = Column(DateTime(timezone=True), nullable=False, index=True, comment="发布时间")
     author = Column(String(200), nullable=False, comment="作者")
     original_url = Column(String(1000), comment="原文地址")
     category = Column(String(100), comment="分类")
     content = Column(Text, comment="文章内容（中文）")
     content_en = Column(Text, comment="文章内容（英文）")
     cover_image = Column(String(1000), comment="封面图片URL或本地路径")
+    cover_variants = Column(Text, comment="封面缩略图和占位符（JSON，见 cover_variants.py）")
     excerpt = Column(Text, comment="文章摘要")
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    created_at = Column(Timestamp, default=utcnow, server_default=func.now(), nullable=False, index=True)
+    updated_at = Column(Timestamp, onupdate=utcnow)
 
     def to_dict(self):
         """转换为字典"""
@@ -122,11 +138,25 @@ class Article(Base):
             "content": self.content,
             "content_en": self.content_en,
             "cover_image": self.cover_image,
+            "cover_variants": json.loads(self.cover_variants) if self.cover_variants else None,
             "excerpt": self.excerpt,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
         }
 
+    def to_summary_dict(self):
+        """转换为列表用的字典（不包含正文，只访问列表查询加载的列）"""
+        return {
+            "id": self.id,
+            "title": self.title,
+            "publish_date": self.publish_date.isoformat() if self.publish_date else None,
+            "author": self.author,
+            "category": self.category,
+            "cover_image": self.cover_image,
+            "cover_variants": json.loads(self.cover_variants) if self.cover_variants else None,
+            "excerpt": self.excerpt,
+        }
+
 
 class Book(Base):
     """书籍模型"""
@@ -135,11 +165,12 @@ class Book(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(500), nullable=False, comment="书名")
     cover_image = Column(String(1000), comment="封面图片URL或本地路径")
+    cover_variants = Column(Text, comment="封面缩略图和占位符（JSON，见 cover_variants.py）")
     author = Column(String(200), nullable=False, comment="作者")
-    publish_date = Column(DateTime(timezone=True), nullable=False, comment="出版时间")
+    publish_date = Column(DateTime(timezone=True), nullable=False, index=True, comment="出版时间")
     description = Column(Text, comment="书籍简介")
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    created_at = Column(Timestamp, default=utcnow, server_default=func.now(), nullable=False, index=True)
+    updated_at = Column(Timestamp, onupdate=utcnow)
 
     def to_dict(self):
         """转换为字典"""
@@ -147,6 +178,7 @@ class Book(Base):
             "id": self.id,
             "title": self.title,
             "cover_image": self.cover_image,
+            "cover_variants": json.loads(self.cover_variants) if self.cover_variants else None,
             "author": self.author,
             "publish_date": self.publish_date.isoformat() if self.publish_date else None,
             "description": self.description,
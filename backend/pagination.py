@@ -0,0 +1,122 @@
+"""
+游标（keyset）分页
+游标基于 (排序列, id) 构建，深分页时不需要 OFFSET 扫描，延迟保持恒定
+游标是不透明的 base64 字符串，内部记录排序字段、方向和上一页最后一行的值
+"""
+import base64
+import json
+import os
+import time
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import DateTime, String, and_, func, literal, or_, update
+
+# 总数缓存时间（秒），避免每次请求都执行 COUNT
+COUNT_CACHE_TTL = float(os.getenv("PAGINATION_COUNT_TTL", "30"))
+
+
+def encode_cursor(order_by: str, order: str, value, last_id: int) -> str:
+    """生成游标"""
+    if isinstance(value, datetime):
+        value = {"dt": value.isoformat()}
+    payload = {"o": order_by, "d": order, "v": value, "id": last_id}
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, order_by: str, order: str):
+    """解析游标，返回 (排序列的值, id)；游标无效或与当前排序不一致时返回 400"""
+    invalid = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="无效的分页游标")
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw.decode("utf-8"))
+        value = payload["v"]
+        last_id = int(payload["id"])
+    except Exception:
+        raise invalid
+    if payload.get("o") != order_by or payload.get("d") != order:
+        raise invalid
+    if isinstance(value, dict) and "dt" in value:
+        value = datetime.fromisoformat(value["dt"])
+    return value, last_id
+
+
+def keyset_condition(column, id_column, descending: bool, value, last_id: int):
+    """
+    构建"上一页最后一行之后"的过滤条件
+    排序约定：order_by(column, id) 同方向，NULL 视为最小值（SQLite 和 MySQL 的默认行为）
+    直接比较列本身（value 按列类型绑定），排序列有索引时按范围查找；
+    NOT NULL 的列不加 IS NULL 分支（OR IS NULL 会让数据库放弃范围查找）
+    """
+    if value is None:
+        if descending:
+            # 降序：NULL 排在最后
+            return and_(column.is_(None), id_column < last_id)
+        # 升序：NULL 排在最前
+        return or_(
+            and_(column.is_(None), id_column > last_id),
+            column.isnot(None),
+        )
+    if descending:
+        condition = or_(column < value, and_(column == value, id_column < last_id))
+        return or_(condition, column.is_(None)) if column.nullable else condition
+    return or_(column > value, and_(column == value, id_column > last_id))
+
+
+def ensure_sort_columns(bind, models):
+    """
+    迁移（init_db.py 调用，不在每个 worker 启动时执行）：为已有数据库补充排序列的索引
+    （create_all 不会修改已存在的表）；SQLite 中把 server_default 写入的时间（没有微秒）
+    补成与应用写入相同的定长格式，之后排序和游标比较直接使用列本身
+    只改写存储格式，updated_at 保持原值（否则会触发 onupdate，所有旧数据都像被修改过）
+    """
+    with bind.begin() as conn:
+        for model in models:
+            table = model.__table__
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+            if bind.dialect.name != "sqlite":
+                continue
+            for column in table.columns:
+                if isinstance(column.type, DateTime):
+                    values = {column.name: column.op("||")(literal(".000000", String))}
+                    if "updated_at" in table.c and column.name != "updated_at":
+                        values["updated_at"] = table.c.updated_at
+                    conn.execute(update(table).where(func.length(column) == 19).values(values))
+
+
+def next_cursor(rows, limit: int, order_by: str, order: str) -> Optional[str]:
+    """
+    根据多查询出的一行判断是否还有下一页（查询时使用 limit + 1）
+    有下一页时返回游标，否则返回 None；rows 会被截断到 limit
+    """
+    if len(rows) <= limit:
+        return None
+    del rows[limit:]
+    last = rows[-1]
+    return encode_cursor(order_by, order, getattr(last, order_by), last.id)
+
+
+class CountCache:
+    """带过期时间的总数缓存（按表名缓存 COUNT 结果）"""
+
+    def __init__(self, ttl: float = COUNT_CACHE_TTL):
+        self.ttl = ttl
+        self._values = {}
+
+    def get(self, name: str):
+        entry = self._values.get(name)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    def set(self, name: str, value: int):
+        self._values[name] = (value, time.monotonic() + self.ttl)
+
+    def invalidate(self, name: str):
+        self._values.pop(name, None)
+
+
+count_cache = CountCache()
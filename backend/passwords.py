@@ -0,0 +1,123 @@
+"""
+密码哈希子系统
+- 使用 bcrypt，工作因子（rounds）按目标耗时在部署机器上自动校准，也可以通过环境变量固定
+- 兼容旧哈希：rounds 较低的 bcrypt 哈希、早期备用方案生成的无盐 sha256 哈希
+- 登录成功时如果旧哈希已过时，返回新哈希由调用方保存（透明升级）
+本模块只依赖标准库和 bcrypt，在密码哈希进程池的子进程中导入开销很小
+"""
+import hashlib
+import hmac
+import os
+import re
+import time
+from typing import Optional, Tuple
+
+import bcrypt
+
+# 目标耗时（毫秒）：校准时选择耗时不超过该值的最大 rounds
+BCRYPT_TARGET_MS = float(os.getenv("BCRYPT_TARGET_MS", "250"))
+# rounds 的安全下限和上限
+BCRYPT_MIN_ROUNDS = int(os.getenv("BCRYPT_MIN_ROUNDS", "10"))
+BCRYPT_MAX_ROUNDS = int(os.getenv("BCRYPT_MAX_ROUNDS", "15"))
+# 设置后跳过校准，直接使用该值
+BCRYPT_ROUNDS = os.getenv("BCRYPT_ROUNDS")
+
+# bcrypt 只使用前 72 字节
+BCRYPT_MAX_BYTES = 72
+
+_BCRYPT_RE = re.compile(r"^\$2[aby]\$(\d{2})\$")
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# 校准结果（每个进程校准一次）
+_rounds = None
+
+
+def calibrate_rounds(target_ms: float = BCRYPT_TARGET_MS,
+                     min_rounds: int = BCRYPT_MIN_ROUNDS,
+                     max_rounds: int = BCRYPT_MAX_ROUNDS,
+                     sample_rounds: int = 8) -> int:
+    """
+    测量 sample_rounds 的耗时并外推（rounds 每加 1 耗时翻倍），
+    返回耗时不超过 target_ms 的最大 rounds（不低于 min_rounds）
+    """
+    salt = bcrypt.gensalt(sample_rounds)
+    samples = []
+    for _ in range(3):
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration-password", salt)
+        samples.append((time.perf_counter() - start) * 1000)
+    base_ms = min(samples)
+
+    rounds = min_rounds
+    for candidate in range(min_rounds, max_rounds + 1):
+        if base_ms * 2 ** (candidate - sample_rounds) <= target_ms:
+            rounds = candidate
+    return rounds
+
+
+def get_rounds() -> int:
+    """当前使用的 rounds（首次调用时校准）"""
+    global _rounds
+    if _rounds is None:
+        _rounds = int(BCRYPT_ROUNDS) if BCRYPT_ROUNDS else calibrate_rounds()
+    return _rounds
+
+
+def _password_bytes(password: str) -> bytes:
+    """截断到 72 字节；与早期 passlib 路径一致，丢弃被截断的半个多字节字符"""
+    data = password.encode("utf-8")
+    if len(data) > BCRYPT_MAX_BYTES:
+        data = data[:BCRYPT_MAX_BYTES].decode("utf-8", errors="ignore").encode("utf-8")
+    return data
+
+
+def _legacy_candidates(password: str):
+    """验证旧哈希时尝试的密码字节（早期的 bcrypt 直连路径直接按字节截断）"""
+    data = _password_bytes(password)
+    yield data
+    raw = password.encode("utf-8")[:BCRYPT_MAX_BYTES]
+    if raw != data:
+        yield raw
+
+
+def hash_password(password: str) -> str:
+    """生成 bcrypt 哈希"""
+    return bcrypt.hashpw(_password_bytes(password), bcrypt.gensalt(get_rounds())).decode("utf-8")
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    """验证密码（支持 bcrypt 和旧的无盐 sha256 哈希）"""
+    if not hashed:
+        return False
+    if _BCRYPT_RE.match(hashed):
+        encoded = hashed.encode("utf-8")
+        try:
+            return any(bcrypt.checkpw(candidate, encoded) for candidate in _legacy_candidates(password))
+        except ValueError:
+            return False
+    if _SHA256_RE.match(hashed):
+        return any(
+            hmac.compare_digest(hashlib.sha256(candidate).hexdigest(), hashed)
+            for candidate in _legacy_candidates(password)
+        )
+    return False
+
+
+def needs_rehash(hashed: str) -> bool:
+    """哈希是否需要升级：非 bcrypt（如 sha256）或 rounds 低于当前配置"""
+    match = _BCRYPT_RE.match(hashed or "")
+    if match is None:
+        return True
+    return int(match.group(1)) < get_rounds()
+
+
+def verify_and_update(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """
+    验证密码，验证通过且哈希已过时时同时生成新哈希
+    返回 (是否通过, 新哈希或 None)
+    """
+    if not verify_password(password, hashed):
+        return False, None
+    if needs_rehash(hashed):
+        return True, hash_password(password)
+    return True, None
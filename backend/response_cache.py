@@ -0,0 +1,311 @@
+"""
+公开读接口的响应缓存
+- 按路由路径 + 查询参数缓存序列化后的响应体（以及分页相关响应头）
+- TTL 过期 + LRU 容量上限
+- 数据只会通过 /api/admin/* 修改，管理接口写入后按命名空间（products/articles/books）失效；
+  语义检索结果单独使用 semantic 命名空间，文章写入和向量刷新后都会失效
+- 存储后端可选：
+  memory：进程内存；失效时更新该命名空间的纪元文件（mtime），其他 worker 读缓存前检查纪元，
+          变化时清空本进程中该命名空间的缓存（与 auth.py 的 PrincipalCache 相同的做法）
+  sqlite：data 目录下的共享 SQLite 文件，多个 uvicorn worker 共用一份缓存，
+          任一 worker 的失效操作对所有 worker 立即生效
+- 缓存命中时按缓存的 ETag / Last-Modified 处理条件请求（见 conditional.py），不查询数据库
+"""
+import functools
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Response
+
+from conditional import VALIDATOR_HEADERS, cached_not_modified
+from serialization import dumps, json_response
+
+# 缓存配置
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+RESPONSE_CACHE_MAXSIZE = int(os.getenv("RESPONSE_CACHE_MAXSIZE", "512"))
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_PATH = os.getenv(
+    "RESPONSE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "response_cache.db")
+)
+# memory 后端跨 worker 失效用的纪元文件目录（运行时文件，不放在仓库目录中）
+RESPONSE_CACHE_EPOCH_DIR = os.getenv(
+    "RESPONSE_CACHE_EPOCH_DIR", os.path.join(tempfile.gettempdir(), "my-fullstack-app", "response_cache")
+)
+
+# 需要随响应体一起缓存的响应头（分页相关 + conditional_get 设置的校验值）
+CACHED_HEADERS = ("x-next-cursor", "x-total-count") + VALIDATOR_HEADERS
+
+
+class MemoryCacheBackend:
+    """进程内存后端（OrderedDict 实现 LRU）"""
+
+    # 每个 worker 各有一份，失效需要通过纪元文件通知其他 worker
+    shared = False
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # key -> (过期时间, 命名空间, 值)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key: str, namespace: str, value, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, namespace, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, namespace: str):
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if entry[1] == namespace]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """
+    共享 SQLite 文件后端（WAL 模式，多进程并发读）
+    值以 JSON 存储；LRU 通过 accessed_at 列实现，超过容量时批量淘汰最久未访问的条目
+    """
+
+    # 访问时间的更新间隔（秒），避免每次命中都写库
+    TOUCH_INTERVAL = 1.0
+    # 所有 worker 共用，失效操作直接对所有 worker 生效
+    shared = True
+
+    def __init__(self, path: str, maxsize: int):
+        self.path = path
+        self.maxsize = maxsize
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            " key TEXT PRIMARY KEY,"
+            " namespace TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_namespace ON cache_entries (namespace)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_accessed ON cache_entries (accessed_at)")
+
+    def _conn(self):
+        """每个线程一个连接（autocommit 模式）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, expires_at, accessed_at FROM cache_entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[1] <= now:
+            conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            return None
+        if now - row[2] > self.TOUCH_INTERVAL:
+            conn.execute("UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key: str, namespace: str, value, ttl: float):
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (key, namespace, value, expires_at, accessed_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (key, namespace, json.dumps(value, ensure_ascii=False), now + ttl, now)
+        )
+        count = conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+        if count > self.maxsize:
+            # 多淘汰 10%，避免每次写入都触发淘汰
+            conn.execute(
+                "DELETE FROM cache_entries WHERE key IN ("
+                " SELECT key FROM cache_entries ORDER BY accessed_at LIMIT ?)",
+                (count - self.maxsize + self.maxsize // 10,)
+            )
+
+    def invalidate(self, namespace: str):
+        self._conn().execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+
+    def clear(self):
+        self._conn().execute("DELETE FROM cache_entries")
+
+    def size(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+
+
+def create_cache_backend(name: str = RESPONSE_CACHE_BACKEND, maxsize: int = RESPONSE_CACHE_MAXSIZE):
+    """根据配置创建缓存后端"""
+    if name == "sqlite":
+        return SQLiteCacheBackend(RESPONSE_CACHE_PATH, maxsize)
+    if name == "memory":
+        return MemoryCacheBackend(maxsize)
+    raise ValueError(f"未知的缓存后端: {name}")
+
+
+class ResponseCache:
+    """响应缓存（TTL + LRU），统计本进程的命中情况"""
+
+    # 纪元文件名：清空全部缓存时使用
+    ALL = "_all"
+
+    def __init__(self, backend, ttl: float = RESPONSE_CACHE_TTL, epoch_dir: str = RESPONSE_CACHE_EPOCH_DIR):
+        self.backend = backend
+        self.ttl = ttl
+        self.epoch_dir = epoch_dir
+        self.hits = 0
+        self.misses = 0
+        self._epochs = {}  # 命名空间 -> 上次看到的纪元
+        self._lock = threading.Lock()
+
+    def _epoch_file(self, namespace: str) -> str:
+        return os.path.join(self.epoch_dir, f"{namespace}.epoch")
+
+    def _read_epoch(self, namespace: str):
+        try:
+            return os.stat(self._epoch_file(namespace)).st_mtime_ns
+        except OSError:
+            return None
+
+    def _check_epochs(self, namespace: str):
+        """其他进程（worker 或脚本）失效过该命名空间时清空本进程中的对应缓存"""
+        if self.backend.shared:
+            return
+        with self._lock:
+            for name in (self.ALL, namespace):
+                epoch = self._read_epoch(name)
+                if epoch == self._epochs.get(name, epoch):
+                    self._epochs[name] = epoch
+                    continue
+                self._epochs[name] = epoch
+                if name == self.ALL:
+                    self.backend.clear()
+                else:
+                    self.backend.invalidate(name)
+
+    def _bump_epoch(self, namespace: str):
+        """更新纪元文件的 mtime（严格递增，同一时钟刻度内的两次失效也能被其他进程发现）"""
+        path = self._epoch_file(namespace)
+        with self._lock:
+            try:
+                os.makedirs(self.epoch_dir, exist_ok=True)
+                with open(path, "a"):
+                    pass
+                epoch = max(time.time_ns(), (self._read_epoch(namespace) or 0) + 1)
+                os.utime(path, ns=(epoch, epoch))
+            except OSError:
+                return
+            self._epochs[namespace] = epoch
+
+    def get(self, key: str, namespace: str):
+        """读取缓存，未命中或已过期时返回 None"""
+        self._check_epochs(namespace)
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, namespace: str, value):
+        """写入缓存，超过容量时淘汰最久未使用的条目"""
+        self.backend.set(key, namespace, value, self.ttl)
+
+    def invalidate(self, namespace: str):
+        """删除某个命名空间下的所有缓存（所有 worker 生效）"""
+        self.backend.invalidate(namespace)
+        self._bump_epoch(namespace)
+
+    def clear(self):
+        self.backend.clear()
+        self._bump_epoch(self.ALL)
+
+    def stats(self) -> dict:
+        """命中统计（hits/misses 为当前 worker 进程的计数）"""
+        total = self.hits + self.misses
+        return {
+            "backend": RESPONSE_CACHE_BACKEND,
+            "pid": os.getpid(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "size": self.backend.size(),
+            "maxsize": self.backend.maxsize,
+            "ttl": self.ttl,
+        }
+
+
+response_cache = ResponseCache(create_cache_backend())
+
+
+# 缓存条目格式的版本，写在缓存键中：格式改变后旧条目（SQLite 后端会跨重启保留）不再被读到，由过期和淘汰清理
+CACHE_KEY_VERSION = 2
+
+
+def make_cache_key(request) -> str:
+    """根据路由路径和排序后的查询参数生成缓存键"""
+    params = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return f"v{CACHE_KEY_VERSION}:{request.url.path}?{params}"
+
+
+def cached_response(namespace: str):
+    """
+    路由缓存装饰器
+    被装饰的路由需要声明 request: Request 和 response: Response 参数
+    响应体只序列化一次（serialization.dumps），缓存命中时直接发送缓存的 JSON，不再经过 response_model；
+    放在 @conditional_get 之前，命中时按缓存的校验值返回 304，不查询数据库
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            request = kwargs["request"]
+            response = kwargs["response"]
+            key = make_cache_key(request)
+            cached = response_cache.get(key, namespace)
+            if cached is not None:
+                body, headers = cached
+                not_modified = cached_not_modified(request, headers)
+                if not_modified is not None:
+                    return not_modified
+                response.headers.update(headers)
+                return json_response(body.encode("utf-8"), response)
+
+            content = await func(*args, **kwargs)
+            if isinstance(content, Response):
+                return content
+            body = dumps(content)
+            headers = {k: v for k, v in response.headers.items() if k in CACHED_HEADERS}
+            response_cache.set(key, namespace, [body.decode("utf-8"), headers])
+            return json_response(body, response)
+        return wrapper
+    return decorator
@@ -0,0 +1,284 @@
+"""
+响应压缩中间件（gzip / brotli / zstd）
+- 按 Accept-Encoding 选择编码，服务端优先顺序 br > zstd > gzip（brotli、zstandard 未安装时跳过）
+- 只压缩 200 响应、COMPRESSIBLE_TYPES 中的 Content-Type，且响应体不小于 COMPRESSION_MIN_SIZE 字节
+- 可缓存的 GET 响应（没有 no-store / private / Set-Cookie）的压缩结果按 (编码, 响应体摘要) 缓存在进程内，
+  热门文章只压缩一次；缓存的结果使用更高的压缩级别
+- 压缩后的响应 ETag 改为弱校验值（字节内容不同），If-None-Match 弱比较仍然命中
+- 流式响应边发送边压缩，不缓存
+- /data 由 static_files.py 处理（预压缩文件 + Range），不经过这里
+"""
+import gzip
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from concurrency import run_blocking
+from static_files import accepted_encodings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 小于该大小的响应不压缩（字节）
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# 压缩结果缓存的大小上限（MB，每个 worker 进程）
+COMPRESSION_CACHE_MB = int(os.getenv("COMPRESSION_CACHE_MB", "32"))
+
+# 压缩的 Content-Type（前缀匹配，忽略 charset 等参数）
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+# 大于该大小的响应体在线程池中压缩，不阻塞事件循环
+THREAD_THRESHOLD = 64 * 1024
+# 压缩后大于该大小的结果不缓存
+MAX_CACHED_SIZE = 4 * 1024 * 1024
+
+
+class _BrotliStream:
+    """brotli.Compressor 适配为 compress() / flush() 接口"""
+
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+# 编码 -> (一次性压缩, 流式压缩器, 每次请求压缩的级别, 缓存结果的压缩级别)
+ENCODERS = {
+    "gzip": (
+        lambda body, level: gzip.compress(body, compresslevel=level, mtime=0),
+        lambda level: zlib.compressobj(level, zlib.DEFLATED, 31),
+        6, 9,
+    ),
+}
+if brotli is not None:
+    ENCODERS["br"] = (
+        lambda body, level: brotli.compress(body, quality=level),
+        _BrotliStream,
+        4, 9,
+    )
+if zstandard is not None:
+    ENCODERS["zstd"] = (
+        lambda body, level: zstandard.ZstdCompressor(level=level).compress(body),
+        lambda level: zstandard.ZstdCompressor(level=level).compressobj(),
+        3, 12,
+    )
+PREFERENCE = [name for name in ("br", "zstd", "gzip") if name in ENCODERS]
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    accepted = accepted_encodings(accept_encoding)
+    for name in PREFERENCE:
+        if name in accepted:
+            return name
+    return None
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    media_type = (content_type or "").split(";", 1)[0].strip().lower()
+    return media_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressedBodyCache:
+    """压缩结果的 LRU 缓存（按字节数限制容量）"""
+
+    def __init__(self, max_bytes: int = COMPRESSION_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value: bytes):
+        if len(value) > min(MAX_CACHED_SIZE, self.max_bytes):
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = value
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+compression_cache = CompressedBodyCache()
+
+
+async def compress_body(body: bytes, encoding: str, cacheable: bool, cache: CompressedBodyCache = compression_cache) -> bytes:
+    """压缩完整的响应体；cacheable 时先查缓存"""
+    encode, _, level, cached_level = ENCODERS[encoding]
+    if not cacheable:
+        if len(body) >= THREAD_THRESHOLD:
+            return await run_blocking(encode, body, level)
+        return encode(body, level)
+
+    # 按内容做键：同一篇文章不论经过哪个路由、缓存是否命中都只压缩一次
+    key = (encoding, hashlib.sha256(body).digest())
+    compressed = cache.get(key)
+    if compressed is None:
+        if len(body) >= THREAD_THRESHOLD:
+            compressed = await run_blocking(encode, body, cached_level)
+        else:
+            compressed = encode(body, cached_level)
+        cache.set(key, compressed)
+    return compressed
+
+
+class CompressionMiddleware:
+    """ASGI 中间件：压缩符合条件的响应（见模块说明）"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE,
+                 cache: CompressedBodyCache = compression_cache, exclude_prefixes=("/data/",)):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = cache
+        self.exclude_prefixes = tuple(exclude_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD" or scope["path"].startswith(self.exclude_prefixes):
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        responder = _CompressionResponder(self, scope, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    """处理一次请求的响应消息：先保留 http.response.start，看到第一段响应体后再决定是否压缩"""
+
+    def __init__(self, middleware: CompressionMiddleware, scope, encoding: Optional[str], send):
+        self.middleware = middleware
+        self.scope = scope
+        self.encoding = encoding
+        self._send = send
+        self.start_message = None
+        # None：尚未决定；False：原样转发；否则为流式压缩器
+        self.stream = None
+
+    async def send(self, message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            self.start_message = message
+            return
+        if message_type != "http.response.body" or self.stream is False:
+            await self._flush_start()
+            await self._send(message)
+            return
+        if self.stream is not None:
+            body = self.stream.compress(message.get("body", b""))
+            if not message.get("more_body", False):
+                body += self.stream.flush()
+            await self._send({**message, "body": body})
+            return
+        await self._first_body(message)
+
+    async def _flush_start(self):
+        if self.start_message is not None:
+            await self._send(self.start_message)
+            self.start_message = None
+
+    async def _first_body(self, message):
+        headers = MutableHeaders(raw=list(self.start_message["headers"]))
+        self.start_message["headers"] = headers.raw
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if (
+            self.start_message["status"] != 200
+            or "content-encoding" in headers
+            or not is_compressible(headers.get("content-type"))
+            or (not more_body and len(body) < self.middleware.minimum_size)
+        ):
+            self.stream = False
+            await self._flush_start()
+            await self._send(message)
+            return
+
+        # 内容会随 Accept-Encoding 变化（不压缩时也要声明，避免共享缓存把未压缩版本发给所有人）
+        headers.add_vary_header("Accept-Encoding")
+        if self.encoding is None:
+            self.stream = False
+            await self._flush_start()
+            await self._send(message)
+            return
+
+        if more_body:
+            # 流式响应
+            _, create_stream, level, _ = ENCODERS[self.encoding]
+            self.stream = create_stream(level)
+            self._mark_encoded(headers)
+            del headers["content-length"]
+            await self._flush_start()
+            await self._send({**message, "body": self.stream.compress(body)})
+            return
+
+        cache_control = headers.get("cache-control", "").lower()
+        cacheable = (
+            self.scope["method"] == "GET"
+            and "no-store" not in cache_control
+            and "private" not in cache_control
+            and "set-cookie" not in headers
+        )
+        compressed = await compress_body(body, self.encoding, cacheable, self.middleware.cache)
+        self.stream = False
+        if len(compressed) < len(body):
+            self._mark_encoded(headers)
+            headers["content-length"] = str(len(compressed))
+            body = compressed
+        await self._flush_start()
+        await self._send({**message, "body": body})
+
+    def _mark_encoded(self, headers: MutableHeaders):
+        headers["content-encoding"] = self.encoding
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["etag"] = "W/" + etag
@@ -58,6 +58,15 @@ class MemoResponse(BaseModel):
     updated_at: str = None
 
 
+class CoverVariants(BaseModel):
+    """封面响应式图片：srcset 直接用于 <img srcset>，placeholder 为 BlurHash"""
+    width: int
+    height: int
+    color: Optional[str] = None
+    placeholder: Optional[str] = None
+    srcset: str
+
+
 class ArticleCreate(BaseModel):
     """创建文章请求模型"""
     title: str
@@ -95,11 +104,30 @@ class ArticleResponse(BaseModel):
     content: Optional[str] = None
     content_en: Optional[str] = None
     cover_image: Optional[str] = None
+    cover_variants: Optional[CoverVariants] = None
     excerpt: Optional[str] = None
     created_at: Optional[str] = None
     updated_at: Optional[str] = None
 
 
+class ArticleSummaryResponse(BaseModel):
+    """文章列表响应模型（不包含正文）"""
+    id: int
+    title: str
+    publish_date: str
+    author: str
+    category: Optional[str] = None
+    cover_image: Optional[str] = None
+    cover_variants: Optional[CoverVariants] = None
+    excerpt: Optional[str] = None
+
+
+class ArticleSearchResult(ArticleSummaryResponse):
+    """文章检索结果（摘要字段 + 命中片段和相关度）"""
+    snippet: Optional[str] = None
+    score: float
+
+
 class BookCreate(BaseModel):
     """创建书籍请求模型"""
     title: str
@@ -123,6 +151,7 @@ class BookResponse(BaseModel):
     id: int
     title: str
     cover_image: Optional[str] = None
+    cover_variants: Optional[CoverVariants] = None
     author: str
     publish_date: str
     description: Optional[str] = None
@@ -130,6 +159,12 @@ class BookResponse(BaseModel):
     updated_at: Optional[str] = None
 
 
+class BookSearchResult(BookResponse):
+    """书籍检索结果（书籍字段 + 简介中的命中片段和相关度）"""
+    snippet: Optional[str] = None
+    score: float
+
+
 class ProductCreate(BaseModel):
     """创建产品请求模型"""
     name: str
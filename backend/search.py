@@ -0,0 +1,422 @@
+"""
+文章全文检索（标题、摘要、中文正文、英文正文）
+- SQLite：FTS5 虚拟表 articles_fts（rowid = 文章 id），由文章增删改接口同步写入
+- MySQL：articles 表上的 FULLTEXT 索引（WITH PARSER ngram），由 MySQL 自动维护
+中文没有空格分词，写入 FTS5 前先预分词：连续的中日韩文字切成相邻二元组（bigram），
+英文/数字按单词小写；查询词按同样方式切分，所有词元都必须命中（AND）。
+三个后端（FTS5、MySQL ngram、倒排索引）使用同一个 parse_query() 的结果，命中规则一致
+结果按相关度排序（SQLite bm25 / MySQL MATCH 分数），摘要片段在 Python 中从原文截取
+
+数据库全文索引不可用时（或 SEARCH_BACKEND=inverted）使用 inverted_index.py 的倒排索引，
+书籍检索始终使用倒排索引；倒排索引在首次查询时从数据库构建，之后由管理接口增量更新
+
+重建索引（批量导入或直接改库之后）：
+  python search.py
+只合并倒排索引的日志（通常由后台线程自动完成）：
+  python search.py --compact
+"""
+import argparse
+import os
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, select, text
+
+from concurrency import run_blocking
+from database import SessionLocal, engine
+from inverted_index import InvertedIndex
+from models import Article, Book
+from serialization import ARTICLE_SUMMARY_FIELDS, BOOK_FIELDS
+
+# 索引的字段及 bm25 权重（标题命中最重要）
+SEARCH_FIELDS = ("title", "excerpt", "content", "content_en")
+FIELD_WEIGHTS = (10.0, 4.0, 1.0, 1.0)
+
+FTS_TABLE = "articles_fts"
+MYSQL_FULLTEXT_INDEX = "ft_articles_search"
+
+# 检索后端：auto（数据库全文索引可用时优先使用）| database | inverted
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")
+# 倒排索引文件目录
+SEARCH_INDEX_DIR = os.getenv(
+    "SEARCH_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "search_index")
+)
+# 倒排索引的字段权重（整数，按权重累加词频）
+ARTICLE_INDEX_WEIGHTS = {"title": 5, "excerpt": 2, "content": 1, "content_en": 1}
+BOOK_INDEX_WEIGHTS = {"title": 5, "author": 3, "description": 1}
+
+# 摘要片段长度（字符数）
+SNIPPET_LENGTH = 120
+
+# 中日韩文字（平假名/片假名、汉字、扩展 A、兼容汉字、谚文）
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+# 一段连续的中日韩文字，或一个其他文字的单词（字母/数字）
+_RUN_RE = re.compile(f"([{_CJK}]+)|((?:(?![{_CJK}])[^\\W_])+)")
+_CJK_RUN_RE = re.compile(f"[{_CJK}]+")
+_TAG_RE = re.compile(r"<[^>]+>")
+_MARKDOWN_IMAGE_RE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+# 当前进程的全文检索是否可用（启动时由 ensure_search_index 设置）
+_available = False
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    """
+    分词：中日韩文字切成相邻二元组，每段的最后一个字额外保留为一元（单字查询也能命中），
+    其他文字按单词小写
+    """
+    tokens = []
+    for cjk, word in _RUN_RE.findall((value or "").lower()):
+        if cjk:
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+            tokens.append(cjk[-1])
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def plain_text(value: Optional[str]) -> str:
+    """去掉 HTML 标签和 Markdown 图片，合并空白"""
+    value = _MARKDOWN_IMAGE_RE.sub(" ", value or "")
+    value = _TAG_RE.sub(" ", value)
+    return _SPACE_RE.sub(" ", value).strip()
+
+
+def _query_terms(query: str) -> List[List[str]]:
+    """按空格拆分查询词，每个词再拆成文字段（中日韩文字段 / 单词）"""
+    terms = []
+    for term in query.split():
+        runs = [cjk or word for cjk, word in _RUN_RE.findall(term.lower())]
+        if runs:
+            terms.append(runs)
+    return terms
+
+
+def parse_query(query: str) -> List[Tuple[List[str], bool]]:
+    """
+    把查询拆成 [(词元列表, 最后一个词元是否按前缀匹配)]，每个查询词一项
+    查询词以中日韩文字结尾时，去掉末字一元（文档中该处后面可能还有字）；
+    只有一个字时改为前缀匹配（命中以该字开头的二元组或末字一元）
+    """
+    groups = []
+    for runs in _query_terms(query):
+        tokens = tokenize(" ".join(runs))
+        prefix = False
+        if _CJK_RUN_RE.fullmatch(runs[-1]):
+            if len(runs[-1]) > 1:
+                tokens.pop()
+            else:
+                prefix = True
+        groups.append((tokens, prefix))
+    return groups
+
+
+def _query_tokens(query: str):
+    """parse_query() 展开成 [(词元, 是否按前缀匹配)]，与倒排索引的 AND 语义一致"""
+    for tokens, prefix in parse_query(query):
+        for i, token in enumerate(tokens):
+            yield token, prefix and i == len(tokens) - 1
+
+
+def fts_query(query: str) -> str:
+    """生成 FTS5 MATCH 表达式：所有词元都必须命中（隐式 AND），单字查询词按前缀匹配"""
+    return " ".join('"' + token + '"' + ("*" if prefix else "") for token, prefix in _query_tokens(query))
+
+
+def mysql_query(query: str) -> str:
+    """生成 MySQL BOOLEAN MODE 表达式：所有词元都必须命中（+词元），单字查询词按前缀匹配（+字*）"""
+    return " ".join("+" + token + ("*" if prefix else "") for token, prefix in _query_tokens(query))
+
+
+def make_snippet(texts, query: str, length: int = SNIPPET_LENGTH) -> str:
+    """从第一个包含查询词的字段截取片段，都不包含时返回第一个非空字段的开头"""
+    needles = [run for runs in _query_terms(query) for run in runs]
+    fallback = ""
+    for value in texts:
+        plain = plain_text(value)
+        if not plain:
+            continue
+        fallback = fallback or plain
+        lower = plain.lower()
+        positions = [pos for pos in (lower.find(needle) for needle in needles) if pos >= 0]
+        if positions:
+            start = max(0, min(positions) - length // 4)
+            end = start + length
+            return ("…" if start > 0 else "") + plain[start:end].strip() + ("…" if end < len(plain) else "")
+    if len(fallback) > length:
+        return fallback[:length].strip() + "…"
+    return fallback
+
+
+def use_inverted_index() -> bool:
+    """文章检索是否使用倒排索引"""
+    return SEARCH_BACKEND == "inverted" or (SEARCH_BACKEND == "auto" and not _available)
+
+
+def is_available() -> bool:
+    return _available or SEARCH_BACKEND != "database"
+
+
+# ==================== 索引维护 ====================
+
+def ensure_search_index(bind=engine):
+    """
+    创建全文索引（启动时调用）
+    SQLite：索引行数和文章数不一致时（例如脚本直接导入了文章）重建索引
+    """
+    global _available
+    dialect = bind.dialect.name
+    if dialect == "sqlite":
+        with bind.begin() as conn:
+            _create_sqlite_table(conn)
+            indexed = conn.execute(text(f"SELECT COUNT(*) FROM {FTS_TABLE}")).scalar()
+            total = conn.execute(select(func.count()).select_from(Article)).scalar()
+            if indexed != total:
+                print(f"Rebuilding search index ({indexed} indexed, {total} articles)")
+                _rebuild_sqlite(conn)
+        _available = True
+    elif dialect == "mysql":
+        columns = ", ".join(SEARCH_FIELDS)
+        with bind.begin() as conn:
+            exists = conn.execute(text(
+                "SELECT COUNT(*) FROM information_schema.statistics"
+                " WHERE table_schema = DATABASE() AND table_name = 'articles' AND index_name = :name"
+            ), {"name": MYSQL_FULLTEXT_INDEX}).scalar()
+            if not exists:
+                print("Creating FULLTEXT index on articles (ngram parser)")
+                conn.execute(text(
+                    f"ALTER TABLE articles ADD FULLTEXT INDEX {MYSQL_FULLTEXT_INDEX} ({columns}) WITH PARSER ngram"
+                ))
+        _available = True
+
+
+def _create_sqlite_table(conn):
+    columns = ", ".join(SEARCH_FIELDS)
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5({columns}, tokenize='unicode61')"
+    ))
+
+
+def _index_values(article) -> dict:
+    values = {"id": article.id}
+    for field in SEARCH_FIELDS:
+        values[field] = " ".join(tokenize(plain_text(getattr(article, field))))
+    return values
+
+
+def _rebuild_sqlite(conn, batch_size: int = 500):
+    """按 id 分批读取文章写入 FTS 表"""
+    columns = ", ".join(SEARCH_FIELDS)
+    params = ", ".join(f":{field}" for field in SEARCH_FIELDS)
+    insert = text(f"INSERT INTO {FTS_TABLE} (rowid, {columns}) VALUES (:id, {params})")
+    conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(Article.id, *(getattr(Article, field) for field in SEARCH_FIELDS))
+            .where(Article.id > last_id)
+            .order_by(Article.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        conn.execute(insert, [_index_values(row) for row in rows])
+        last_id = rows[-1].id
+
+
+def rebuild_search_index(bind=engine):
+    """
+    重建 SQLite 全文索引（MySQL 的 FULLTEXT 索引由数据库维护，无需重建），
+    以及已经存在的倒排索引（不存在的在首次查询时构建）
+    """
+    if bind.dialect.name == "sqlite":
+        with bind.begin() as conn:
+            _create_sqlite_table(conn)
+            _rebuild_sqlite(conn)
+    for index, model in ((article_index, Article), (book_index, Book)):
+        if os.path.exists(index.path):
+            index.build(_iter_documents(model, index.field_weights))
+
+
+def index_article(session, article):
+    """写入/更新一篇文章的索引（与文章的修改在同一事务中，异步会话通过 run_sync 调用）"""
+    if engine.dialect.name != "sqlite" or not _available:
+        return
+    columns = ", ".join(SEARCH_FIELDS)
+    params = ", ".join(f":{field}" for field in SEARCH_FIELDS)
+    session.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": article.id})
+    session.execute(
+        text(f"INSERT INTO {FTS_TABLE} (rowid, {columns}) VALUES (:id, {params})"),
+        _index_values(article)
+    )
+
+
+def remove_article(session, article_id: int):
+    """删除一篇文章的索引"""
+    if engine.dialect.name != "sqlite" or not _available:
+        return
+    session.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": article_id})
+
+
+# ==================== 倒排索引 ====================
+
+article_index = InvertedIndex(os.path.join(SEARCH_INDEX_DIR, "articles.idx"), ARTICLE_INDEX_WEIGHTS)
+book_index = InvertedIndex(os.path.join(SEARCH_INDEX_DIR, "books.idx"), BOOK_INDEX_WEIGHTS)
+
+
+def _document_fields(texts: dict) -> dict:
+    return {field: tokenize(plain_text(value)) for field, value in texts.items()}
+
+
+def _iter_documents(model, weights: dict, batch_size: int = 500):
+    """按 id 分批从数据库读取文档（构建倒排索引用）"""
+    columns = [getattr(model, field) for field in weights]
+    last_id = 0
+    with SessionLocal() as db:
+        while True:
+            rows = db.execute(
+                select(model.id, *columns).where(model.id > last_id).order_by(model.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            for row in rows:
+                yield row.id, _document_fields({field: getattr(row, field) for field in weights})
+            last_id = rows[-1].id
+
+
+def _ensure_inverted_index(index: InvertedIndex, model):
+    """
+    首次使用时加载索引文件；文件不存在或与数据库不一致（文档数 / 最大 id 不同，
+    例如脚本直接导入了数据）时从数据库重建。之后每次查询前只同步其他进程的修改
+    """
+    if index.loaded:
+        index.sync()
+        return
+    if index.load():
+        with SessionLocal() as db:
+            count, max_id = db.execute(select(func.count(), func.max(model.id))).one()
+        if index.doc_count == count and index.max_doc_id == (max_id or 0):
+            return
+    print(f"Building search index {index.path}")
+    index.build(_iter_documents(model, index.field_weights))
+
+
+def _inverted_search(index: InvertedIndex, model, query: str, limit: int, offset: int) -> dict:
+    groups = parse_query(query)
+    if not groups:
+        return {}
+    _ensure_inverted_index(index, model)
+    return dict(index.search(groups, limit, offset))
+
+
+def _put_document(index: InvertedIndex, doc_id: int, texts: dict):
+    index.put(doc_id, _document_fields(texts))
+
+
+async def index_document(index: InvertedIndex, obj):
+    """
+    管理接口写入后更新倒排索引（提交之后调用）
+    索引文件还不存在时不做任何事，首次查询时会完整构建
+    """
+    texts = {field: getattr(obj, field) for field in index.field_weights}
+    await run_blocking(_put_document, index, obj.id, texts)
+
+
+async def remove_document(index: InvertedIndex, doc_id: int):
+    """管理接口删除后更新倒排索引"""
+    await run_blocking(index.delete, doc_id)
+
+
+# ==================== 查询 ====================
+
+async def search_articles(db, query: str, limit: int, offset: int) -> List[dict]:
+    """
+    全文检索，返回按相关度排序的文章摘要（附带 snippet 和 score）
+    先在索引中取出 (id, 分数)，再按 id 加载文章，不读取无关的列
+    """
+    if use_inverted_index():
+        scores = await run_blocking(_inverted_search, article_index, Article, query, limit, offset)
+    else:
+        scores = await _database_search(db, query, limit, offset)
+    if not scores:
+        return []
+
+    # 与列表接口使用同一个序列化器；正文只用于生成 snippet，不输出
+    rows = (await db.execute(
+        ARTICLE_SUMMARY_FIELDS.select(Article.content, Article.content_en).where(Article.id.in_(scores))
+    )).all()
+
+    # 按检索引擎返回的顺序输出（数据库按 id 返回行；分数只在显示时取整，不参与排序）
+    order = {article_id: position for position, article_id in enumerate(scores)}
+    rows = sorted(rows, key=lambda row: order[row.id])
+    results = []
+    for row in rows:
+        item = ARTICLE_SUMMARY_FIELDS.from_row(row)
+        item["snippet"] = make_snippet((row.content, row.content_en, row.excerpt), query)
+        item["score"] = round(scores[row.id], 6)
+        results.append(item)
+    return results
+
+
+async def _database_search(db, query: str, limit: int, offset: int) -> dict:
+    """数据库全文索引检索，返回 {文章 id: 分数}"""
+    if engine.dialect.name == "sqlite":
+        match = fts_query(query)
+        if not match:
+            return {}
+        weights = ", ".join(str(weight) for weight in FIELD_WEIGHTS)
+        result = await db.execute(text(
+            f"SELECT rowid, -bm25({FTS_TABLE}, {weights}) AS score FROM {FTS_TABLE}"
+            f" WHERE {FTS_TABLE} MATCH :match ORDER BY score DESC, rowid DESC LIMIT :limit OFFSET :offset"
+        ), {"match": match, "limit": limit, "offset": offset})
+    else:
+        match = mysql_query(query)
+        if not match:
+            return {}
+        columns = ", ".join(SEARCH_FIELDS)
+        result = await db.execute(text(
+            f"SELECT id, MATCH({columns}) AGAINST (:match IN BOOLEAN MODE) AS score FROM articles"
+            f" WHERE MATCH({columns}) AGAINST (:match IN BOOLEAN MODE)"
+            " ORDER BY score DESC, id DESC LIMIT :limit OFFSET :offset"
+        ), {"match": match, "limit": limit, "offset": offset})
+    return {row[0]: float(row[1]) for row in result.all()}
+
+
+async def search_books(db, query: str, limit: int, offset: int) -> List[dict]:
+    """书籍检索（倒排索引），snippet 取自简介"""
+    scores = await run_blocking(_inverted_search, book_index, Book, query, limit, offset)
+    if not scores:
+        return []
+    rows = (await db.execute(BOOK_FIELDS.select().where(Book.id.in_(scores)))).all()
+    order = {book_id: position for position, book_id in enumerate(scores)}
+    rows = sorted(rows, key=lambda row: order[row.id])
+
+    results = []
+    for row in rows:
+        item = BOOK_FIELDS.from_row(row)
+        item["snippet"] = make_snippet((row.description,), query)
+        item["score"] = round(scores[row.id], 6)
+        results.append(item)
+    return results
+
+
+def compact_search_index():
+    """把已经存在的倒排索引的日志合并进基础段"""
+    for index in (article_index, book_index):
+        if os.path.exists(index.path):
+            index.compact()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="重建全文检索索引")
+    parser.add_argument("--compact", action="store_true", help="只合并倒排索引的日志，不重建")
+    args = parser.parse_args()
+
+    if args.compact:
+        compact_search_index()
+        print("Search index compacted")
+    else:
+        rebuild_search_index()
+        print("Search index rebuilt")
@@ -0,0 +1,141 @@
+"""
+文章语义检索
+- 向量化流水线：文章切块 -> 跨文章分批调用嵌入模型 -> 按文章 upsert 到向量库
+- 查询：问题向量化后取最相近的块，每篇文章保留得分最高的块作为 snippet
+"""
+import threading
+import time
+from typing import List
+
+from sqlalchemy import select
+from sqlalchemy.orm import load_only
+
+from concurrency import run_blocking
+from database import SessionLocal
+from embeddings import EMBEDDING_BATCH_SIZE, chunk_article, embed_in_batches, get_embedder
+from models import Article
+from search import make_snippet
+from serialization import ARTICLE_SUMMARY_FIELDS
+from vector_store import create_vector_store
+
+# 每次检索从向量库多取几倍的块，同一篇文章的多个块合并后仍能凑够 limit 篇
+CANDIDATE_FACTOR = 4
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_vector_store():
+    """当前配置的向量库（进程内单例，首次使用时连接）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            embedder = get_embedder()
+            _store = create_vector_store(embedder.dim, embedder.name)
+        return _store
+
+
+def _chunk_input(article, chunk) -> str:
+    # 每块前面加上标题，短块也能带上文章主题
+    return f"{article.title}\n{chunk.text}"
+
+
+def embed_articles(articles, embedder=None, store=None, batch_size: int = EMBEDDING_BATCH_SIZE) -> dict:
+    """
+    文章向量化并写入向量库，返回统计信息（文章数、块数、耗时、块/秒）
+    articles 只需要 id、title、excerpt、content、content_en 属性
+    """
+    embedder = embedder or get_embedder()
+    store = store or get_vector_store()
+    start = time.perf_counter()
+    stats = {"articles": 0, "chunks": 0}
+    pending = []
+    pending_chunks = 0
+
+    def flush():
+        nonlocal pending, pending_chunks
+        texts = [_chunk_input(article, chunk) for article, chunks in pending for chunk in chunks]
+        vectors = embed_in_batches(embedder, texts, batch_size)
+        items = []
+        offset = 0
+        for article, chunks in pending:
+            items.append((article.id, chunks, vectors[offset:offset + len(chunks)]))
+            offset += len(chunks)
+        store.upsert_many(items)
+        stats["articles"] += len(pending)
+        stats["chunks"] += pending_chunks
+        pending = []
+        pending_chunks = 0
+
+    for article in articles:
+        chunks = chunk_article(article.content, article.content_en, article.excerpt)
+        pending.append((article, chunks))
+        pending_chunks += len(chunks)
+        # 攒够若干批再写入，减少向量库的写入次数
+        if pending_chunks >= batch_size * 8:
+            flush()
+    if pending:
+        flush()
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["chunks_per_second"] = stats["chunks"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+
+def iter_articles(ids=None, batch_size: int = 200):
+    """按 id 顺序分批读取需要向量化的列"""
+    last_id = 0
+    while True:
+        with SessionLocal() as session:
+            statement = (
+                select(Article)
+                .options(load_only(Article.id, Article.title, Article.excerpt, Article.content, Article.content_en))
+                .where(Article.id > last_id)
+                .order_by(Article.id)
+                .limit(batch_size)
+            )
+            if ids:
+                statement = statement.where(Article.id.in_(ids))
+            batch = session.execute(statement).scalars().all()
+        if not batch:
+            return
+        yield from batch
+        last_id = batch[-1].id
+
+
+def _search_chunks(query: str, top_k: int):
+    vector = get_embedder().embed([query])[0]
+    return get_vector_store().search(vector, top_k)
+
+
+async def semantic_search(db, query: str, limit: int) -> List[dict]:
+    """语义检索，返回按相似度排序的文章摘要（附带最相近的块作为 snippet）"""
+    query = query.strip()
+    if not query:
+        return []
+    hits = await run_blocking(_search_chunks, query, limit * CANDIDATE_FACTOR)
+
+    best = {}
+    for hit in hits:
+        # 相似度不为正说明没有任何共同语义（hashing 模型下即没有共同词）
+        if hit.score <= 0:
+            continue
+        if hit.article_id not in best or hit.score > best[hit.article_id].score:
+            best[hit.article_id] = hit
+    best = dict(sorted(best.items(), key=lambda item: item[1].score, reverse=True)[:limit])
+    if not best:
+        return []
+
+    rows = (await db.execute(ARTICLE_SUMMARY_FIELDS.select().where(Article.id.in_(best)))).all()
+
+    # 按相似度（未取整）排序；数据库按 id 返回行
+    order = {article_id: position for position, article_id in enumerate(best)}
+    rows = sorted(rows, key=lambda row: order[row.id])
+    results = []
+    for row in rows:
+        hit = best[row.id]
+        item = ARTICLE_SUMMARY_FIELDS.from_row(row)
+        item["snippet"] = make_snippet((hit.text,), query)
+        item["score"] = round(hit.score, 6)
+        results.append(item)
+    return results
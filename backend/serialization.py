@@ -0,0 +1,129 @@
+"""
+JSON 序列化（读接口的快速路径）
+- dumps()：安装了 orjson 时使用 orjson（datetime 在 C 中编码，不再逐行 isoformat()），
+  否则使用标准库 json；两者输出的字节相同，也与 FastAPI 默认的 JSONResponse 相同
+- RowSerializer：按列清单直接从 Core 查询结果行（或 ORM 对象）生成字典，字段和顺序与 models.py 的 to_dict() 一致；
+  列表接口用 select(*serializer.columns) 查询，不再创建 ORM 对象
+- JSONBytesResponse：路由直接返回它时，FastAPI 不再按 response_model 重新校验和序列化
+  （输出来自数据库，字段与响应模型一致；response_model 仍用于生成接口文档）
+读接口的响应体由 response_cache.cached_response 序列化一次，缓存命中时直接发送缓存的字节
+"""
+import json
+from datetime import date, datetime
+from typing import Optional
+
+from fastapi import Response
+from sqlalchemy import select
+
+from models import Article, Book, Memo, Product
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(content) -> bytes:
+        return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+    loads = orjson.loads
+else:
+    def dumps(content) -> bytes:
+        return json.dumps(
+            content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default
+        ).encode("utf-8")
+
+    loads = json.loads
+
+
+class JSONBytesResponse(Response):
+    """JSON 响应：content 为 bytes 时直接发送，否则用 dumps() 编码"""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+def json_response(content, response: Optional[Response] = None, status_code: int = 200) -> JSONBytesResponse:
+    """生成 JSONBytesResponse，并带上路由在注入的 response 上设置的响应头（ETag、X-Next-Cursor 等）"""
+    result = JSONBytesResponse(content, status_code=status_code)
+    if response is not None:
+        result.headers.update(response.headers)
+    return result
+
+
+def _split_lines(value):
+    return value.split("\n") if value else []
+
+
+def _parse_json(value):
+    return loads(value) if value else None
+
+
+class RowSerializer:
+    """按列清单生成响应字典；converters 为 {列名: 转换函数}，其他列原样输出（datetime 由 dumps() 编码）"""
+
+    def __init__(self, *columns, **converters):
+        self.columns = columns
+        self.keys = tuple(column.key for column in columns)
+        self._converters = tuple((self.keys.index(key), convert) for key, convert in converters.items())
+
+    def select(self, *extra_columns):
+        """查询输出需要的列；extra_columns（例如游标分页的排序列）会被查询，但不会输出"""
+        columns = list(self.columns)
+        columns.extend(column for column in extra_columns if column.key not in self.keys)
+        return select(*columns)
+
+    def from_row(self, row) -> dict:
+        """Core 结果行（按 select() 的列顺序）-> 字典"""
+        if self._converters:
+            row = list(row)
+            for index, convert in self._converters:
+                row[index] = convert(row[index])
+        return dict(zip(self.keys, row))
+
+    def from_rows(self, rows) -> list:
+        return [self.from_row(row) for row in rows]
+
+    def from_object(self, obj) -> dict:
+        """ORM 对象 -> 字典"""
+        return self.from_row([getattr(obj, key) for key in self.keys])
+
+
+PRODUCT_FIELDS = RowSerializer(
+    Product.id, Product.name, Product.title, Product.description, Product.features, Product.image_url,
+    Product.official_url, Product.order_index, Product.created_at, Product.updated_at,
+    features=_split_lines,
+)
+MEMO_FIELDS = RowSerializer(
+    Memo.id, Memo.user_id, Memo.title, Memo.content, Memo.is_pinned, Memo.created_at, Memo.updated_at,
+)
+ARTICLE_FIELDS = RowSerializer(
+    Article.id, Article.title, Article.publish_date, Article.author, Article.original_url, Article.category,
+    Article.content, Article.content_en, Article.cover_image, Article.cover_variants, Article.excerpt,
+    Article.created_at, Article.updated_at,
+    cover_variants=_parse_json,
+)
+# 列表模式：不读取正文（content/content_en）
+ARTICLE_SUMMARY_FIELDS = RowSerializer(
+    Article.id, Article.title, Article.publish_date, Article.author, Article.category, Article.cover_image,
+    Article.cover_variants, Article.excerpt,
+    cover_variants=_parse_json,
+)
+BOOK_FIELDS = RowSerializer(
+    Book.id, Book.title, Book.cover_image, Book.cover_variants, Book.author, Book.publish_date,
+    Book.description, Book.created_at, Book.updated_at,
+    cover_variants=_parse_json,
+)
@@ -0,0 +1,403 @@
+"""
+/data 目录的静态文件服务（替代 StaticFiles）
+- 强校验值：内容寻址存储中的文件用文件名（sha256）作为 ETag，其他文件用 inode + 修改时间 + 大小；
+  支持 If-Match / If-Unmodified-Since / If-None-Match / If-Modified-Since
+- Range 请求（单个范围）和 If-Range，范围无效时返回 416
+- 按 Accept-Encoding 选择预压缩的 .br / .gz 文件（比原文件新时才使用），响应带 Vary: Accept-Encoding
+- 服务器支持 ASGI pathsend 扩展时（Granian、Hypercorn 等）由服务器零拷贝发送整个文件；
+  uvicorn 不支持 pathsend，在线程池中按块读取，不占用事件循环但不是零拷贝。
+  生产环境 /data 由 nginx 直接发送（sendfile），这里主要用于开发和没有 nginx 的部署
+- data/covers 下的文件内容不会变，带 immutable 长期缓存头；其他文件每次用 ETag 校验
+- 隐藏文件（包括隐藏目录中的文件）、数据库（包括 -wal / -shm / -journal 文件）和锁文件、临时文件、索引日志、导入进度和存储清单返回 404
+生成预压缩文件：python static_files.py（export_articles.py 导出后会自动生成）
+"""
+import gzip
+import mimetypes
+import os
+import re
+import shutil
+import stat as stat_module
+import sys
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+import anyio.to_thread
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 每次读取并发送的字节数
+CHUNK_SIZE = 256 * 1024
+# 小于该大小的文件不生成预压缩文件
+PRECOMPRESS_MIN_SIZE = 1024
+# 大于该大小的文件不生成 .br（quality 11 每秒只能压缩几 MB），只生成 .gz
+PRECOMPRESS_BROTLI_MAX_SIZE = 32 * 1024 * 1024
+# 生成预压缩文件的扩展名（图片等已压缩的格式不处理）
+PRECOMPRESS_EXTENSIONS = {".json", ".ndjson", ".jsonl", ".txt", ".csv", ".svg", ".html", ".css", ".js", ".xml", ".md"}
+# Accept-Encoding -> 预压缩文件的后缀（按优先顺序）
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# 不对外提供的文件（锁文件、写入中的临时文件、索引的增量日志、导入进度）
+HIDDEN_EXTENSIONS = {".lock", ".tmp", ".journal", ".progress"}
+# SQLite 数据库及其 WAL / 共享内存 / 回滚日志文件（products.db-wal、response_cache.db-shm 等）
+_SQLITE_FILE = re.compile(r"\.(db|sqlite3?)(-wal|-shm|-journal)?$", re.IGNORECASE)
+# 不对外提供的文件名（封面存储和向量刷新的清单）
+HIDDEN_NAMES = {"manifest.json"}
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+mimetypes.add_type("application/x-ndjson", ".ndjson")
+mimetypes.add_type("application/x-ndjson", ".jsonl")
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/avif", ".avif")
+
+_RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+_CONTENT_ADDRESSED = re.compile(r"[0-9a-f]{64}(\.|$)")
+
+
+def _http_date(timestamp: float) -> str:
+    return format_datetime(datetime.fromtimestamp(int(timestamp), timezone.utc), usegmt=True)
+
+
+def _parse_http_date(value: str) -> Optional[float]:
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def _route_path(scope) -> str:
+    """挂载点之下的路径：Mount 把挂载前缀放在 root_path 中，path 仍是完整路径"""
+    path = scope["path"]
+    root_path = scope.get("root_path", "")
+    if root_path and path.startswith(root_path) and path[len(root_path):len(root_path) + 1] in ("", "/"):
+        return path[len(root_path):]
+    return path
+
+
+def _hidden(relative: str) -> bool:
+    parts = relative.split("/")
+    name = parts[-1]
+    return (
+        any(part.startswith(".") for part in parts)
+        or name in HIDDEN_NAMES
+        or _SQLITE_FILE.search(name) is not None
+        or os.path.splitext(name)[1].lower() in HIDDEN_EXTENSIONS
+    )
+
+
+def _tag_list(value: str):
+    return [tag.strip() for tag in value.split(",")]
+
+
+def accepted_encodings(header: Optional[str]) -> set:
+    """Accept-Encoding 中 q > 0 的编码"""
+    accepted = set()
+    for item in (header or "").lower().split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            accepted.add(name)
+    return accepted
+
+
+def parse_range(header: Optional[str], size: int):
+    """
+    解析单个字节范围，返回 (start, end)（含 end）
+    没有 Range、格式不支持（包括多个范围）时返回 None，按完整内容响应；范围无法满足时返回 "unsatisfiable"
+    """
+    if not header:
+        return None
+    match = _RANGE_PATTERN.fullmatch(header.replace(" ", ""))
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    start, end = match.groups()
+    if start == "":
+        # 最后 N 个字节
+        length = int(end)
+        if length == 0:
+            return "unsatisfiable"
+        return max(0, size - length), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return "unsatisfiable"
+    return start, end
+
+
+class DataFiles:
+    """data 目录的 ASGI 静态文件应用（挂载方式与 StaticFiles 相同）"""
+
+    def __init__(self, directory: str, immutable_prefixes=("covers/",)):
+        self.directory = os.path.realpath(directory)
+        self.immutable_prefixes = tuple(immutable_prefixes)
+
+    def _resolve(self, route_path: str) -> Optional[str]:
+        relative = os.path.normpath(route_path.lstrip("/"))
+        if relative.startswith("..") or os.path.isabs(relative) or relative == ".":
+            return None
+        return os.path.join(self.directory, relative)
+
+    def _etag(self, relative: str, stat) -> str:
+        name = os.path.basename(relative)
+        if _CONTENT_ADDRESSED.match(name):
+            # 内容寻址：文件名由内容决定
+            return f'"{name}-{stat.st_size:x}"'
+        return f'"{stat.st_ino:x}-{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+    def _select(self, path: str, accept_encoding: Optional[str]):
+        """返回 (实际发送的文件, 其文件状态, Content-Encoding, 原文件状态)，文件不存在时返回 None"""
+        try:
+            stat = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        # 不跟随指向 data 目录之外的符号链接
+        if not os.path.realpath(path).startswith(os.path.join(self.directory, "")):
+            return None
+        relative = os.path.relpath(path, self.directory).replace(os.sep, "/")
+        if not stat_module.S_ISREG(stat.st_mode) or _hidden(relative):
+            return None
+        if os.path.splitext(path)[1].lower() in PRECOMPRESS_EXTENSIONS:
+            accepted = accepted_encodings(accept_encoding)
+            for encoding, suffix in ENCODINGS:
+                if encoding not in accepted:
+                    continue
+                try:
+                    encoded_stat = os.stat(path + suffix)
+                except FileNotFoundError:
+                    continue
+                # 原文件更新后、预压缩文件重新生成之前不使用旧的压缩文件
+                if encoded_stat.st_mtime_ns >= stat.st_mtime_ns:
+                    return path + suffix, encoded_stat, encoding, stat
+        return path, stat, None, stat
+
+    async def __call__(self, scope, receive, send):
+        assert scope["type"] == "http"
+        method = scope["method"]
+        if method not in ("GET", "HEAD"):
+            await self._respond(send, 405, {"allow": "GET, HEAD"}, b"Method Not Allowed")
+            return
+
+        headers = {}
+        for key, value in scope["headers"]:
+            headers[key.decode("latin-1")] = value.decode("latin-1")
+        relative = _route_path(scope).lstrip("/")
+        path = self._resolve(relative)
+        selected = path and await anyio.to_thread.run_sync(self._select, path, headers.get("accept-encoding"))
+        if not selected:
+            await self._respond(send, 404, {}, b"Not Found")
+            return
+        file_path, stat, encoding, source_stat = selected
+
+        content_type, _ = mimetypes.guess_type(path)
+        etag = self._etag(relative, source_stat)
+        if encoding:
+            etag = f'{etag[:-1]}-{encoding}"'
+        last_modified = int(source_stat.st_mtime)
+        response_headers = {
+            "content-type": content_type or "application/octet-stream",
+            "etag": etag,
+            "last-modified": _http_date(last_modified),
+            "accept-ranges": "bytes",
+            "cache-control": (
+                IMMUTABLE_CACHE_CONTROL if relative.startswith(self.immutable_prefixes) else REVALIDATE_CACHE_CONTROL
+            ),
+        }
+        if os.path.splitext(path)[1].lower() in PRECOMPRESS_EXTENSIONS:
+            response_headers["vary"] = "Accept-Encoding"
+        if encoding:
+            response_headers["content-encoding"] = encoding
+
+        # 前置条件（RFC 9110 13.2.2 的顺序）
+        if_match = headers.get("if-match")
+        if if_match is not None:
+            if if_match.strip() != "*" and etag not in _tag_list(if_match):
+                await self._respond(send, 412, {"etag": etag}, b"")
+                return
+        elif headers.get("if-unmodified-since"):
+            since = _parse_http_date(headers["if-unmodified-since"])
+            if since is not None and last_modified > since:
+                await self._respond(send, 412, {"etag": etag}, b"")
+                return
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None:
+            # 弱比较
+            candidates = [tag.removeprefix("W/") for tag in _tag_list(if_none_match)]
+            if if_none_match.strip() == "*" or etag in candidates:
+                await self._not_modified(send, response_headers)
+                return
+        elif headers.get("if-modified-since"):
+            since = _parse_http_date(headers["if-modified-since"])
+            if since is not None and last_modified <= since:
+                await self._not_modified(send, response_headers)
+                return
+
+        size = stat.st_size
+        byte_range = parse_range(headers.get("range"), size)
+        if byte_range is not None and not self._if_range_matches(headers.get("if-range"), etag, last_modified):
+            byte_range = None
+        if byte_range == "unsatisfiable":
+            await self._respond(send, 416, {"content-range": f"bytes */{size}"}, b"")
+            return
+
+        if byte_range is None:
+            start, end, status = 0, size - 1, 200
+        else:
+            start, end = byte_range
+            status = 206
+            response_headers["content-range"] = f"bytes {start}-{end}/{size}"
+        response_headers["content-length"] = str(end - start + 1)
+
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(key.encode("latin-1"), value.encode("latin-1")) for key, value in response_headers.items()],
+        })
+        if method == "HEAD" or size == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        if status == 200 and "http.response.pathsend" in scope.get("extensions", {}):
+            await send({"type": "http.response.pathsend", "path": file_path})
+            return
+        await self._send_file(send, file_path, start, end - start + 1)
+
+    @staticmethod
+    def _if_range_matches(if_range: Optional[str], etag: str, last_modified: int) -> bool:
+        """If-Range：ETag 使用强比较，日期必须与 Last-Modified 完全相同；不一致时忽略 Range"""
+        if if_range is None:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith(("\"", "W/")):
+            return if_range == etag
+        since = _parse_http_date(if_range)
+        return since is not None and int(since) == last_modified
+
+    @staticmethod
+    async def _send_file(send, path: str, offset: int, length: int):
+        def read_chunk(f, size):
+            return f.read(size)
+
+        f = await anyio.to_thread.run_sync(open, path, "rb")
+        try:
+            if offset:
+                await anyio.to_thread.run_sync(f.seek, offset)
+            remaining = length
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(read_chunk, f, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    # 发送过程中文件被截断
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            await anyio.to_thread.run_sync(f.close)
+
+    @staticmethod
+    async def _not_modified(send, response_headers: dict):
+        headers = {key: value for key, value in response_headers.items()
+                   if key in ("etag", "last-modified", "cache-control", "vary", "content-encoding")}
+        await DataFiles._respond(send, 304, headers, b"")
+
+    @staticmethod
+    async def _respond(send, status: int, headers: dict, body: bytes):
+        headers = {**headers, "content-length": str(len(body))}
+        if body:
+            headers["content-type"] = "text/plain; charset=utf-8"
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(key.encode("latin-1"), value.encode("latin-1")) for key, value in headers.items()],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+# ==================== 预压缩 ====================
+
+def _gzip_stream(src, dst):
+    # mtime=0、不写文件名：同样的内容生成同样的 .gz 文件
+    with gzip.GzipFile(filename="", mode="wb", compresslevel=9, fileobj=dst, mtime=0) as f:
+        shutil.copyfileobj(src, f, CHUNK_SIZE)
+
+
+def _brotli_stream(src, dst):
+    compressor = brotli.Compressor(quality=11)
+    for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+        dst.write(compressor.process(chunk))
+    dst.write(compressor.finish())
+
+
+def _write_sibling(path: str, suffix: str, stat) -> bool:
+    """按块压缩 path 写入 path + suffix（内存占用与文件大小无关）；压缩后没有变小时不保留"""
+    target = path + suffix
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    compress = _brotli_stream if suffix == ".br" else _gzip_stream
+    try:
+        with open(path, "rb") as src, open(tmp_path, "wb") as dst:
+            compress(src, dst)
+        if os.path.getsize(tmp_path) >= stat.st_size:
+            os.remove(tmp_path)
+            return False
+        # 与原文件的修改时间相同：原文件再被修改后预压缩文件自动失效
+        os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(tmp_path, target)
+        return True
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def precompress(path: str, min_size: int = PRECOMPRESS_MIN_SIZE,
+                brotli_max_size: int = PRECOMPRESS_BROTLI_MAX_SIZE) -> list:
+    """
+    为 path 生成 .gz（和 .br，需要安装 brotli）文件，已是最新时跳过；返回生成的后缀
+    超过 brotli_max_size 的文件只生成 .gz（brotli 最高质量压缩很慢）
+    """
+    stat = os.stat(path)
+    if stat.st_size < min_size:
+        return []
+    pending = [
+        suffix for encoding, suffix in ENCODINGS
+        if encoding != "br" or (brotli is not None and stat.st_size <= brotli_max_size)
+    ]
+    pending = [
+        suffix for suffix in pending
+        if not os.path.exists(path + suffix) or os.stat(path + suffix).st_mtime_ns != stat.st_mtime_ns
+    ]
+    return [suffix for suffix in pending if _write_sibling(path, suffix, stat)]
+
+
+def precompress_directory(directory: str) -> dict:
+    """为目录中所有可压缩的文件生成预压缩文件"""
+    stats = {"files": 0, "written": 0}
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if os.path.splitext(name)[1].lower() not in PRECOMPRESS_EXTENSIONS or name.startswith("."):
+                continue
+            stats["files"] += 1
+            stats["written"] += len(precompress(os.path.join(root, name)))
+    return stats
+
+
+if __name__ == "__main__":
+    from cover_store import DATA_DIR
+
+    directory = sys.argv[1] if len(sys.argv) > 1 else DATA_DIR
+    if brotli is None:
+        print("brotli 未安装，只生成 .gz 文件（pip install brotli）")
+    result = precompress_directory(directory)
+    print(f"检查 {result['files']} 个文件，生成 {result['written']} 个预压缩文件")
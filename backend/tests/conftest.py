@@ -0,0 +1,50 @@
+"""
+测试环境：临时 SQLite 数据库和临时数据目录
+环境变量必须在导入后端模块之前设置（各模块在导入时读取配置）
+运行：cd backend && python -m pytest
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+TEST_DIR = tempfile.mkdtemp(prefix="backend-tests-")
+
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}",
+    "COVER_STORE_DIR": os.path.join(TEST_DIR, "covers"),
+    "IMAGE_VARIANT_DIR": os.path.join(TEST_DIR, "variants"),
+    "SEARCH_INDEX_DIR": os.path.join(TEST_DIR, "search_index"),
+    "VECTOR_STORE": "numpy",
+    "VECTOR_STORE_PATH": os.path.join(TEST_DIR, "vectors", "articles.npz"),
+    "EMBEDDING_MANIFEST_PATH": os.path.join(TEST_DIR, "vectors", "manifest.json"),
+    "EMBEDDING_AUTO_REFRESH": "false",
+    "RESPONSE_CACHE_EPOCH_DIR": os.path.join(TEST_DIR, "response_cache"),
+    "AUTH_CACHE_EPOCH_FILE": os.path.join(TEST_DIR, "auth_cache_epoch"),
+    "BCRYPT_ROUNDS": "4",
+    "BCRYPT_MIN_ROUNDS": "4",
+})
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ADMIN_PASSWORD = "admin-password"
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as test_client:
+        response = test_client.post("/api/admin/setup", json={"password": ADMIN_PASSWORD})
+        assert response.status_code == 200, response.text
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def admin_headers(client):
+    response = client.post("/api/auth/login-json", json={"username": "Admin", "password": ADMIN_PASSWORD})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
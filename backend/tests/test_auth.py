@@ -0,0 +1,117 @@
+"""
+认证相关测试：已验证用户缓存的失效、Attu 签名会话 cookie
+"""
+import base64
+import os
+
+import auth
+from auth import ATTU_SESSION_COOKIE, PrincipalCache, create_attu_session, verify_attu_session
+from models import User
+
+
+def make_user(user_id=1, username="alice", is_active=True):
+    return User(id=user_id, username=username, email=f"{username}@example.com", is_active=is_active)
+
+
+def register_and_login(client, username, password="user-password"):
+    response = client.post("/api/auth/register", json={
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": password,
+    })
+    assert response.status_code == 201, response.text
+    response = client.post("/api/auth/login-json", json={"username": username, "password": password})
+    assert response.status_code == 200, response.text
+    return response.json()["user"]["id"], {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_principal_cache_invalidate_user(tmp_path):
+    cache = PrincipalCache(epoch_file=str(tmp_path / "epoch"))
+    cache.set("token-a", make_user(1, "alice"))
+    cache.set("token-b", make_user(2, "bob"))
+
+    cache.invalidate_user(1)
+
+    assert cache.get("token-a") is None
+    assert cache.get("token-b").username == "bob"
+    assert os.path.exists(tmp_path / "epoch")
+
+
+def test_principal_cache_invalidation_reaches_other_workers(tmp_path):
+    epoch_file = str(tmp_path / "epoch")
+    worker_a = PrincipalCache(epoch_file=epoch_file)
+    worker_b = PrincipalCache(epoch_file=epoch_file)
+    worker_b.set("token-a", make_user(1, "alice"))
+    epoch_before = worker_b.epoch_tag()
+
+    worker_a.invalidate_user(1)
+
+    assert worker_b.epoch_tag() != epoch_before
+    assert worker_b.get("token-a") is None
+
+
+def test_principal_cache_respects_token_expiry(tmp_path):
+    cache = PrincipalCache(epoch_file=str(tmp_path / "epoch"))
+    cache.set("token-a", make_user(), token_expires_at=0)
+    assert cache.get("token-a") is None
+
+
+def test_deactivated_user_rejected_while_cached(client, admin_headers):
+    user_id, headers = register_and_login(client, "cache-deactivate")
+    # 第一次请求写入缓存
+    assert client.get("/api/auth/me", headers=headers).status_code == 200
+
+    response = client.patch(f"/api/admin/users/{user_id}/status", params={"is_active": False}, headers=admin_headers)
+    assert response.status_code == 200, response.text
+
+    assert client.get("/api/auth/me", headers=headers).status_code == 400
+
+
+def test_deleted_user_rejected_while_cached(client, admin_headers):
+    user_id, headers = register_and_login(client, "cache-delete")
+    assert client.get("/api/auth/me", headers=headers).status_code == 200
+
+    response = client.delete(f"/api/admin/users/{user_id}", headers=admin_headers)
+    assert response.status_code == 200, response.text
+
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
+
+
+def test_attu_session_roundtrip():
+    assert verify_attu_session(create_attu_session("Admin")) == "Admin"
+
+
+def test_attu_session_rejects_tampered_payload():
+    encoded, signature = create_attu_session("alice").split(".", 1)
+    payload = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode("utf-8")
+    forged = base64.urlsafe_b64encode(payload.replace("alice", "Admin", 1).encode("utf-8")).decode("ascii").rstrip("=")
+
+    assert verify_attu_session(f"{forged}.{signature}") is None
+    assert verify_attu_session(f"{encoded}.{signature[:-2]}xx") is None
+    assert verify_attu_session("not-a-cookie") is None
+
+
+def test_attu_session_rejects_expired(monkeypatch):
+    monkeypatch.setattr(auth, "ATTU_SESSION_TTL", 0)
+    assert verify_attu_session(create_attu_session("Admin")) is None
+
+
+def test_attu_session_rejects_after_invalidation():
+    value = create_attu_session("Admin")
+    auth.principal_cache.invalidate_user(-1)
+    assert verify_attu_session(value) is None
+
+
+def test_verify_attu_sets_session_cookie(client, admin_headers):
+    response = client.get("/api/auth/verify-attu", headers=admin_headers)
+    assert response.status_code == 200, response.text
+    value = response.cookies.get(ATTU_SESSION_COOKIE)
+    assert value and verify_attu_session(value) == "Admin"
+
+    # 只带会话 cookie 也能通过
+    response = client.get("/api/auth/verify-attu", headers={"Cookie": f"{ATTU_SESSION_COOKIE}={value}"})
+    assert response.status_code == 200, response.text
+    assert response.json()["username"] == "Admin"
+
+    response = client.get("/api/auth/verify-attu", headers={"Cookie": f"{ATTU_SESSION_COOKIE}=forged.value"})
+    assert response.status_code == 401
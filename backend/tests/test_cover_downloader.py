@@ -0,0 +1,131 @@
+"""
+封面下载器：对本地 HTTP 服务测试成功、重试、超时和按域名的并发限制
+"""
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from cover_downloader import CoverDownloader
+
+
+class ImageServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), ImageHandler)
+        self.requests = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests[self.path] += 1
+            attempt = server.requests[self.path]
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            if self.path.startswith("/flaky") and attempt == 1:
+                self._send(503, b"busy")
+            elif self.path.startswith("/throttled") and attempt == 1:
+                self._send(429, b"slow down", {"Retry-After": "0"})
+            elif self.path.startswith("/missing"):
+                self._send(404, b"not found")
+            elif self.path.startswith("/slow"):
+                time.sleep(1)
+                self._send(200, b"too late")
+            else:
+                if self.path.startswith("/busy"):
+                    time.sleep(0.1)
+                self._send(200, f"image:{self.path}".encode("utf-8"))
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ImageServer()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def downloader():
+    downloader = CoverDownloader(workers=8, per_host=2, retries=2, backoff=0.01, timeout=5)
+    yield downloader
+    downloader.close()
+
+
+def test_fetch_success(server, downloader):
+    result = downloader.fetch("cover", server.url("/ok.jpg"), referer="https://example.com/")
+    assert result.ok
+    assert result.key == "cover"
+    assert result.content == b"image:/ok.jpg"
+
+
+def test_retries_server_errors(server, downloader):
+    result = downloader.fetch("cover", server.url("/flaky.jpg"))
+    assert result.content == b"image:/flaky.jpg"
+    assert server.requests["/flaky.jpg"] == 2
+
+
+def test_retries_429_with_retry_after(server, downloader):
+    result = downloader.fetch("cover", server.url("/throttled.jpg"))
+    assert result.ok
+    assert server.requests["/throttled.jpg"] == 2
+
+
+def test_client_errors_are_not_retried(server, downloader):
+    result = downloader.fetch("cover", server.url("/missing.jpg"))
+    assert not result.ok
+    assert "404" in result.error
+    assert server.requests["/missing.jpg"] == 1
+
+
+def test_timeout_gives_up_after_retries(server):
+    downloader = CoverDownloader(retries=1, backoff=0.01, timeout=0.2)
+    try:
+        start = time.perf_counter()
+        result = downloader.fetch("cover", server.url("/slow.jpg"))
+        elapsed = time.perf_counter() - start
+    finally:
+        downloader.close()
+    assert not result.ok
+    assert result.error
+    assert server.requests["/slow.jpg"] == 2
+    assert elapsed < 1.5
+
+
+def test_fetch_many_limits_concurrency_per_host(server, downloader):
+    jobs = [(i, server.url(f"/busy/{i}.jpg")) for i in range(8)]
+
+    results = list(downloader.fetch_many(jobs))
+
+    assert sorted(result.key for result in results) == list(range(8))
+    assert all(result.ok for result in results)
+    assert server.max_in_flight == downloader.per_host
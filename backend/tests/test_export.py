@@ -0,0 +1,78 @@
+"""
+导出与预压缩：--since 的时区处理、流式生成 .gz / .br 文件
+"""
+import gzip
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import static_files
+from export_articles import _parse_since, export_articles as run_export
+
+
+def test_parse_since_converts_aware_to_naive_utc():
+    assert _parse_since("2026-01-01T08:00:00+08:00") == datetime(2026, 1, 1, 0, 0)
+    assert _parse_since("2026-01-01T00:00:00Z") == datetime(2026, 1, 1, 0, 0)
+    assert _parse_since("2026-01-01 08:00:00") == datetime(2026, 1, 1, 8, 0)
+    assert _parse_since(None) is None
+    with pytest.raises(ValueError):
+        _parse_since("not a date")
+
+
+def test_export_since_with_offset(client, admin_headers, tmp_path):
+    response = client.post("/api/admin/articles", json={
+        "title": "导出时区", "publish_date": "2026-01-03", "author": "测试", "content": "正文",
+    }, headers=admin_headers)
+    assert response.status_code == 201, response.text
+    article_id = response.json()["id"]
+
+    # 同一时刻用 +08:00 表示：不转换成 UTC 时会比数据库中的 UTC 时间晚 8 小时，文章被漏掉
+    shanghai = timezone(timedelta(hours=8))
+    before = (datetime.now(timezone.utc) - timedelta(minutes=30)).astimezone(shanghai).isoformat()
+    after = (datetime.now(timezone.utc) + timedelta(minutes=30)).astimezone(shanghai).isoformat()
+
+    output = str(tmp_path / "changes.ndjson")
+    run_export(output, since=before)
+    with open(output, encoding="utf-8") as f:
+        assert article_id in [json.loads(line)["id"] for line in f]
+
+    assert run_export(output, since=after) == 0
+
+
+def test_precompress_streams_gzip_and_brotli(tmp_path, monkeypatch):
+    path = tmp_path / "articles.json"
+    content = json.dumps([{"id": i, "title": f"文章 {i}"} for i in range(20000)], ensure_ascii=False).encode("utf-8")
+    path.write_bytes(content)
+    # 小块读取，确认按块处理的结果与一次性压缩一致
+    monkeypatch.setattr(static_files, "CHUNK_SIZE", 4096)
+
+    written = static_files.precompress(str(path))
+
+    expected = [".gz"] if static_files.brotli is None else [".br", ".gz"]
+    assert written == expected
+    assert gzip.decompress((tmp_path / "articles.json.gz").read_bytes()) == content
+    if static_files.brotli is not None:
+        assert static_files.brotli.decompress((tmp_path / "articles.json.br").read_bytes()) == content
+    for suffix in written:
+        assert os.stat(str(path) + suffix).st_mtime_ns == os.stat(path).st_mtime_ns
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+    # 已是最新时跳过
+    assert static_files.precompress(str(path)) == []
+
+
+def test_precompress_skips_brotli_above_size_limit(tmp_path):
+    path = tmp_path / "big.txt"
+    path.write_bytes(b"repeat " * 1000)
+    assert static_files.precompress(str(path), brotli_max_size=1000) == [".gz"]
+    assert not os.path.exists(str(path) + ".br")
+
+
+def test_precompress_drops_output_that_is_not_smaller(tmp_path):
+    path = tmp_path / "random.txt"
+    path.write_bytes(os.urandom(4096))
+    assert static_files.precompress(str(path)) == []
+    assert os.listdir(tmp_path) == ["random.txt"]
+
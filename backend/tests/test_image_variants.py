@@ -0,0 +1,38 @@
+"""
+图片缩放接口：请求的宽高向上取整到固定档位
+"""
+import io
+
+from PIL import Image
+
+import image_variants
+from image_variants import IMAGE_MAX_DIMENSION, IMAGE_SIZE_BUCKETS, bucket_size
+
+
+def test_bucket_size_rounds_up():
+    assert bucket_size(None) is None
+    assert bucket_size(1) == IMAGE_SIZE_BUCKETS[0]
+    assert bucket_size(320) == 320
+    assert bucket_size(321) == 480
+    assert bucket_size(IMAGE_MAX_DIMENSION) == IMAGE_MAX_DIMENSION
+    assert {320, 640, 960} <= set(IMAGE_SIZE_BUCKETS)
+
+
+def test_requested_sizes_share_bucketed_variants(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(image_variants, "DATA_DIR", str(tmp_path))
+    Image.new("RGB", (1200, 800), (200, 80, 40)).save(tmp_path / "cover.png")
+
+    first = client.get("/api/images/cover.png", params={"w": 900, "fmt": "png"})
+    assert first.status_code == 200, first.text
+    assert Image.open(io.BytesIO(first.content)).size == (960, 640)
+
+    # 同一档位内的宽度命中同一个变体
+    second = client.get("/api/images/cover.png", params={"w": 950, "fmt": "png"})
+    assert second.headers["etag"] == first.headers["etag"]
+    assert client.get("/api/images/cover.png", params={"w": 961, "fmt": "png"}).headers["etag"] != first.headers["etag"]
+
+    cropped = client.get("/api/images/cover.png", params={"w": 300, "h": 150, "fmt": "png"})
+    assert Image.open(io.BytesIO(cropped.content)).size == (320, 160)
+
+    too_large = client.get("/api/images/cover.png", params={"w": IMAGE_MAX_DIMENSION + 1})
+    assert too_large.status_code == 422
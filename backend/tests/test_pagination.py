@@ -0,0 +1,63 @@
+from datetime import datetime
+
+from sqlalchemy import create_engine, text
+
+from database import Base
+from models import Article, Book
+from pagination import ensure_sort_columns
+
+
+def test_ensure_sort_columns_pads_timestamps_without_touching_updated_at(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        # 旧版本由 server_default 写入的时间：没有微秒，updated_at 为空
+        conn.execute(text(
+            "INSERT INTO articles (title, author, publish_date, created_at)"
+            " VALUES ('旧文章', 'a', '2024-01-01 08:00:00', '2024-01-02 09:00:00')"
+        ))
+        conn.execute(text(
+            "INSERT INTO books (title, author, publish_date, created_at, updated_at)"
+            " VALUES ('旧书', 'a', '2020-01-01 00:00:00', '2020-01-02 00:00:00', '2020-01-03 00:00:00')"
+        ))
+
+    ensure_sort_columns(engine, (Article, Book))
+    ensure_sort_columns(engine, (Article, Book))
+
+    with engine.connect() as conn:
+        article = conn.execute(text("SELECT publish_date, created_at, updated_at FROM articles")).one()
+        book = conn.execute(text("SELECT publish_date, created_at, updated_at FROM books")).one()
+    assert article == ("2024-01-01 08:00:00.000000", "2024-01-02 09:00:00.000000", None)
+    assert book == ("2020-01-01 00:00:00.000000", "2020-01-02 00:00:00.000000", "2020-01-03 00:00:00.000000")
+    engine.dispose()
+
+
+def test_startup_does_not_migrate_sort_columns():
+    import main
+
+    assert not hasattr(main, "ensure_sort_columns")
+
+
+def test_cursor_pagination_walks_every_article_once(client, admin_headers):
+    created = set()
+    for i in range(5):
+        response = client.post("/api/admin/articles", headers=admin_headers, json={
+            "title": f"分页 {i}", "publish_date": "2025-03-01T00:00:00Z", "author": "a", "content": "正文",
+        })
+        assert response.status_code == 201, response.text
+        created.add(response.json()["id"])
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2, "view": "summary"}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/articles", params=params)
+        assert response.status_code == 200
+        seen.extend(item["id"] for item in response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert len(seen) == len(set(seen))
+    assert created <= set(seen)
@@ -0,0 +1,106 @@
+"""
+密码哈希测试：bcrypt 哈希与验证、旧哈希的透明升级、密码哈希进程池满时的 503
+"""
+import hashlib
+
+import main
+import passwords
+from concurrency import password_hash_pool
+from database import SessionLocal
+from models import User
+
+
+def test_hash_and_verify():
+    hashed = passwords.hash_password("correct horse")
+    assert hashed.startswith("$2b$04$")
+    assert passwords.verify_password("correct horse", hashed)
+    assert not passwords.verify_password("wrong horse", hashed)
+
+
+def test_verify_rejects_empty_and_unknown_hashes():
+    assert not passwords.verify_password("secret", "")
+    assert not passwords.verify_password("secret", "plain-text-secret")
+
+
+def test_long_password_truncated_to_72_bytes():
+    hashed = passwords.hash_password("x" * 72 + "tail")
+    assert passwords.verify_password("x" * 72, hashed)
+    assert passwords.verify_password("x" * 72 + "other tail", hashed)
+
+
+def test_multibyte_password_truncated_on_character_boundary():
+    password = "密" * 30  # 90 字节，截断时丢弃半个字符
+    hashed = passwords.hash_password(password)
+    assert passwords.verify_password(password, hashed)
+    assert passwords.verify_password("密" * 24, hashed)
+
+
+def test_register_returns_503_when_hash_pool_is_full(client, monkeypatch):
+    monkeypatch.setattr(password_hash_pool, "capacity", 0)
+    response = client.post("/api/auth/register", json={
+        "username": "pool-full",
+        "email": "pool-full@example.com",
+        "password": "user-password",
+    })
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(password_hash_pool.retry_after)
+
+
+def test_setup_admin_returns_503_when_hash_pool_is_full(client, monkeypatch):
+    monkeypatch.setattr(password_hash_pool, "capacity", 0)
+    # 管理员已由 fixture 创建，这里假装尚未创建，让请求走到哈希这一步
+    monkeypatch.setattr(main, "get_user_by_username", lambda db, username: None)
+    response = client.post("/api/admin/setup", json={"password": "another-password"})
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+
+def test_verify_and_update_upgrades_low_rounds(monkeypatch):
+    old_hash = passwords.hash_password("secret")
+    monkeypatch.setattr(passwords, "_rounds", 5)
+
+    valid, new_hash = passwords.verify_and_update("secret", old_hash)
+
+    assert valid
+    assert new_hash.startswith("$2b$05$")
+    assert passwords.verify_password("secret", new_hash)
+
+
+def test_verify_and_update_keeps_current_hash():
+    assert passwords.verify_and_update("secret", passwords.hash_password("secret")) == (True, None)
+
+
+def test_verify_and_update_upgrades_legacy_sha256():
+    legacy = hashlib.sha256(b"secret").hexdigest()
+
+    valid, new_hash = passwords.verify_and_update("secret", legacy)
+
+    assert valid
+    assert new_hash.startswith("$2b$")
+    assert passwords.verify_password("secret", new_hash)
+
+
+def test_verify_and_update_wrong_password_does_not_rehash():
+    legacy = hashlib.sha256(b"secret").hexdigest()
+    assert passwords.verify_and_update("wrong", legacy) == (False, None)
+
+
+def test_login_rehashes_legacy_hash(client):
+    response = client.post("/api/auth/register", json={
+        "username": "legacy-hash",
+        "email": "legacy-hash@example.com",
+        "password": "user-password",
+    })
+    assert response.status_code == 201, response.text
+    with SessionLocal() as db:
+        user = db.query(User).filter(User.username == "legacy-hash").one()
+        user.hashed_password = hashlib.sha256(b"user-password").hexdigest()
+        db.commit()
+
+    response = client.post("/api/auth/login-json", json={"username": "legacy-hash", "password": "user-password"})
+    assert response.status_code == 200, response.text
+
+    with SessionLocal() as db:
+        stored = db.query(User).filter(User.username == "legacy-hash").one().hashed_password
+    assert stored.startswith("$2b$")
+    assert passwords.verify_password("user-password", stored)
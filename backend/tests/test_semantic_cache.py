@@ -0,0 +1,73 @@
+"""
+语义检索的响应缓存：独立的 semantic 命名空间，文章写入和向量刷新后失效
+"""
+from response_cache import response_cache
+
+
+def test_semantic_search_uses_own_namespace(client, admin_headers, monkeypatch):
+    import semantic_search
+
+    calls = []
+
+    async def fake_semantic_search(db, query, limit):
+        calls.append(query)
+        return []
+
+    monkeypatch.setattr(semantic_search, "semantic_search", fake_semantic_search)
+    url = "/api/articles/semantic-search?q=namespace-check"
+
+    assert client.get(url).status_code == 200
+    assert client.get(url).status_code == 200
+    assert len(calls) == 1
+
+    # 失效 articles 不影响语义检索缓存
+    response_cache.invalidate("articles")
+    client.get(url)
+    assert len(calls) == 1
+
+    response_cache.invalidate("semantic")
+    client.get(url)
+    assert len(calls) == 2
+
+    # 文章写入同时失效 semantic
+    response = client.post("/api/admin/articles", json={
+        "title": "语义缓存", "publish_date": "2026-01-01", "author": "测试", "content": "正文",
+    }, headers=admin_headers)
+    assert response.status_code == 201, response.text
+    client.get(url)
+    assert len(calls) == 3
+
+
+def test_embedding_refresh_invalidates_semantic_cache(client, admin_headers, monkeypatch):
+    from database import SessionLocal
+    from embedding_refresh import refresh_embeddings
+    from models import Article
+
+    response = client.post("/api/admin/articles", json={
+        "title": "向量刷新", "publish_date": "2026-01-02", "author": "测试",
+        "content": "zebraquartz appears only in this article",
+    }, headers=admin_headers)
+    assert response.status_code == 201, response.text
+    article_id = response.json()["id"]
+    url = "/api/articles/semantic-search?q=zebraquartz"
+
+    # 尚未向量化，空结果被缓存
+    assert client.get(url).json() == []
+    refresh_embeddings([article_id])
+    assert [item["id"] for item in client.get(url).json()] == [article_id]
+
+    # 内容没有变化的刷新不失效缓存
+    invalidated = []
+    monkeypatch.setattr(response_cache, "invalidate", lambda namespace: invalidated.append(namespace))
+    refresh_embeddings([article_id])
+    assert invalidated == []
+    monkeypatch.undo()
+
+    # 绕过管理接口删除文章：缓存中仍是旧结果，刷新删除向量后失效
+    with SessionLocal() as db:
+        db.query(Article).filter(Article.id == article_id).delete()
+        db.commit()
+    assert [item["id"] for item in client.get(url).json()] == [article_id]
+    stats = refresh_embeddings([article_id])
+    assert stats["removed"] == 1
+    assert client.get(url).json() == []
@@ -0,0 +1,60 @@
+"""
+/data 静态文件服务：不对外提供的文件返回 404
+"""
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+from static_files import DataFiles
+
+HIDDEN_FILES = [
+    "products.db",
+    "products.db-wal",
+    "products.db-shm",
+    "products.db-journal",
+    "response_cache.db-wal",
+    "response_cache.db-shm",
+    "backup.sqlite",
+    "backup.sqlite3-wal",
+    "backup.sqlite-journal",
+    "PRODUCTS.DB-WAL",
+    ".env",
+    ".git/config",
+    "covers/.store.lock",
+    "covers/manifest.json",
+    "vectors/manifest.json",
+    "search_index/articles.journal",
+    "articles.json.123.tmp",
+    "articles.json.progress",
+]
+VISIBLE_FILES = [
+    "articles.json",
+    "covers/ab/cd/cover.jpg",
+    "db-notes.txt",
+    "products.db.json",
+]
+
+
+@pytest.fixture
+def data_client(tmp_path):
+    for name in HIDDEN_FILES + VISIBLE_FILES:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"content")
+    app = Starlette(routes=[Mount("/data", DataFiles(directory=str(tmp_path)), name="data")])
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.mark.parametrize("name", HIDDEN_FILES)
+def test_hidden_files_return_404(data_client, name):
+    assert data_client.get(f"/data/{name}").status_code == 404
+    assert data_client.head(f"/data/{name}").status_code == 404
+
+
+@pytest.mark.parametrize("name", VISIBLE_FILES)
+def test_other_files_are_served(data_client, name):
+    response = data_client.get(f"/data/{name}")
+    assert response.status_code == 200
+    assert response.content == b"content"
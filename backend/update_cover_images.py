@@ -1,9 +1,23 @@
 """
 更新数据库中的封面图片路径为本地路径
 用于修复服务器上的封面图片显示问题
+- 修复旧路径格式后，把 /data/book-covers、/data/article-covers 下被引用的图片导入
+  内容寻址存储（见 cover_store.py），cover_image 改为 /data/covers/... 地址；原文件保留
+- 按数据库中的实际引用重新计算引用计数，--gc 删除不再被引用的文件
+- 为存储中的封面生成缩略图和占位符（cover_variants 列，见 cover_variants.py）
+
+用法：
+  python update_cover_images.py
+  python update_cover_images.py --gc --dry-run
 """
-from database import SessionLocal
+import argparse
+import os
+from sqlalchemy import select, update
+import cover_variants
+from cover_store import DATA_DIR, CoverStore, ref_key
+from database import SessionLocal, engine
 from models import Article, Book
+from response_cache import response_cache
 
 def update_cover_images():
     """更新封面图片路径"""
@@ -38,6 +52,7 @@ def update_cover_images():
         
         if updated_books > 0:
             db.commit()
+            response_cache.invalidate("books")
             print(f"[OK] 更新了 {updated_books} 本书的封面路径")
         else:
             print("[OK] 书籍封面路径已是最新")
@@ -66,6 +81,8 @@ def update_cover_images():
         
         if updated_articles > 0:
             db.commit()
+            response_cache.invalidate("articles")
+            response_cache.invalidate("semantic")
             print(f"[OK] 更新了 {updated_articles} 篇文章的封面路径")
         else:
             print("[OK] 文章封面路径已是最新")
@@ -85,6 +102,82 @@ def update_cover_images():
     finally:
         db.close()
 
+
+def _local_path(cover_image):
+    """/data/book-covers/x.jpg -> 本地文件路径（不在 data 目录内时返回 None）"""
+    path = os.path.normpath(os.path.join(DATA_DIR, cover_image[len("/data/"):]))
+    return path if path.startswith(os.path.join(DATA_DIR, "")) else None
+
+
+def migrate_to_store(store=None, gc=False, dry_run=False):
+    """把已下载到本地的封面导入内容寻址存储，重新计算引用计数并生成缩略图"""
+    store = store or CoverStore()
+    db = SessionLocal()
+    imported = {}
+    try:
+        print()
+        print(">>> 导入封面到内容寻址存储...")
+        # 存储的文件锁每张封面单独获取，不在整个迁移期间阻塞管理接口
+        updated = 0
+        for model in (Book, Article):
+            rows = db.execute(
+                select(model.id, model.cover_image)
+                .where(model.cover_image.like("/data/%"))
+                .where(model.cover_image.notlike(store.url_prefix + "/%"))
+            ).all()
+            pending = []
+            for row_id, cover_image in rows:
+                path = _local_path(cover_image)
+                if not path or not os.path.isfile(path):
+                    print(f"[WARN] 文件不存在，跳过: {cover_image}")
+                    continue
+                with store.transaction():
+                    if path not in imported:
+                        imported[path] = store.put_file(path)
+                    sha256 = imported[path]
+                    store.assign(ref_key(model, row_id), sha256)
+                    pending.append({"id": row_id, "cover_image": store.url_for(sha256)})
+            if pending:
+                db.execute(update(model), pending)
+                db.commit()
+                response_cache.invalidate(model.__tablename__)
+                updated += len(pending)
+
+        # 管理接口可能直接修改过 cover_image，按数据库重新计算引用
+        with store.transaction():
+            store.reconcile(db, (Book, Article))
+            stats = store.stats()
+        print(f"[OK] 更新了 {updated} 条记录（{len(imported)} 个文件），"
+              f"存储中共 {stats['blobs']} 个文件 / {stats['bytes']} 字节，未被引用 {stats['orphans']} 个")
+
+        print(">>> 生成封面缩略图...")
+        rendered = cover_variants.backfill(db, (Book, Article), store)
+        print(f"[OK] 更新了 {rendered} 条记录的缩略图")
+
+        if gc:
+            with store.transaction():
+                removed = store.gc(dry_run=dry_run)
+            action = "将删除" if dry_run else "已删除"
+            print(f"[OK] {action} {removed['files']} 个未被引用的文件，释放 {removed['bytes']} 字节")
+        return True
+
+    except Exception as e:
+        db.rollback()
+        print(f"[ERROR] 错误: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        db.close()
+
+
 if __name__ == "__main__":
-    update_cover_images()
+    parser = argparse.ArgumentParser(description="更新封面图片路径并导入内容寻址存储")
+    parser.add_argument("--gc", action="store_true", help="删除不再被引用的封面文件")
+    parser.add_argument("--dry-run", action="store_true", help="与 --gc 一起使用：只统计，不删除")
+    args = parser.parse_args()
+
+    cover_variants.ensure_cover_variants_column(engine, (Book, Article))
+    if update_cover_images():
+        migrate_to_store(gc=args.gc, dry_run=args.dry_run)
 
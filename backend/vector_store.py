@@ -0,0 +1,540 @@
+"""
+文章块向量库
+- MilvusVectorStore：docker-compose 中的 Milvus（需要 pymilvus），HNSW 索引 + 内积
+- NumpyVectorStore：进程内 NumPy 索引，持久化到 data/vectors/ 下的 npz 文件；
+  向量数少时暴力检索（一次矩阵乘法），达到 VECTOR_IVF_MIN 后使用 IVF（k-means 聚类，
+  只在最近的 nprobe 个簇中检索）。Milvus 没有运行时也能开发和测试
+  写入只追加到日志文件（.journal，每条记录是替换/删除的文章及新块的向量），不重写整个 npz；
+  其他 worker 查询前回放新增的日志，日志累计 VECTOR_COMPACT_OPS 条后由后台线程合并进 npz
+VECTOR_STORE=auto 时优先连接 Milvus，连接失败回退到 NumPy
+"""
+import json
+import os
+import struct
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import List, NamedTuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows 本地开发为单进程，不需要文件锁
+    fcntl = None
+
+from embeddings import MAX_CHUNKS
+
+# 向量库：auto | milvus | numpy
+VECTOR_STORE = os.getenv("VECTOR_STORE", "auto")
+MILVUS_URI = os.getenv("MILVUS_URI", "http://localhost:19530")
+MILVUS_COLLECTION = os.getenv("MILVUS_COLLECTION", "article_chunks")
+MILVUS_TIMEOUT = float(os.getenv("MILVUS_TIMEOUT", "3"))
+VECTOR_STORE_PATH = os.getenv(
+    "VECTOR_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "vectors", "articles.npz")
+)
+# 向量数达到该值后 NumPy 索引改用 IVF
+VECTOR_IVF_MIN = int(os.getenv("VECTOR_IVF_MIN", "50000"))
+VECTOR_IVF_NPROBE = int(os.getenv("VECTOR_IVF_NPROBE", "8"))
+# NumPy 索引的日志累计多少条后合并进 npz
+VECTOR_COMPACT_OPS = int(os.getenv("VECTOR_COMPACT_OPS", "200"))
+
+# Milvus 中块文本的最大字节数
+MILVUS_TEXT_MAX_BYTES = 4096
+
+
+class VectorHit(NamedTuple):
+    article_id: int
+    chunk_index: int
+    text: str
+    score: float
+
+
+def _truncate_bytes(text: str, limit: int) -> str:
+    return text.encode("utf-8")[:limit].decode("utf-8", errors="ignore")
+
+
+class MilvusVectorStore:
+    """Milvus 集合：每个块一行，主键 = 文章 id * MAX_CHUNKS + 块序号"""
+
+    name = "milvus"
+
+    def __init__(self, dim: int, embedder_name: str, uri: str = MILVUS_URI, collection: str = MILVUS_COLLECTION):
+        from pymilvus import connections
+
+        self.dim = dim
+        self.embedder_name = embedder_name
+        self.collection_name = collection
+        self.alias = "vector_store"
+        connections.connect(alias=self.alias, uri=uri, timeout=MILVUS_TIMEOUT)
+        self.collection = self._open_collection()
+
+    def _open_collection(self):
+        from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, utility
+
+        if not utility.has_collection(self.collection_name, using=self.alias):
+            fields = [
+                FieldSchema("id", DataType.INT64, is_primary=True, auto_id=False),
+                FieldSchema("article_id", DataType.INT64),
+                FieldSchema("chunk_index", DataType.INT64),
+                FieldSchema("lang", DataType.VARCHAR, max_length=8),
+                FieldSchema("text", DataType.VARCHAR, max_length=MILVUS_TEXT_MAX_BYTES),
+                FieldSchema("embedding", DataType.FLOAT_VECTOR, dim=self.dim),
+            ]
+            schema = CollectionSchema(fields, description=f"article chunks ({self.embedder_name})")
+            collection = Collection(self.collection_name, schema, using=self.alias)
+            collection.create_index(
+                "embedding",
+                {"index_type": "HNSW", "metric_type": "IP", "params": {"M": 16, "efConstruction": 200}}
+            )
+        collection = Collection(self.collection_name, using=self.alias)
+        embedding_field = next(f for f in collection.schema.fields if f.name == "embedding")
+        if embedding_field.params.get("dim") != self.dim or self.embedder_name not in collection.schema.description:
+            raise ValueError(
+                f"集合 {self.collection_name} 与当前嵌入模型 {self.embedder_name} 不一致，"
+                "请运行 python embed_articles.py --rebuild"
+            )
+        collection.load()
+        return collection
+
+    def upsert_many(self, items):
+        """items：[(文章 id, 块列表, 向量矩阵)]；先删除文章原有的块再插入"""
+        if not items:
+            return
+        self.delete([article_id for article_id, _, _ in items])
+        rows = [[], [], [], [], [], []]
+        for article_id, chunks, vectors in items:
+            for chunk, vector in zip(chunks, vectors):
+                rows[0].append(article_id * MAX_CHUNKS + chunk.index)
+                rows[1].append(article_id)
+                rows[2].append(chunk.index)
+                rows[3].append(chunk.lang)
+                rows[4].append(_truncate_bytes(chunk.text, MILVUS_TEXT_MAX_BYTES))
+                rows[5].append(vector.tolist())
+        if rows[0]:
+            self.collection.insert(rows)
+        self.collection.flush()
+
+    def delete(self, article_ids):
+        if article_ids:
+            self.collection.delete(f"article_id in {list(map(int, article_ids))}")
+
+    def search(self, vector: np.ndarray, top_k: int) -> List[VectorHit]:
+        results = self.collection.search(
+            [vector.tolist()], "embedding",
+            {"metric_type": "IP", "params": {"ef": max(64, top_k)}},
+            limit=top_k, output_fields=["article_id", "chunk_index", "text"]
+        )
+        return [
+            VectorHit(hit.entity.get("article_id"), hit.entity.get("chunk_index"), hit.entity.get("text"), hit.distance)
+            for hit in results[0]
+        ]
+
+    def count(self) -> int:
+        return self.collection.num_entities
+
+    def clear(self):
+        from pymilvus import utility
+
+        utility.drop_collection(self.collection_name, using=self.alias)
+        self.collection = self._open_collection()
+
+
+class _IVF:
+    """倒排文件索引：k-means 聚类中心 + 每个向量所属的簇"""
+
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray):
+        self.centroids = centroids
+        self.assignments = assignments
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, iterations: int = 10, seed: int = 0):
+        nlist = max(1, int(np.sqrt(len(vectors))))
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = cls.assign(centroids, vectors)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, vectors)
+            counts = np.bincount(assignments, minlength=nlist)
+            empty = counts == 0
+            # 空簇重新随机选一个向量作为中心
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+        return cls(centroids, cls.assign(centroids, vectors))
+
+    @staticmethod
+    def assign(centroids: np.ndarray, vectors: np.ndarray, batch: int = 65536) -> np.ndarray:
+        """每个向量最近的簇（分批计算，避免 N x nlist 的大矩阵）"""
+        if len(vectors) == 0:
+            return np.zeros(0, dtype=np.int32)
+        return np.concatenate([
+            np.argmax(vectors[i:i + batch] @ centroids.T, axis=1).astype(np.int32)
+            for i in range(0, len(vectors), batch)
+        ])
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        scores = self.centroids @ query
+        probe = np.argpartition(-scores, min(nprobe, len(scores)) - 1)[:nprobe]
+        return np.flatnonzero(np.isin(self.assignments, probe))
+
+
+class NumpyVectorStore:
+    """
+    进程内向量索引（线程安全）
+    写入时先与文件同步，再把修改追加到日志（文件锁保证同一时间只有一个进程写）；
+    其他 worker 查询前发现 npz 被替换会重新加载，日志变长则只回放新增的记录
+    """
+
+    name = "numpy"
+    # 日志记录：4 字节头部长度 + JSON 头部 + float32 向量
+    _RECORD_HEADER = struct.Struct("<I")
+
+    def __init__(self, dim: int, embedder_name: str, path: str = VECTOR_STORE_PATH,
+                 ivf_min: int = VECTOR_IVF_MIN, nprobe: int = VECTOR_IVF_NPROBE,
+                 compact_ops: int = VECTOR_COMPACT_OPS):
+        self.dim = dim
+        self.embedder_name = embedder_name
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.ivf_min = ivf_min
+        self.nprobe = nprobe
+        self.compact_ops = compact_ops
+        self._lock = threading.RLock()
+        self._stamp = None
+        self._compactor = None
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self._article_ids = np.zeros(0, dtype=np.int64)
+        self._chunk_index = np.zeros(0, dtype=np.int32)
+        self._texts = []
+        self._ivf = None
+        self._ivf_trained_size = 0
+        # npz 不存在或由其他嵌入模型生成时为 False，下一次写入先保存完整的 npz
+        self._base_valid = False
+        self._journal_pos = 0
+        self._journal_ops = 0
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool = True, suffix: str = ".lock", blocking: bool = True):
+        """文件锁；非阻塞时拿不到锁返回 False"""
+        if fcntl is None:
+            yield True
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + suffix, "a") as f:
+            flags = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+            try:
+                fcntl.flock(f, flags if blocking else flags | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load(self):
+        self._reset()
+        self._stamp = self._file_stamp()
+        if self._stamp is None:
+            return
+        with np.load(self.path) as data:
+            meta = json.loads(data["meta"].tobytes())
+            if meta["dim"] != self.dim or meta["embedder"] != self.embedder_name:
+                print(f"Warning: vector store {self.path} was built with {meta['embedder']}, ignoring it")
+                return
+            self._vectors = data["vectors"]
+            self._article_ids = data["article_ids"]
+            self._chunk_index = data["chunk_index"]
+            self._texts = meta["texts"]
+            if "centroids" in data:
+                self._ivf = _IVF(data["centroids"], data["assignments"])
+                self._ivf_trained_size = meta["ivf_trained_size"]
+        self._base_valid = True
+        self._replay_journal()
+
+    def _snapshot(self) -> dict:
+        """当前状态（需持有锁）；数组修改时总是整体替换，只需复制文本列表"""
+        meta = {"dim": self.dim, "embedder": self.embedder_name, "texts": list(self._texts)}
+        arrays = {
+            "vectors": self._vectors,
+            "article_ids": self._article_ids,
+            "chunk_index": self._chunk_index,
+        }
+        if self._ivf is not None:
+            meta["ivf_trained_size"] = self._ivf_trained_size
+            arrays["centroids"] = self._ivf.centroids
+            arrays["assignments"] = self._ivf.assignments
+        arrays["meta"] = meta
+        return arrays
+
+    def _write_base(self, arrays: dict) -> str:
+        """把快照写入临时文件，返回临时文件路径"""
+        arrays = dict(arrays)
+        arrays["meta"] = np.frombuffer(json.dumps(arrays["meta"], ensure_ascii=False).encode("utf-8"), dtype=np.uint8)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        return tmp_path
+
+    def _install(self, tmp_path: str, journal_tail: bytes):
+        """替换 npz，日志只保留写快照之后追加的记录（需持有排他文件锁；内存状态已包含这些记录）"""
+        os.replace(tmp_path, self.path)
+        journal_tmp = f"{self.journal_path}.{os.getpid()}.tmp"
+        with open(journal_tmp, "wb") as f:
+            f.write(journal_tail)
+        os.replace(journal_tmp, self.journal_path)
+        self._stamp = self._file_stamp()
+        self._base_valid = True
+        self._journal_pos = len(journal_tail)
+        self._journal_ops = 0
+
+    def _save(self):
+        """同步保存完整的 npz 并清空日志（需持有排他文件锁）"""
+        self._install(self._write_base(self._snapshot()), b"")
+
+    def _journal_size(self) -> int:
+        try:
+            return os.path.getsize(self.journal_path)
+        except FileNotFoundError:
+            return 0
+
+    def _sync(self, locked: bool = False):
+        """其他进程修改过时重新加载或回放日志；locked：调用方已持有排他文件锁"""
+        if self._file_stamp() != self._stamp:
+            with nullcontext() if locked else self._file_lock(exclusive=False):
+                self._load()
+            return
+        journal_size = self._journal_size()
+        if journal_size != self._journal_pos:
+            with nullcontext() if locked else self._file_lock(exclusive=False):
+                if journal_size < self._journal_pos:
+                    self._load()
+                else:
+                    self._replay_journal()
+
+    # ==================== 日志 ====================
+
+    def _encode_record(self, header: dict, vectors: np.ndarray) -> bytes:
+        header = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return self._RECORD_HEADER.pack(len(header)) + header + vectors.astype(np.float32).tobytes()
+
+    def _append_journal(self, record: bytes):
+        if not self._base_valid:
+            # 第一次写入（或更换了嵌入模型）：日志必须接在同一个模型生成的 npz 后面
+            self._save()
+            return
+        with open(self.journal_path, "ab") as f:
+            f.write(record)
+        self._journal_pos += len(record)
+        self._journal_ops += 1
+        if self._journal_ops >= self.compact_ops:
+            self._schedule_compaction()
+
+    def _replay_journal(self):
+        """回放日志中尚未应用的记录；末尾不完整的记录（正在写入）留到下一次"""
+        if not self._base_valid:
+            return
+        try:
+            with open(self.journal_path, "rb") as f:
+                f.seek(self._journal_pos)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        offset = 0
+        size = self._RECORD_HEADER.size
+        while offset + size <= len(data):
+            (header_len,) = self._RECORD_HEADER.unpack_from(data, offset)
+            if offset + size + header_len > len(data):
+                break
+            header = json.loads(data[offset + size:offset + size + header_len])
+            vector_bytes = len(header.get("article_ids", ())) * self.dim * 4
+            end = offset + size + header_len + vector_bytes
+            if end > len(data):
+                break
+            if header["op"] == "upsert":
+                vectors = np.frombuffer(data, dtype=np.float32, count=vector_bytes // 4, offset=offset + size + header_len)
+                self._apply_upsert(
+                    header["replace"], header["article_ids"], header["chunk_index"], header["texts"],
+                    vectors.reshape(-1, self.dim)
+                )
+            else:
+                self._remove_locked(header["replace"])
+            offset = end
+            self._journal_ops += 1
+        self._journal_pos += offset
+
+    # ==================== 合并 ====================
+
+    def _schedule_compaction(self):
+        """在后台线程中合并（不在写入调用中执行）；本进程已有合并线程在运行时不重复启动"""
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self._compact_in_background, daemon=True)
+        self._compactor.start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact(blocking=False)
+        except Exception as e:
+            print(f"Warning: vector store {self.path} compaction failed: {e}")
+
+    def compact(self, blocking: bool = True) -> bool:
+        """
+        把日志合并进 npz：只在拍快照和替换文件时持有锁，写 npz 期间查询和写入照常进行，
+        期间追加的日志保留下来。blocking=False 时其他进程正在合并则直接返回 False
+        """
+        with self._file_lock(suffix=".compact.lock", blocking=blocking) as acquired:
+            if not acquired:
+                return False
+            with self._lock, self._file_lock():
+                self._sync(locked=True)
+                if not self._base_valid or self._journal_pos == 0:
+                    return False
+                snapshot = self._snapshot()
+                stamp = self._stamp
+                journal_pos = self._journal_pos
+
+            tmp_path = self._write_base(snapshot)
+
+            with self._lock, self._file_lock():
+                if self._file_stamp() != stamp:
+                    # 期间被清空或重建过，快照已过期
+                    os.remove(tmp_path)
+                    return False
+                self._sync(locked=True)
+                with open(self.journal_path, "rb") as f:
+                    f.seek(journal_pos)
+                    journal_tail = f.read()
+                self._install(tmp_path, journal_tail)
+            return True
+
+    # ==================== 修改 ====================
+
+    def _update_ivf(self, new_vectors: np.ndarray):
+        """新向量分配到已有的簇；向量数比训练时翻倍后重新训练"""
+        size = len(self._vectors)
+        if size < self.ivf_min:
+            self._ivf = None
+            return
+        if self._ivf is None or size > 2 * self._ivf_trained_size:
+            self._ivf = _IVF.train(self._vectors)
+            self._ivf_trained_size = size
+            return
+        self._ivf.assignments = np.concatenate([self._ivf.assignments, _IVF.assign(self._ivf.centroids, new_vectors)])
+
+    def _remove_locked(self, article_ids):
+        keep = ~np.isin(self._article_ids, np.asarray(list(article_ids), dtype=np.int64))
+        if keep.all():
+            return False
+        self._vectors = self._vectors[keep]
+        self._article_ids = self._article_ids[keep]
+        self._chunk_index = self._chunk_index[keep]
+        self._texts = [text for text, kept in zip(self._texts, keep) if kept]
+        if self._ivf is not None:
+            self._ivf.assignments = self._ivf.assignments[keep]
+        return True
+
+    def _apply_upsert(self, replace, article_ids, chunk_index, texts, new_vectors: np.ndarray):
+        self._remove_locked(replace)
+        self._vectors = np.concatenate([self._vectors, new_vectors])
+        self._article_ids = np.concatenate([self._article_ids, np.asarray(article_ids, dtype=np.int64)])
+        self._chunk_index = np.concatenate([self._chunk_index, np.asarray(chunk_index, dtype=np.int32)])
+        self._texts = self._texts + list(texts)
+        self._update_ivf(new_vectors)
+
+    def upsert_many(self, items):
+        """items：[(文章 id, 块列表, 向量矩阵)]；替换这些文章原有的块"""
+        if not items:
+            return
+        header = {
+            "op": "upsert",
+            "replace": [article_id for article_id, _, _ in items],
+            "article_ids": [article_id for article_id, chunks, _ in items for _ in chunks],
+            "chunk_index": [chunk.index for _, chunks, _ in items for chunk in chunks],
+            "texts": [chunk.text for _, chunks, _ in items for chunk in chunks],
+        }
+        new_vectors = [vectors for _, chunks, vectors in items if len(chunks)]
+        new_vectors = np.vstack(new_vectors).astype(np.float32) if new_vectors else np.zeros((0, self.dim), np.float32)
+        record = self._encode_record(header, new_vectors)
+        with self._lock, self._file_lock():
+            self._sync(locked=True)
+            self._apply_upsert(header["replace"], header["article_ids"], header["chunk_index"], header["texts"], new_vectors)
+            self._append_journal(record)
+
+    def delete(self, article_ids):
+        if not article_ids:
+            return
+        article_ids = [int(article_id) for article_id in article_ids]
+        with self._lock, self._file_lock():
+            self._sync(locked=True)
+            if self._remove_locked(article_ids):
+                self._append_journal(self._encode_record({"op": "delete", "replace": article_ids}, self._vectors[:0]))
+
+    def search(self, vector: np.ndarray, top_k: int) -> List[VectorHit]:
+        with self._lock:
+            self._sync()
+            if len(self._vectors) == 0:
+                return []
+            if self._ivf is not None:
+                rows = self._ivf.candidates(vector, self.nprobe)
+                scores = self._vectors[rows] @ vector
+            else:
+                rows = None
+                scores = self._vectors @ vector
+            k = min(top_k, len(scores))
+            if k == 0:
+                return []
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            hits = []
+            for position in best:
+                row = rows[position] if rows is not None else position
+                hits.append(VectorHit(
+                    int(self._article_ids[row]), int(self._chunk_index[row]), self._texts[row], float(scores[position])
+                ))
+            return hits
+
+    def count(self) -> int:
+        with self._lock:
+            self._sync()
+            return len(self._vectors)
+
+    def clear(self):
+        with self._lock, self._file_lock():
+            self._reset()
+            self._save()
+
+
+def create_vector_store(dim: int, embedder_name: str):
+    """根据配置创建向量库；auto 模式下 Milvus 不可用时回退到 NumPy"""
+    if VECTOR_STORE in ("auto", "milvus"):
+        try:
+            return MilvusVectorStore(dim, embedder_name)
+        except ImportError:
+            if VECTOR_STORE == "milvus":
+                raise
+            print("pymilvus not installed, using NumPy vector store")
+        except ValueError:
+            raise
+        except Exception as e:
+            if VECTOR_STORE == "milvus":
+                raise
+            print(f"Warning: Milvus unavailable ({e}), using NumPy vector store")
+    elif VECTOR_STORE != "numpy":
+        raise ValueError(f"未知的向量库: {VECTOR_STORE}")
+    return NumpyVectorStore(dim, embedder_name)